@@ -1,6 +1,6 @@
 import logging
 from bagel.config import Settings, System
-from bagel.api import API
+from bagel.api import API, AsyncAPI
 
 logger = logging.getLogger(__name__)
 
@@ -12,3 +12,13 @@ def Client(settings: Settings = Settings(
     system = System(settings)
     api = system.instance(API)
     return api
+
+
+def AsyncClient(settings: Settings = Settings(
+        bagel_api_impl="rest-async",
+        bagel_server_host="api.bageldb.ai",
+    )) -> AsyncAPI:
+    """Return a running bagel.AsyncAPI instance"""
+    system = System(settings)
+    api = system.instance(AsyncAPI)
+    return api
@@ -0,0 +1,298 @@
+from typing import TYPE_CHECKING, Optional
+from pydantic import BaseModel, PrivateAttr
+from uuid import UUID
+import asyncio
+import time
+
+from bagel.api.types import (
+    ClusterMetadata,
+    Embedding,
+    Embeddings,
+    Include,
+    Metadata,
+    Metadatas,
+    Document,
+    Documents,
+    Where,
+    IDs,
+    GetResult,
+    QueryResult,
+    ID,
+    OneOrMany,
+    WhereDocument,
+    WriteConsistency,
+    maybe_cast_one_to_many,
+    validate_ids,
+    validate_include,
+    validate_where,
+    validate_where_document,
+    validate_n_results,
+    validate_embeddings,
+    validate_embedding_set,
+)
+from bagel.api.Cluster import consistency_probe, probe_visible
+from bagel.api.timeouts import deadline
+import logging
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from bagel.api import AsyncAPI
+
+
+class AsyncCluster(BaseModel):
+    """The asyncio counterpart of Cluster. Every data operation is a coroutine, so many
+    of them can be in flight on one event loop."""
+
+    name: str
+    id: UUID
+    cluster_size: float
+    embedding_size: Optional[int] = None
+    metadata: Optional[ClusterMetadata] = None
+    _client: "AsyncAPI" = PrivateAttr()
+
+    def __init__(
+        self,
+        client: "AsyncAPI",
+        name: str,
+        id: UUID,
+        cluster_size: float,
+        embedding_size: Optional[int] = None,
+        metadata: Optional[ClusterMetadata] = None,
+    ):
+        self._client = client
+        super().__init__(
+            name=name,
+            metadata=metadata,
+            id=id,
+            cluster_size=cluster_size,
+            embedding_size=embedding_size,
+        )
+
+    def __repr__(self) -> str:
+        return f"AsyncCluster(name={self.name})"
+
+    async def count(self, timeout: Optional[float] = None) -> int:
+        """The total number of embeddings added to the database"""
+        with deadline(timeout):
+            return await self._client._count(cluster_id=self.id)
+
+    async def add(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[OneOrMany[Embedding]] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        increment_index: bool = True,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Add embeddings to the data store. See Cluster.add"""
+        ids, embeddings, metadatas, documents = validate_embedding_set(
+            ids, embeddings, metadatas, documents
+        )
+
+        with deadline(timeout):
+            await self._client._add(
+                ids, self.id, embeddings, metadatas, documents, increment_index
+            )
+            await self._wait_for_consistency(
+                consistency, ids, embeddings, metadatas, documents
+            )
+
+    async def get(
+        self,
+        ids: Optional[OneOrMany[ID]] = None,
+        where: Optional[Where] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = ["metadatas", "documents"],
+        as_numpy: Optional[bool] = None,
+        timeout: Optional[float] = None,
+    ) -> GetResult:
+        """Get embeddings and their associate data from the data store. See Cluster.get"""
+        where = validate_where(where) if where else None
+        where_document = (
+            validate_where_document(where_document) if where_document else None
+        )
+        ids = validate_ids(maybe_cast_one_to_many(ids)) if ids else None
+        include = validate_include(include, allow_distances=False)
+        with deadline(timeout):
+            return await self._client._get(
+                self.id,
+                ids,
+                where,
+                None,
+                limit,
+                offset,
+                where_document=where_document,
+                include=include,
+                as_numpy=as_numpy,
+            )
+
+    async def peek(self, limit: int = 10) -> GetResult:
+        """Get the first few results in the database up to limit"""
+        return await self._client._peek(self.id, limit)
+
+    async def find(
+        self,
+        query_embeddings: Optional[OneOrMany[Embedding]] = None,
+        query_texts: Optional[OneOrMany[Document]] = None,
+        n_results: int = 10,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = ["metadatas", "documents", "distances"],
+        as_numpy: Optional[bool] = None,
+        timeout: Optional[float] = None,
+    ) -> QueryResult:
+        """Get the n_results nearest neighbor embeddings for provided query_embeddings or
+        query_texts. See Cluster.find"""
+        where = validate_where(where) if where else None
+        where_document = (
+            validate_where_document(where_document) if where_document else None
+        )
+        query_embeddings = (
+            validate_embeddings(maybe_cast_one_to_many(query_embeddings))
+            if query_embeddings is not None
+            else None
+        )
+        query_texts = (
+            maybe_cast_one_to_many(query_texts) if query_texts is not None else None
+        )
+        include = validate_include(include, allow_distances=True)
+        n_results = validate_n_results(n_results)
+
+        if (query_embeddings is None and query_texts is None) or (
+            query_embeddings is not None and query_texts is not None
+        ):
+            raise ValueError(
+                "You must provide either embeddings or texts to find, but not both"
+            )
+
+        with deadline(timeout):
+            return await self._client._query(
+                cluster_id=self.id,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where or {},
+                where_document=where_document or {},
+                include=include,
+                query_texts=query_texts,
+                as_numpy=as_numpy,
+            )
+
+    async def modify(
+        self, name: Optional[str] = None, metadata: Optional[ClusterMetadata] = None
+    ) -> None:
+        """Modify the cluster name or metadata"""
+        await self._client._modify(id=self.id, new_name=name, new_metadata=metadata)
+        if name:
+            self.name = name
+        if metadata:
+            self.metadata = metadata
+
+    async def update(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[OneOrMany[Embedding]] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Update the embeddings, metadatas or documents for provided ids."""
+        ids, embeddings, metadatas, documents = validate_embedding_set(
+            ids, embeddings, metadatas, documents, require_embeddings_or_documents=False
+        )
+
+        with deadline(timeout):
+            await self._client._update(self.id, ids, embeddings, metadatas, documents)
+            await self._wait_for_consistency(
+                consistency, ids, embeddings, metadatas, documents
+            )
+
+    async def upsert(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[OneOrMany[Embedding]] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        increment_index: bool = True,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Update the embeddings, metadatas or documents for provided ids, or create them
+        if they don't exist."""
+        ids, embeddings, metadatas, documents = validate_embedding_set(
+            ids, embeddings, metadatas, documents
+        )
+
+        with deadline(timeout):
+            await self._client._upsert(
+                cluster_id=self.id,
+                ids=ids,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+                increment_index=increment_index,
+            )
+            await self._wait_for_consistency(
+                consistency, ids, embeddings, metadatas, documents
+            )
+
+    async def delete(
+        self,
+        ids: Optional[IDs] = None,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        """Delete the embeddings based on ids and/or a where filter. See Cluster.delete"""
+        ids = validate_ids(maybe_cast_one_to_many(ids)) if ids else None
+        where = validate_where(where) if where else None
+        where_document = (
+            validate_where_document(where_document) if where_document else None
+        )
+        with deadline(timeout):
+            await self._client._delete(self.id, ids, where, where_document)
+            if ids and not where and not where_document:
+                await self._wait_for_consistency(consistency, ids, deleted=True)
+
+    async def create_index(self) -> None:
+        await self._client.create_index(self.name)
+
+    async def _wait_for_consistency(
+        self,
+        consistency: Optional[WriteConsistency],
+        ids: IDs,
+        embeddings: Optional[Embeddings] = None,
+        metadatas: Optional[Metadatas] = None,
+        documents: Optional[Documents] = None,
+        deleted: bool = False,
+    ) -> None:
+        """See Cluster._wait_for_consistency"""
+        settings = self._client._system.settings
+        if consistency is None:
+            consistency = settings.bagel_write_consistency
+        if consistency != "read_your_writes":
+            return
+
+        probe, include, expected = consistency_probe(
+            ids, embeddings, metadatas, documents
+        )
+        stop_at = time.monotonic() + settings.bagel_consistency_timeout
+        delay = 0.05
+        while True:
+            found = await self._client._get(
+                self.id, ids=probe, include=include, as_numpy=False
+            )
+            if probe_visible(found, probe, None if deleted else expected):
+                return
+            if time.monotonic() + delay > stop_at:
+                raise TimeoutError(
+                    f"Writes to cluster {self.name} were not visible after {settings.bagel_consistency_timeout}s"
+                )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 1.0)
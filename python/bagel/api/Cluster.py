@@ -1,37 +1,132 @@
-from typing import TYPE_CHECKING, Optional, Tuple, cast, List, Any
+from typing import TYPE_CHECKING, Optional, Tuple, Union, cast, List, Any, Iterable, Iterator, Generator, Dict
 from pydantic import BaseModel, PrivateAttr
 from uuid import UUID
+from contextlib import contextmanager
+from functools import partial
+import itertools
+import contextvars
 import time
 
+import numpy as np
+
 from bagel.api.types import (
     ClusterMetadata,
     Embedding,
     Include,
     Metadata,
     Document,
+    Documents,
+    Embeddings,
+    Metadatas,
     Where,
     IDs,
     EmbeddingFunction,
     GetResult,
     QueryResult,
+    IngestSummary,
     ID,
     OneOrMany,
     WhereDocument,
+    WriteConsistency,
     maybe_cast_one_to_many,
     validate_ids,
     validate_include,
-    validate_metadatas,
     validate_where,
     validate_where_document,
     validate_n_results,
     validate_embeddings,
+    validate_embedding_set,
+)
+from bagel.api.cache import bypass_query_cache
+from bagel.api.columnar import ColumnarQueryResult
+from bagel.api.querying import (
+    DEFAULT_QUERY_BATCH_SIZE,
+    ScanProgress,
+    map_ordered,
+    scan_partitions,
+)
+from bagel.api.timeouts import deadline
+from bagel.api.ingest import (
+    BufferedWriter,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_MAX_BATCH_BYTES,
+    Record,
+    plan_batches,
+    stream_batches,
+    write_batches,
+    write_stream,
 )
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def consistency_probe(
+    ids: IDs,
+    embeddings: Optional[Embeddings] = None,
+    metadatas: Optional[Metadatas] = None,
+    documents: Optional[Documents] = None,
+) -> Tuple[IDs, Include, List[Dict[str, Any]]]:
+    """The ids to read back to check that a write is visible, the fields to include,
+    and the value each field should have. Only the first and last rows are checked, for
+    the fields the write set."""
+    positions = list(dict.fromkeys([0, len(ids) - 1]))
+    written = {
+        "embeddings": embeddings,
+        "metadatas": metadatas,
+        "documents": documents,
+    }
+    fields = {field: rows for field, rows in written.items() if rows is not None}
+    expected = [{field: rows[i] for field, rows in fields.items()} for i in positions]
+    return [ids[i] for i in positions], cast(Include, list(fields)), expected
+
+
+def probe_visible(
+    found: GetResult, probe: IDs, expected: Optional[List[Dict[str, Any]]]
+) -> bool:
+    """Whether get returned every probed id with its written fields, or, when expected
+    is None (a delete), none of them"""
+    if expected is None:
+        return not found["ids"]
+    rows = {id: i for i, id in enumerate(found["ids"])}
+    for id, fields in zip(probe, expected):
+        if id not in rows:
+            return False
+        i = rows[id]
+        for field, value in fields.items():
+            got = found[field][i]  # type: ignore[literal-required]
+            if field == "embeddings":
+                if got is None or not np.allclose(got, value, rtol=1e-5, atol=1e-6):
+                    return False
+            elif field == "metadatas" and value is not None:
+                # The server may merge an update into the stored metadata
+                if got is None or any(got.get(k) != v for k, v in value.items()):
+                    return False
+            elif got != value:
+                return False
+    return True
+
 if TYPE_CHECKING:
     from bagel.api import API
+    from bagel.api.replica import LocalCluster
+    from bagel.api.search import Space
+
+
+class _BulkLoad:
+    """An open bulk_load block of one cluster"""
+
+    def __init__(self) -> None:
+        self.open = True
+        # The last record written in the block, used to check the index is ready
+        self.probe: Optional[Tuple[ID, Optional[Embedding], Optional[Document]]] = None
+
+
+# The bulk_load blocks open in this context, by cluster id. Being context-local, a
+# block covers the thread that opened it and the workers the client starts from it
+# (add_bulk, ingest, buffered writers), but not other threads sharing the Cluster.
+_bulk_loads: contextvars.ContextVar[Dict[UUID, _BulkLoad]] = contextvars.ContextVar(
+    "bagel_bulk_loads", default={}
+)
 
 
 class Cluster(BaseModel):
@@ -63,14 +158,18 @@ class Cluster(BaseModel):
     def __repr__(self) -> str:
         return f"Cluster(name={self.name})"
 
-    def count(self) -> int:
+    def count(self, timeout: Optional[float] = None) -> int:
         """The total number of embeddings added to the database
 
+        Args:
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
+
         Returns:
             int: The total number of embeddings added to the database
 
         """
-        return self._client._count(cluster_id=self.id)
+        with deadline(timeout):
+            return self._client._count(cluster_id=self.id)
 
     def add_image(self, filename: str, metadata: Optional[Metadata] = None) -> Any:
         """Add image to Bagel."""
@@ -106,14 +205,18 @@ class Cluster(BaseModel):
         metadatas: Optional[OneOrMany[Metadata]] = None,
         documents: Optional[OneOrMany[Document]] = None,
         increment_index: bool = True,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
     ) -> None:
         """Add embeddings to the data store.
         Args:
             ids: The ids of the embeddings you wish to add
-            embedding: The embeddings to add. If None, embeddings will be computed based on the documents using the embedding_function set for the cluster. Optional.
+            embedding: The embeddings to add. If None, embeddings will be computed based on the documents using the embedding_function set for the cluster. May be a 2-D numeric ndarray (or 1-D for a single embedding). Optional.
             metadata: The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
             documents: The documents to associate with the embeddings. Optional.
             ids: The ids to associate with the embeddings. Optional.
+            consistency: "none" to return as soon as the server accepts the write, or "read_your_writes" to wait until reads return the written ids with the written values. Defaults to the client's bagel_write_consistency setting. Optional.
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
 
         Returns:
             None
@@ -131,12 +234,115 @@ class Cluster(BaseModel):
             ids, embeddings, metadatas, documents
         )
 
-        self._client._add(
-            ids, self.id, embeddings, metadatas, documents, increment_index
-        )
+        with deadline(timeout):
+            self._write_batch(ids, embeddings, metadatas, documents, increment_index)
+            self._wait_for_consistency(
+                consistency, ids, embeddings, metadatas, documents
+            )
+
+    def add_bulk(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[OneOrMany[Embedding]] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_bytes: Optional[int] = DEFAULT_MAX_BATCH_BYTES,
+        workers: int = 4,
+        increment_index: bool = True,
+        upsert: bool = False,
+        timeout: Optional[float] = None,
+    ) -> IngestSummary:
+        """Add a large number of records by splitting them into batches that are uploaded
+        concurrently over the client's connection pool.
+
+        Args:
+            ids: The ids of the embeddings you wish to add
+            embeddings: The embeddings to add. May be a 2-D numeric ndarray. Optional.
+            metadatas: The metadata to associate with the embeddings. Optional.
+            documents: The documents to associate with the embeddings. Optional.
+            batch_size: The maximum number of records per request. Defaults to 1000.
+            max_bytes: The maximum estimated payload size of a request, or None for no limit. Defaults to 8 MiB.
+            workers: The number of batches uploaded concurrently. Defaults to 4.
+            increment_index: If True, will incrementally add to the ANN index of the cluster. Defaults to True.
+            upsert: If True, upsert the records instead of adding them. Defaults to False.
+            timeout: The maximum number of seconds for the whole upload: every batch and retry shares this deadline. Defaults to the client's per-operation timeouts. Optional.
+
+        Returns:
+            IngestSummary: Record, batch and failure counts, with the failed batches and the achieved throughput.
+
+        Raises:
+            ValueError: If the records are invalid. Failed uploads are reported in the summary instead.
+        """
+        columns = self._validate_embedding_set(ids, embeddings, metadatas, documents)
+        batches = plan_batches(columns, batch_size, max_bytes)
+        write = partial(self._write_batch, increment_index=increment_index, upsert=upsert)
+        with deadline(timeout):
+            return write_batches(write, columns, batches, workers)
+
+    def ingest(
+        self,
+        records: Iterable[Record],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_bytes: Optional[int] = DEFAULT_MAX_BATCH_BYTES,
+        max_in_flight: int = 4,
+        increment_index: bool = True,
+        upsert: bool = False,
+        timeout: Optional[float] = None,
+    ) -> IngestSummary:
+        """Add records from an iterator or generator, batching them as they arrive.
+        The iterator is consumed lazily: at most max_in_flight batches are being uploaded
+        and one more is being built, so memory stays bounded however long the stream is.
+
+        Args:
+            records: An iterable of `(id, embedding, metadata, document)` tuples or of dicts with `id`, `embedding`, `metadata` and `document` keys. Only the id is required.
+            batch_size: The maximum number of records per request. Defaults to 1000.
+            max_bytes: The maximum estimated payload size of a request, or None for no limit. Defaults to 8 MiB.
+            max_in_flight: The maximum number of concurrent requests. Defaults to 4.
+            increment_index: If True, will incrementally add to the ANN index of the cluster. Defaults to True.
+            upsert: If True, upsert the records instead of adding them. Defaults to False.
+            timeout: The maximum number of seconds for the whole upload: every batch and retry shares this deadline. Defaults to the client's per-operation timeouts. Optional.
+
+        Returns:
+            IngestSummary: Record, batch and failure counts. Batches with invalid records are reported as failed.
+        """
+        write = partial(self._write_batch, increment_index=increment_index, upsert=upsert)
+        with deadline(timeout):
+            return write_stream(
+                write, stream_batches(records, batch_size, max_bytes), max_in_flight
+            )
+
+    def buffered(
+        self,
+        max_records: int = DEFAULT_BATCH_SIZE,
+        max_bytes: Optional[int] = DEFAULT_MAX_BATCH_BYTES,
+        flush_interval: Optional[float] = 1.0,
+        increment_index: bool = True,
+    ) -> BufferedWriter:
+        """Returns a write-behind writer that coalesces small add, upsert and delete calls
+        into batched requests sent from a background thread. Use it as a context manager;
+        everything is flushed on exit.
+
+            with cluster.buffered(max_records=500, flush_interval=0.5) as writer:
+                for event in events:
+                    writer.add(ids=[event.id], documents=[event.text])
 
-        # Syncing time after add
-        time.sleep(1)
+        Args:
+            max_records: The maximum number of records per request. Defaults to 1000.
+            max_bytes: The maximum estimated payload size of a request, or None for no limit. Defaults to 8 MiB.
+            flush_interval: The maximum number of seconds a write waits in the buffer, or None to only flush when a batch is full. Defaults to 1.
+            increment_index: If True, will incrementally add to the ANN index of the cluster. Defaults to True.
+
+        Returns:
+            BufferedWriter: The writer. Writes to the same id are applied in call order.
+        """
+        return BufferedWriter(
+            self,
+            max_records=max_records,
+            max_bytes=max_bytes,
+            flush_interval=flush_interval,
+            increment_index=increment_index,
+        )
 
     def get(
         self,
@@ -146,6 +352,8 @@ class Cluster(BaseModel):
         offset: Optional[int] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = ["metadatas", "documents"],
+        as_numpy: Optional[bool] = None,
+        timeout: Optional[float] = None,
     ) -> GetResult:
         """Get embeddings and their associate data from the data store. If no ids or where filter is provided returns
         all embeddings up to limit starting at offset.
@@ -157,6 +365,8 @@ class Cluster(BaseModel):
             offset: The offset to start returning results from. Useful for paging results with limit. Optional.
             where_document: A WhereDocument type dict used to filter by the documents. E.g. `{$contains: {"text": "hello"}}`. Optional.
             include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`. Ids are always included. Defaults to `["metadatas", "documents"]`. Optional.
+            as_numpy: If True, return a ColumnarGetResult whose ids and embeddings are NumPy arrays. Defaults to the client's bagel_result_format setting. Optional.
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
 
         Returns:
             GetResult: A GetResult object containing the results.
@@ -168,17 +378,188 @@ class Cluster(BaseModel):
         )
         ids = validate_ids(maybe_cast_one_to_many(ids)) if ids else None
         include = validate_include(include, allow_distances=False)
-        return self._client._get(
-            self.id,
-            ids,
-            where,
-            None,
-            limit,
-            offset,
-            where_document=where_document,
-            include=include,
+        with deadline(timeout):
+            return self._client._get(
+                self.id,
+                ids,
+                where,
+                None,
+                limit,
+                offset,
+                where_document=where_document,
+                include=include,
+                as_numpy=as_numpy,
+            )
+
+    def iter(
+        self,
+        page_size: int = 1000,
+        include: Include = ["metadatas", "documents"],
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        prefetch: int = 1,
+        records: bool = False,
+        as_numpy: Optional[bool] = None,
+    ) -> Iterator[Any]:
+        """Walk the whole cluster, or the records matching the filters, page by page.
+        The next prefetch pages are fetched in the background while the caller processes
+        the current one, so at most prefetch + 1 pages are held in memory.
+
+            for page in cluster.iter(page_size=500, include=["embeddings"]):
+                ...
+
+        Pages are read by offset, so records added or deleted during the walk may be
+        skipped or returned twice.
+
+        Args:
+            page_size: The number of records per request. Defaults to 1000.
+            include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`. Ids are always included. Defaults to `["metadatas", "documents"]`. Optional.
+            where: A Where type dict used to filter results by. Optional.
+            where_document: A WhereDocument type dict used to filter by the documents. Optional.
+            prefetch: The number of pages fetched ahead of the caller. Defaults to 1.
+            records: If True, yield one dict per record with the keys `"id"`, `"embedding"`, `"metadata"` and `"document"` instead of pages. Defaults to False.
+            as_numpy: If True, pages are ColumnarGetResults, see get. Optional.
+
+        Returns:
+            Iterator[GetResult]: The pages in order, if records is False.
+            Iterator[Dict[str, Any]]: The records in order, if records is True.
+        """
+        if page_size < 1:
+            raise ValueError(f"Expected page_size to be positive, got {page_size}")
+        where = validate_where(where) if where else None
+        where_document = (
+            validate_where_document(where_document) if where_document else None
+        )
+        include = validate_include(include, allow_distances=False)
+
+        def get_page(offset: int) -> GetResult:
+            return self._client._get(
+                self.id,
+                None,
+                where,
+                None,
+                page_size,
+                offset,
+                where_document=where_document,
+                include=include,
+                as_numpy=as_numpy,
+            )
+
+        pages = map_ordered(
+            get_page,
+            itertools.count(0, page_size),
+            workers=prefetch,
+            max_pending=prefetch + 1,
+        )
+        return self._iter_pages(pages, page_size, records)
+
+    def scan(
+        self,
+        partitions: int = 8,
+        workers: int = 4,
+        page_size: int = 1000,
+        include: Include = ["metadatas", "documents"],
+        progress: Optional[ScanProgress] = None,
+        as_numpy: Optional[bool] = None,
+    ) -> Iterator[GetResult]:
+        """Read the whole cluster as fast as possible, e.g. to export or re-embed it. The
+        offsets up to count() are split into partitions that are read concurrently by
+        workers threads, and pages are yielded as they arrive, in no particular order.
+
+            progress = ScanProgress()
+            for page in cluster.scan(partitions=16, workers=8, progress=progress):
+                export(page)
+                save(progress.to_dict())
+
+        To resume an interrupted scan, pass ScanProgress.from_dict(saved). Records added
+        after the scan was planned are not read.
+
+        Args:
+            partitions: The number of offset ranges the cluster is split into. Defaults to 8.
+            workers: The number of partitions read concurrently. Defaults to 4.
+            page_size: The number of records per request. Defaults to 1000.
+            include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`. Ids are always included. Defaults to `["metadatas", "documents"]`. Optional.
+            progress: Tracks how far each partition was consumed. An empty ScanProgress is planned from count() on the first call; a planned one is resumed. Optional.
+            as_numpy: If True, pages are ColumnarGetResults, see get. Optional.
+
+        Returns:
+            Iterator[GetResult]: The pages of the cluster as they arrive.
+        """
+        if page_size < 1:
+            raise ValueError(f"Expected page_size to be positive, got {page_size}")
+        include = validate_include(include, allow_distances=False)
+        if progress is None:
+            progress = ScanProgress()
+        if not progress.partitions:
+            progress.partitions = ScanProgress.plan(self.count(), partitions).partitions
+
+        def get_page(offset: int, limit: int) -> GetResult:
+            return self._client._get(
+                self.id,
+                None,
+                None,
+                None,
+                limit,
+                offset,
+                include=include,
+                as_numpy=as_numpy,
+            )
+
+        return cast(
+            Iterator[GetResult],
+            scan_partitions(get_page, progress, page_size=page_size, workers=workers),
         )
 
+    def replicate_local(
+        self,
+        path: Optional[str] = None,
+        space: "Space" = "l2",
+        page_size: int = 1000,
+        prefetch: int = 1,
+        as_numpy: bool = False,
+    ) -> "LocalCluster":
+        """Copy every record of the cluster into a LocalCluster that answers count, get
+        and find in process, without network round trips. find is a brute-force search
+        over all embeddings, so replicas suit clusters up to a few hundred thousand
+        records. The replica is not updated by later writes to the cluster.
+
+        Args:
+            path: A directory to store the replica in, with its embeddings memory-mapped. Reopen it with LocalCluster.open(path). If None, the replica is held in memory. Optional.
+            space: The distance function of find, one of `"l2"` (squared euclidean), `"cosine"` and `"ip"`. Should match the cluster's. Defaults to `"l2"`.
+            page_size: The number of records per request while copying. Defaults to 1000.
+            prefetch: The number of pages fetched ahead while copying. Defaults to 1.
+            as_numpy: The default result format of the replica's get and find. Defaults to False.
+
+        Returns:
+            LocalCluster: The replica.
+        """
+        from bagel.api.replica import replicate
+
+        return replicate(
+            self,
+            path=path,
+            space=space,
+            page_size=page_size,
+            prefetch=prefetch,
+            as_numpy=as_numpy,
+        )
+
+    @staticmethod
+    def _iter_pages(pages: Iterator[GetResult], page_size: int, records: bool) -> Iterator[Any]:
+        try:
+            for page in pages:
+                ids = page["ids"]
+                if ids:
+                    if records:
+                        yield from _page_records(page)
+                    else:
+                        yield page
+                if len(ids) < page_size:
+                    return
+        finally:
+            # Cancels the pages fetched past the end
+            cast(Generator[GetResult, None, None], pages).close()
+
     def peek(self, limit: int = 10) -> GetResult:
         """Get the first few results in the database up to limit
 
@@ -198,16 +579,20 @@ class Cluster(BaseModel):
         where: Optional[Where] = None,
         where_document: Optional[WhereDocument] = None,
         include: Include = ["metadatas", "documents", "distances"],
+        as_numpy: Optional[bool] = None,
+        timeout: Optional[float] = None,
     ) -> QueryResult:
         """Get the n_results nearest neighbor embeddings for provided query_embeddings or query_texts.
 
         Args:
-            query_embeddings: The embeddings to get the closes neighbors of. Optional.
+            query_embeddings: The embeddings to get the closes neighbors of. May be a 2-D numeric ndarray (or 1-D for a single embedding). Optional.
             query_texts: The document texts to get the closes neighbors of. Optional.
             n_results: The number of neighbors to return for each query_embedding or query_texts. Optional.
             where: A Where type dict used to filter results by. E.g. `{"color" : "red", "price": 4.20}`. Optional.
             where_document: A WhereDocument type dict used to filter by the documents. E.g. `{$contains: {"text": "hello"}}`. Optional.
             include: A list of what to include in the results. Can contain `"embeddings"`, `"metadatas"`, `"documents"`, `"distances"`. Ids are always included. Defaults to `["metadatas", "documents", "distances"]`. Optional.
+            as_numpy: If True, return a ColumnarQueryResult with (queries, k) ids and distances and (queries, k, dim) float32 embeddings. Defaults to the client's bagel_result_format setting. Optional.
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
 
         Returns:
             QueryResult: A QueryResult object containing the results.
@@ -246,14 +631,98 @@ class Cluster(BaseModel):
         if where_document is None:
             where_document = {}
 
-        return self._client._query(
-            cluster_id=self.id,
-            query_embeddings=query_embeddings,
-            n_results=n_results,
-            where=where,
-            where_document=where_document,
-            include=include,
-            query_texts=query_texts,
+        with deadline(timeout):
+            return self._client._query(
+                cluster_id=self.id,
+                query_embeddings=query_embeddings,
+                n_results=n_results,
+                where=where,
+                where_document=where_document,
+                include=include,
+                query_texts=query_texts,
+                as_numpy=as_numpy,
+            )
+
+    def find_many(
+        self,
+        query_embeddings: Optional[OneOrMany[Embedding]] = None,
+        query_texts: Optional[OneOrMany[Document]] = None,
+        n_results: int = 10,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = ["metadatas", "documents", "distances"],
+        batch_size: int = DEFAULT_QUERY_BATCH_SIZE,
+        workers: int = 4,
+        stream: bool = False,
+        as_numpy: Optional[bool] = None,
+        timeout: Optional[float] = None,
+    ) -> Union[ColumnarQueryResult, Iterator[QueryResult]]:
+        """Run a large number of queries by splitting them into batches of batch_size
+        queries that are sent concurrently, instead of one huge request or one request
+        per query.
+
+            for result in cluster.find_many(vectors, n_results=5, stream=True):
+                ...
+
+        Args:
+            query_embeddings: The embeddings to get the closest neighbors of. May be a 2-D numeric ndarray. Optional.
+            query_texts: The document texts to get the closest neighbors of. Optional.
+            n_results: The number of neighbors to return for each query. Defaults to 10.
+            where: A Where type dict used to filter results by. Optional.
+            where_document: A WhereDocument type dict used to filter by the documents. Optional.
+            include: A list of what to include in the results. Defaults to `["metadatas", "documents", "distances"]`. Optional.
+            batch_size: The maximum number of queries per request. Defaults to 256.
+            workers: The number of requests in flight. Defaults to 4.
+            stream: If True, return an iterator over the result of each batch, in input order. If False, wait for all batches and return a single ColumnarQueryResult. Defaults to False.
+            as_numpy: The result format of streamed batches, see find. Ignored when stream is False. Optional.
+            timeout: The maximum number of seconds for all batches together. Defaults to the client's per-operation timeouts. Optional.
+
+        Returns:
+            ColumnarQueryResult: The stacked results of all queries in input order, if stream is False.
+            Iterator[QueryResult]: The results of each batch in input order, if stream is True.
+
+        Raises:
+            ValueError: If you don't provide either query_embeddings or query_texts
+            ValueError: If you provide both query_embeddings and query_texts
+        """
+        where = validate_where(where) if where else {}
+        where_document = (
+            validate_where_document(where_document) if where_document else {}
+        )
+        include = validate_include(include, allow_distances=True)
+        n_results = validate_n_results(n_results)
+        if (query_embeddings is None) == (query_texts is None):
+            raise ValueError(
+                "You must provide either embeddings or texts to find, but not both"
+            )
+        if batch_size < 1:
+            raise ValueError(f"Expected batch_size to be positive, got {batch_size}")
+        if query_embeddings is not None:
+            queries = validate_embeddings(maybe_cast_one_to_many(query_embeddings))
+        else:
+            queries = maybe_cast_one_to_many(query_texts)
+
+        def query_batch(start: int) -> QueryResult:
+            batch = queries[start : start + batch_size]
+            return self._client._query(
+                cluster_id=self.id,
+                query_embeddings=batch if query_embeddings is not None else None,
+                query_texts=batch if query_texts is not None else None,
+                n_results=n_results,
+                where=where,
+                where_document=where_document,
+                include=include,
+                as_numpy=as_numpy if stream else True,
+            )
+
+        with deadline(timeout):
+            results = map_ordered(
+                query_batch, range(0, len(queries), batch_size), workers
+            )
+        if stream:
+            return results
+        return ColumnarQueryResult.concat(
+            cast(List[ColumnarQueryResult], list(results))
         )
 
     def modify(
@@ -280,14 +749,18 @@ class Cluster(BaseModel):
         embeddings: Optional[OneOrMany[Embedding]] = None,
         metadatas: Optional[OneOrMany[Metadata]] = None,
         documents: Optional[OneOrMany[Document]] = None,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
     ) -> None:
         """Update the embeddings, metadatas or documents for provided ids.
 
         Args:
             ids: The ids of the embeddings to update
-            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents using the embedding_function set for the cluster. Optional.
+            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents using the embedding_function set for the cluster. May be a 2-D numeric ndarray (or 1-D for a single embedding). Optional.
             metadatas:  The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
             documents: The documents to associate with the embeddings. Optional.
+            consistency: "none" or "read_your_writes". See add. Optional.
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
 
         Returns:
             None
@@ -297,7 +770,11 @@ class Cluster(BaseModel):
             ids, embeddings, metadatas, documents, require_embeddings_or_documents=False
         )
 
-        self._client._update(self.id, ids, embeddings, metadatas, documents)
+        with deadline(timeout):
+            self._client._update(self.id, ids, embeddings, metadatas, documents)
+            self._wait_for_consistency(
+                consistency, ids, embeddings, metadatas, documents
+            )
 
     def upsert(
         self,
@@ -306,14 +783,18 @@ class Cluster(BaseModel):
         metadatas: Optional[OneOrMany[Metadata]] = None,
         documents: Optional[OneOrMany[Document]] = None,
         increment_index: bool = True,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
     ) -> None:
         """Update the embeddings, metadatas or documents for provided ids, or create them if they don't exist.
 
         Args:
             ids: The ids of the embeddings to update
-            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents using the embedding_function set for the cluster. Optional.
+            embeddings: The embeddings to add. If None, embeddings will be computed based on the documents using the embedding_function set for the cluster. May be a 2-D numeric ndarray (or 1-D for a single embedding). Optional.
             metadatas:  The metadata to associate with the embeddings. When querying, you can filter on this metadata. Optional.
             documents: The documents to associate with the embeddings. Optional.
+            consistency: "none" or "read_your_writes". See add. Optional.
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
 
         Returns:
             None
@@ -323,20 +804,21 @@ class Cluster(BaseModel):
             ids, embeddings, metadatas, documents
         )
 
-        self._client._upsert(
-            cluster_id=self.id,
-            ids=ids,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            documents=documents,
-            increment_index=increment_index,
-        )
+        with deadline(timeout):
+            self._write_batch(
+                ids, embeddings, metadatas, documents, increment_index, upsert=True
+            )
+            self._wait_for_consistency(
+                consistency, ids, embeddings, metadatas, documents
+            )
 
     def delete(
         self,
         ids: Optional[IDs] = None,
         where: Optional[Where] = None,
         where_document: Optional[WhereDocument] = None,
+        consistency: Optional[WriteConsistency] = None,
+        timeout: Optional[float] = None,
     ) -> None:
         """Delete the embeddings based on ids and/or a where filter
 
@@ -344,6 +826,8 @@ class Cluster(BaseModel):
             ids: The ids of the embeddings to delete
             where: A Where type dict used to filter the delection by. E.g. `{"color" : "red", "price": 4.20}`. Optional.
             where_document: A WhereDocument type dict used to filter the deletion by the document content. E.g. `{$contains: {"text": "hello"}}`. Optional.
+            consistency: "none", or "read_your_writes" to wait until reads no longer return the ids. Deletes by a where or where_document filter do not wait, since which ids they remove is not known. See add. Optional.
+            timeout: The maximum number of seconds the call may take, retries included. Defaults to the client's per-operation timeouts. Optional.
 
         Returns:
             None
@@ -353,7 +837,10 @@ class Cluster(BaseModel):
         where_document = (
             validate_where_document(where_document) if where_document else None
         )
-        self._client._delete(self.id, ids, where, where_document)
+        with deadline(timeout):
+            self._client._delete(self.id, ids, where, where_document)
+            if ids and not where and not where_document:
+                self._wait_for_consistency(consistency, ids, deleted=True)
 
     def share_with(self, usernames: List[str]) -> None:
         self._client.share_cluster(str(self.id), usernames)
@@ -361,6 +848,134 @@ class Cluster(BaseModel):
     def create_index(self) -> None:
         self._client.create_index(self.name)
 
+    @contextmanager
+    def bulk_load(
+        self, wait_for_index: bool = False, timeout: float = 300.0
+    ) -> Iterator["Cluster"]:
+        """Context manager for large loads. Every write to this cluster inside the block
+        (add, upsert, add_bulk, ingest and buffered writers opened in the block) skips
+        incremental indexing, and the index is built once with create_index when the
+        outermost block exits. The block applies to the thread that opens it: writes made
+        through the same Cluster from other threads are indexed as usual.
+
+            with cluster.bulk_load(wait_for_index=True):
+                cluster.add_bulk(ids, embeddings)
+
+        If the block raises, the index is not built, since the load is incomplete; call
+        create_index once the remaining records are written.
+
+        Args:
+            wait_for_index: If True, after create_index poll until the last record written in the block is returned by find. Defaults to False.
+            timeout: The maximum number of seconds to wait for the index. Defaults to 300.
+
+        Raises:
+            TimeoutError: If wait_for_index is set and the index is not ready within timeout
+        """
+        loads = _bulk_loads.get()
+        if self.id in loads:
+            yield self
+            return
+
+        load = _BulkLoad()
+        token = _bulk_loads.set({**loads, self.id: load})
+        try:
+            yield self
+        finally:
+            load.open = False
+            _bulk_loads.reset(token)
+        self.create_index()
+        if wait_for_index and load.probe is not None:
+            self._wait_for_index(load.probe, timeout)
+
+    def _wait_for_index(
+        self, probe: Tuple[ID, Optional[Embedding], Optional[Document]], timeout: float
+    ) -> None:
+        """Poll with exponential backoff until the probe record is found through the index"""
+        id, embedding, document = probe
+        stop_at = time.monotonic() + timeout
+        delay = 0.1
+        while True:
+            with bypass_query_cache():
+                result = self._client._query(
+                    cluster_id=self.id,
+                    query_embeddings=[embedding] if embedding is not None else None,
+                    query_texts=[document] if embedding is None else None,
+                    n_results=10,
+                    include=[],
+                    as_numpy=False,
+                )
+            if id in result["ids"][0]:
+                return
+            if time.monotonic() + delay > stop_at:
+                raise TimeoutError(
+                    f"The index of cluster {self.name} was not ready after {timeout}s"
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+    def _write_batch(
+        self,
+        ids: IDs,
+        embeddings: Optional[Embeddings],
+        metadatas: Optional[Metadatas],
+        documents: Optional[Documents],
+        increment_index: bool = True,
+        upsert: bool = False,
+    ) -> None:
+        """Send one already validated batch of records"""
+        load = _bulk_loads.get().get(self.id)
+        if load is not None and load.open:
+            increment_index = False
+            load.probe = (
+                ids[-1],
+                list(map(float, embeddings[-1])) if embeddings is not None else None,
+                documents[-1] if documents is not None else None,
+            )
+        if upsert:
+            self._client._upsert(
+                self.id, ids, embeddings, metadatas, documents, increment_index
+            )
+        else:
+            self._client._add(
+                ids, self.id, embeddings, metadatas, documents, increment_index
+            )
+
+    def _wait_for_consistency(
+        self,
+        consistency: Optional[WriteConsistency],
+        ids: IDs,
+        embeddings: Optional[Embeddings] = None,
+        metadatas: Optional[Metadatas] = None,
+        documents: Optional[Documents] = None,
+        deleted: bool = False,
+    ) -> None:
+        """For read_your_writes, poll with exponential backoff until get returns the
+        first and last written rows with the written fields, or, after a delete, no
+        longer returns them. See consistency_probe."""
+        settings = self._client._system.settings
+        if consistency is None:
+            consistency = settings.bagel_write_consistency
+        if consistency != "read_your_writes":
+            return
+
+        probe, include, expected = consistency_probe(
+            ids, embeddings, metadatas, documents
+        )
+        stop_at = time.monotonic() + settings.bagel_consistency_timeout
+        delay = 0.05
+        while True:
+            found = self._client._get(
+                self.id, ids=probe, include=include, as_numpy=False
+            )
+            if probe_visible(found, probe, None if deleted else expected):
+                return
+            if time.monotonic() + delay > stop_at:
+                raise TimeoutError(
+                    f"Writes to cluster {self.name} were not visible after {settings.bagel_consistency_timeout}s"
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, 1.0)
+
     def _validate_embedding_set(
         self,
         ids: OneOrMany[ID],
@@ -374,37 +989,19 @@ class Cluster(BaseModel):
         Optional[List[Metadata]],
         Optional[List[Document]],
     ]:
-        ids = validate_ids(maybe_cast_one_to_many(ids))
-        embeddings = (
-            validate_embeddings(maybe_cast_one_to_many(embeddings))
-            if embeddings is not None
-            else None
-        )
-        metadatas = (
-            validate_metadatas(maybe_cast_one_to_many(metadatas))
-            if metadatas is not None
-            else None
+        return validate_embedding_set(
+            ids, embeddings, metadatas, documents, require_embeddings_or_documents
         )
-        documents = maybe_cast_one_to_many(documents) if documents is not None else None
 
-        # Check that one of embeddings or documents is provided
-        if require_embeddings_or_documents:
-            if embeddings is None and documents is None:
-                raise ValueError(
-                    "You must provide either embeddings or documents, or both"
-                )
 
-        # Check that, if they're provided, the lengths of the arrays match the length of ids
-        if embeddings is not None and len(embeddings) != len(ids):
-            raise ValueError(
-                f"Number of embeddings {len(embeddings)} must match number of ids {len(ids)}"
-            )
-        if metadatas is not None and len(metadatas) != len(ids):
-            raise ValueError(
-                f"Number of metadatas {len(metadatas)} must match number of ids {len(ids)}"
-            )
-        if documents is not None and len(documents) != len(ids):
-            raise ValueError(
-                f"Number of documents {len(documents)} must match number of ids {len(ids)}"
-            )
-        return ids, embeddings, metadatas, documents  # type: ignore
+def _page_records(page: GetResult) -> Iterator[Dict[str, Any]]:
+    columns = {
+        "embedding": page.get("embeddings", None),
+        "metadata": page.get("metadatas", None),
+        "document": page.get("documents", None),
+    }
+    for i, id in enumerate(page["ids"]):
+        record: Dict[str, Any] = {"id": id}
+        for key, column in columns.items():
+            record[key] = column[i] if column is not None else None
+        yield record
@@ -4,6 +4,7 @@ from uuid import UUID
 
 import pandas as pd
 from bagel.api.Cluster import Cluster
+from bagel.api.AsyncCluster import AsyncCluster
 from bagel.api.types import (
     ClusterMetadata,
     Document,
@@ -260,7 +261,8 @@ class API(Component, ABC):
         page_size: Optional[int] = None,
         where_document: Optional[WhereDocument] = {},
         include: Include = ["embeddings", "metadatas", "documents"],
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        as_numpy: Optional[bool] = None
     ) -> GetResult:
         """Gets embeddings from the database. Supports filtering, sorting, and pagination.
         ⚠️ This method should not be used directly.
@@ -272,6 +274,7 @@ class API(Component, ABC):
             offset: The number of embeddings to skip before returning. Defaults to None.
             page: The page number to return. Defaults to None.
             page_size: The number of embeddings to return per page. Defaults to None.
+            as_numpy: Return a ColumnarGetResult backed by NumPy arrays. Defaults to the bagel_result_format setting.
 
         Returns:
             pd.DataFrame: A pandas dataframe containing the embeddings and metadata
@@ -309,7 +312,8 @@ class API(Component, ABC):
         where_document: WhereDocument = {},
         include: Include = ["embeddings", "metadatas", "documents", "distances"],
         query_texts: Optional[OneOrMany[Document]] = None,
-        api_key: Optional[str] = None
+        api_key: Optional[str] = None,
+        as_numpy: Optional[bool] = None
     ) -> QueryResult:
         """Gets the nearest neighbors of a single embedding
         ⚠️ This method should not be used directly.
@@ -318,6 +322,7 @@ class API(Component, ABC):
             embedding: The embedding to find the nearest neighbors of
             n_results: The number of nearest neighbors to return. Defaults to 10.
             where: A dictionary of key-value pairs to filter the embeddings by. Defaults to {}.
+            as_numpy: Return a ColumnarQueryResult backed by NumPy arrays. Defaults to the bagel_result_format setting.
         """
         pass
 
@@ -567,3 +572,191 @@ class API(Component, ABC):
     def get_model_files_list(self, asset_id: str, api_key: Optional[str] = None):
         """get model files"""
         pass
+
+
+class AsyncAPI(Component, ABC):
+    """The asyncio counterpart of API, covering the cluster surface of the client"""
+
+    @abstractmethod
+    async def ping(self) -> int:
+        """Returns the current server time in nanoseconds to check if the server is alive"""
+        pass
+
+    @abstractmethod
+    async def get_version(self) -> str:
+        """Get the version of Bagel."""
+        pass
+
+    @abstractmethod
+    async def get_all_clusters(
+        self, user_id: str = DEFAULT_TENANT, api_key: Optional[str] = None
+    ) -> Sequence[AsyncCluster]:
+        """Returns all clusters in the database"""
+        pass
+
+    @abstractmethod
+    async def create_cluster(
+        self,
+        name: str,
+        metadata: Optional[ClusterMetadata] = None,
+        get_or_create: bool = False,
+        user_id: str = DEFAULT_TENANT,
+        api_key: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        dimension: Optional[int] = None
+    ) -> AsyncCluster:
+        """Creates a new cluster in the database"""
+        pass
+
+    @abstractmethod
+    async def get_or_create_cluster(
+        self,
+        name: str,
+        metadata: Optional[ClusterMetadata] = None,
+        user_id: str = DEFAULT_TENANT,
+        api_key: Optional[str] = None,
+        embedding_model: Optional[str] = None,
+        dimension: Optional[int] = None
+    ) -> AsyncCluster:
+        """Calls create_cluster with get_or_create=True."""
+        pass
+
+    @abstractmethod
+    async def get_cluster(
+        self,
+        name: str,
+        user_id: str = DEFAULT_TENANT,
+        api_key: Optional[str] = None
+    ) -> AsyncCluster:
+        """Gets a cluster from the database by name"""
+        pass
+
+    @abstractmethod
+    async def delete_cluster(
+        self,
+        name: str,
+        user_id: str = DEFAULT_TENANT,
+        api_key: Optional[str] = None
+    ) -> None:
+        """Deletes a cluster from the database"""
+        pass
+
+    @abstractmethod
+    async def _modify(
+        self,
+        id: UUID,
+        new_name: Optional[str] = None,
+        new_metadata: Optional[ClusterMetadata] = None,
+        api_key: Optional[str] = None
+    ) -> None:
+        """Modify a cluster in the database - can update the name and/or metadata"""
+        pass
+
+    @abstractmethod
+    async def _add(
+        self,
+        ids: IDs,
+        cluster_id: UUID,
+        embeddings: Optional[Embeddings] = None,
+        metadatas: Optional[Metadatas] = None,
+        documents: Optional[Documents] = None,
+        increment_index: bool = True,
+        api_key: Optional[str] = None
+    ) -> bool:
+        """Add embeddings to the data store. See API._add"""
+        pass
+
+    @abstractmethod
+    async def _update(
+        self,
+        cluster_id: UUID,
+        ids: IDs,
+        embeddings: Optional[Embeddings] = None,
+        metadatas: Optional[Metadatas] = None,
+        documents: Optional[Documents] = None,
+        api_key: Optional[str] = None
+    ) -> bool:
+        """Update entries in the data store. See API._update"""
+        pass
+
+    @abstractmethod
+    async def _upsert(
+        self,
+        cluster_id: UUID,
+        ids: IDs,
+        embeddings: Optional[Embeddings] = None,
+        metadatas: Optional[Metadatas] = None,
+        documents: Optional[Documents] = None,
+        increment_index: bool = True,
+        api_key: Optional[str] = None
+    ) -> bool:
+        """Add or update entries in the data store. See API._upsert"""
+        pass
+
+    @abstractmethod
+    async def _count(self, cluster_id: UUID, api_key: Optional[str] = None) -> int:
+        """Returns the number of embeddings in the cluster"""
+        pass
+
+    @abstractmethod
+    async def _peek(
+        self, cluster_id: UUID, n: int = 10, api_key: Optional[str] = None
+    ) -> GetResult:
+        pass
+
+    @abstractmethod
+    async def _get(
+        self,
+        cluster_id: UUID,
+        ids: Optional[IDs] = None,
+        where: Optional[Where] = {},
+        sort: Optional[str] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        page: Optional[int] = None,
+        page_size: Optional[int] = None,
+        where_document: Optional[WhereDocument] = {},
+        include: Include = ["metadatas", "documents"],
+        api_key: Optional[str] = None,
+        as_numpy: Optional[bool] = None
+    ) -> GetResult:
+        """Gets embeddings from the database. See API._get"""
+        pass
+
+    @abstractmethod
+    async def _delete(
+        self,
+        cluster_id: UUID,
+        ids: Optional[IDs] = None,
+        where: Optional[Where] = {},
+        where_document: Optional[WhereDocument] = {},
+        api_key: Optional[str] = None
+    ) -> IDs:
+        """Deletes embeddings from the database. See API._delete"""
+        pass
+
+    @abstractmethod
+    async def _query(
+        self,
+        cluster_id: UUID,
+        query_embeddings: Optional[Embeddings],
+        n_results: int = 10,
+        where: Optional[Where] = {},
+        where_document: Optional[WhereDocument] = {},
+        include: Include = ["metadatas", "documents", "distances"],
+        query_texts: Optional[OneOrMany[Document]] = None,
+        api_key: Optional[str] = None,
+        as_numpy: Optional[bool] = None
+    ) -> QueryResult:
+        """Gets the nearest neighbors of the query embeddings or texts. See API._query"""
+        pass
+
+    @abstractmethod
+    async def create_index(self, cluster_name: str) -> bool:
+        """Creates an index for the given cluster"""
+        pass
+
+    @abstractmethod
+    async def aclose(self) -> None:
+        """Close the underlying connection pool"""
+        pass
@@ -0,0 +1,583 @@
+from typing import Optional, cast, Any, Sequence, Tuple, Dict
+from bagel.api import AsyncAPI
+from bagel.config import System
+from bagel.api.types import (
+    Document,
+    Documents,
+    Embeddings,
+    IDs,
+    Include,
+    Metadatas,
+    Where,
+    WhereDocument,
+    GetResult,
+    QueryResult,
+    ClusterMetadata,
+    OneOrMany,
+)
+from bagel.api.AsyncCluster import AsyncCluster
+from bagel.api.columnar import ColumnarGetResult, ColumnarQueryResult
+from bagel.api.circuit import CircuitBreakers
+from bagel.api.hedging import Hedger
+from bagel.api.http import (
+    DEFAULT_TENANT,
+    headers_with_api_key,
+    raise_bagel_error,
+    resolve_user_id,
+)
+from bagel.api.retry import RetryPolicy
+from bagel.api.timeouts import OperationClass, Timeouts, remaining
+from bagel.api.encoding import (
+    ACCEPT_EMBEDDING_ENCODING_HEADER,
+    JSON,
+    decode_embeddings,
+    embeddings_to_json,
+    encode_embeddings,
+    server_supports,
+)
+from uuid import UUID
+from overrides import override
+import asyncio
+from functools import partial
+import json
+import time
+import warnings
+
+try:
+    import httpx
+
+    # See fastapi._TRANSIENT_ERRORS: UnsupportedProtocol and LocalProtocolError, the
+    # other TransportErrors, fail the same way every time
+    _TRANSIENT_ERRORS: Tuple[type, ...] = (
+        httpx.TimeoutException,
+        httpx.NetworkError,
+        httpx.RemoteProtocolError,
+        httpx.ProxyError,
+    )
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+    _TRANSIENT_ERRORS = ()
+
+class AsyncFastAPI(AsyncAPI):
+    """asyncio REST client. Requires the optional httpx dependency
+    (pip install "bagelML[async]")."""
+
+    def __init__(self, system: System):
+        super().__init__(system)
+        if httpx is None:
+            raise ImportError(
+                "The rest-async client requires httpx. Install it with `pip install httpx`."
+            )
+        settings = system.settings
+        url_prefix = "https" if settings.bagel_server_ssl_enabled else "http"
+        self._headers = {"bagel_source": settings.bagel_source}
+        settings.require("bagel_server_host")
+        if settings.bagel_server_http_port:
+            self._api_url = f"{url_prefix}://{settings.bagel_server_host}:{settings.bagel_server_http_port}/api/v1"
+        else:
+            self._api_url = f"{url_prefix}://{settings.bagel_server_host}/api/v1"
+
+        # Requests beyond the pool size wait for a free connection instead of failing
+        limits = httpx.Limits(
+            max_connections=settings.bagel_http_pool_maxsize,
+            max_keepalive_connections=settings.bagel_http_pool_maxsize,
+            keepalive_expiry=settings.bagel_http_keepalive_timeout,
+        )
+        self._client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(None))
+        self.timeouts = Timeouts.from_settings(settings)
+        self.retry_policy = RetryPolicy.from_settings(settings)
+        self.circuit_breakers = CircuitBreakers.from_settings(settings)
+        self.hedger: Optional[Hedger] = None
+        if settings.bagel_hedge_queries:
+            self.hedger = Hedger(
+                percentile=settings.bagel_hedge_percentile,
+                max_ratio=settings.bagel_hedge_max_ratio,
+                min_delay=settings.bagel_hedge_min_delay,
+            )
+
+        self._embedding_encoding = settings.bagel_embedding_encoding
+        self._server_accepts_encoding: Optional[bool] = None
+        self._closing: Optional["asyncio.Task[None]"] = None
+        if self._embedding_encoding != JSON:
+            self._headers[ACCEPT_EMBEDDING_ENCODING_HEADER] = self._embedding_encoding
+
+    async def _request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        operation: Optional[OperationClass] = None,
+        **kwargs: Any,
+    ) -> "httpx.Response":
+        """Send a request, retrying transient failures as retry_policy decides.
+        See FastAPI._request"""
+        policy = self.retry_policy
+        timeout = kwargs.pop("timeout", None)
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            connect, read = self.timeouts.for_request(method, url, operation, timeout)
+            kwargs["timeout"] = httpx.Timeout(read, connect=connect)
+            try:
+                resp = await self._send(method, url, **kwargs)
+            except _TRANSIENT_ERRORS as e:
+                delay = policy.next_delay(
+                    attempt,
+                    method,
+                    url,
+                    time.monotonic() - start,
+                    error=e,
+                    sent=not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)),
+                    idempotent=idempotent,
+                    deadline=remaining(),
+                )
+                if delay is None:
+                    raise
+            else:
+                delay = policy.next_delay(
+                    attempt,
+                    method,
+                    url,
+                    time.monotonic() - start,
+                    status=resp.status_code,
+                    headers=resp.headers,
+                    idempotent=idempotent,
+                    deadline=remaining(),
+                )
+                if delay is None:
+                    return resp
+            await asyncio.sleep(delay)
+
+    async def _send(self, method: str, url: str, **kwargs: Any) -> "httpx.Response":
+        """Send one request through the circuit breaker of its host and route class"""
+        circuit = self.circuit_breakers.get(url)
+        if circuit is None:
+            return await self._client.request(method, url, **kwargs)
+        name, breaker = circuit
+        breaker.before_call(name)
+        start = time.monotonic()
+        try:
+            resp = await self._client.request(method, url, **kwargs)
+        except _TRANSIENT_ERRORS:
+            breaker.record(time.monotonic() - start, failed=True)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(time.monotonic() - start, failed=resp.status_code >= 500)
+        return resp
+
+    @override
+    async def aclose(self) -> None:
+        """Closes the connection pool. This is the way to shut the client down; call it
+        from the event loop that used the client, or use it as an async context manager"""
+        await self._client.aclose()
+
+    async def __aenter__(self) -> "AsyncFastAPI":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.aclose()
+
+    @override
+    def stop(self) -> None:
+        """Schedules aclose on the running event loop. The pool is bound to the loop that
+        used it, so outside a loop nothing can close it: await aclose instead."""
+        super().stop()
+        if self._client.is_closed:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            warnings.warn(
+                "AsyncFastAPI.stop() was called outside an event loop and cannot close "
+                "the connection pool; await client.aclose() instead",
+                ResourceWarning,
+            )
+            return
+        # Referenced, so the task is not garbage collected before it runs
+        self._closing = loop.create_task(self.aclose())
+
+    async def _encode_embeddings(self, embeddings: Optional[Embeddings]) -> Any:
+        """Encode embeddings for a request body. See FastAPI._encode_embeddings"""
+        if embeddings is None:
+            return None
+        if self._embedding_encoding != JSON:
+            accepts = self._server_accepts_encoding
+            if accepts is None:
+                resp = await self._request("GET", self._api_url, headers=self._headers)
+                if resp.is_success:
+                    accepts = server_supports(resp.headers, self._embedding_encoding)
+                    self._server_accepts_encoding = accepts
+            if accepts:
+                return encode_embeddings(embeddings)
+        return embeddings_to_json(embeddings)
+
+    def _as_numpy(self, as_numpy: Optional[bool]) -> bool:
+        if as_numpy is None:
+            return self._system.settings.bagel_result_format == "numpy"
+        return as_numpy
+
+    @override
+    async def ping(self) -> int:
+        """Returns the current server time in nanoseconds to check if the server is alive"""
+        resp = await self._request("GET", self._api_url, headers=self._headers)
+        raise_bagel_error(resp)
+        return int(resp.json()["nanosecond heartbeat"])
+
+    @override
+    async def get_version(self) -> str:
+        """Returns the version of the server"""
+        resp = await self._request("GET", self._api_url + "/version", headers=self._headers)
+        raise_bagel_error(resp)
+        return cast(str, resp.json())
+
+    @override
+    async def get_all_clusters(
+        self, user_id: str = DEFAULT_TENANT, api_key: Optional[str] = None
+    ) -> Sequence[AsyncCluster]:
+        """Returns a list of all clusters"""
+        headers, user_id = self._headers_and_user_id(api_key, user_id)
+        resp = await self._request(
+            "GET", self._api_url + "/clusters", headers=headers, params={"user_id": user_id}
+        )
+        raise_bagel_error(resp)
+        return [AsyncCluster(self, **json_cluster) for json_cluster in resp.json()]
+
+    @override
+    async def create_cluster(
+            self,
+            name: str,
+            metadata: Optional[ClusterMetadata] = None,
+            get_or_create: bool = False,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None,
+            embedding_model: Optional[str] = None,
+            dimension: Optional[int] = None
+    ) -> AsyncCluster:
+        """Creates a cluster"""
+        headers, user_id = self._headers_and_user_id(api_key, user_id)
+        resp = await self._request(
+            "POST",
+            self._api_url + "/clusters",
+            content=json.dumps(
+                {"name": name, "metadata": metadata, "get_or_create": get_or_create,
+                 "user_id": user_id, "embedding_model": embedding_model, "dimensions": dimension}
+            ),
+            headers=headers
+        )
+        raise_bagel_error(resp)
+        return self._cluster_from_json(resp.json())
+
+    @override
+    async def get_or_create_cluster(
+            self,
+            name: str,
+            metadata: Optional[ClusterMetadata] = None,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None,
+            embedding_model: Optional[str] = None,
+            dimension: Optional[int] = None
+    ) -> AsyncCluster:
+        """Get a cluster, or return it if it exists"""
+        return await self.create_cluster(name, metadata, get_or_create=True, user_id=user_id,
+                                         api_key=api_key, embedding_model=embedding_model,
+                                         dimension=dimension)
+
+    @override
+    async def get_cluster(
+            self,
+            name: str,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None
+    ) -> AsyncCluster:
+        """Returns a cluster"""
+        headers, user_id = self._headers_and_user_id(api_key, user_id)
+        resp = await self._request(
+            "GET", f"{self._api_url}/clusters/{name}", headers=headers, params={"user_id": user_id}
+        )
+        raise_bagel_error(resp)
+        return self._cluster_from_json(resp.json())
+
+    @override
+    async def delete_cluster(
+            self,
+            name: str,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None
+    ) -> None:
+        """Deletes a cluster"""
+        headers, user_id = self._headers_and_user_id(api_key, user_id)
+        resp = await self._request(
+            "DELETE", f"{self._api_url}/clusters/{name}", headers=headers, params={"user_id": user_id}
+        )
+        raise_bagel_error(resp)
+
+    @override
+    async def _modify(
+            self,
+            id: UUID,
+            new_name: Optional[str] = None,
+            new_metadata: Optional[ClusterMetadata] = None,
+            api_key: Optional[str] = None
+    ) -> None:
+        """Updates a cluster"""
+        resp = await self._request(
+            "PUT",
+            self._api_url + "/clusters/" + str(id),
+            content=json.dumps({"new_metadata": new_metadata, "new_name": new_name}),
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+
+    @override
+    async def _count(self, cluster_id: UUID, api_key: Optional[str] = None) -> int:
+        """Returns the number of embeddings in the database"""
+        resp = await self._request(
+            "GET",
+            self._api_url + "/clusters/" + str(cluster_id) + "/count",
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+        return cast(int, resp.json())
+
+    @override
+    async def _peek(self, cluster_id: UUID, n: int = 10,
+                    api_key: Optional[str] = None) -> GetResult:
+        return await self._get(
+            cluster_id,
+            limit=n,
+            include=["embeddings", "documents", "metadatas"],
+            api_key=api_key
+        )
+
+    @override
+    async def _get(
+            self,
+            cluster_id: UUID,
+            ids: Optional[IDs] = None,
+            where: Optional[Where] = {},
+            sort: Optional[str] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+            page: Optional[int] = None,
+            page_size: Optional[int] = None,
+            where_document: Optional[WhereDocument] = {},
+            include: Include = ["metadatas", "documents"],
+            api_key: Optional[str] = None,
+            as_numpy: Optional[bool] = None
+    ) -> GetResult:
+        """Gets embeddings from the database"""
+        if page and page_size:
+            offset = (page - 1) * page_size
+            limit = page_size
+
+        resp = await self._request(
+            "POST",
+            self._api_url + "/clusters/" + str(cluster_id) + "/get",
+            content=json.dumps(
+                {
+                    "ids": ids,
+                    "where": where,
+                    "sort": sort,
+                    "limit": limit,
+                    "offset": offset,
+                    "where_document": where_document,
+                    "include": include,
+                }
+            ),
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+        body = resp.json()
+        if self._as_numpy(as_numpy):
+            return ColumnarGetResult.from_body(body)
+        return GetResult(
+            ids=body["ids"],
+            embeddings=decode_embeddings(body.get("embeddings", None)),
+            metadatas=body.get("metadatas", None),
+            documents=body.get("documents", None),
+        )
+
+    @override
+    async def _delete(
+            self,
+            cluster_id: UUID,
+            ids: Optional[IDs] = None,
+            where: Optional[Where] = {},
+            where_document: Optional[WhereDocument] = {},
+            api_key: Optional[str] = None
+    ) -> IDs:
+        """Deletes embeddings from the database"""
+        resp = await self._request(
+            "POST",
+            self._api_url + "/clusters/" + str(cluster_id) + "/delete",
+            content=json.dumps(
+                {"where": where, "ids": ids, "where_document": where_document}
+            ),
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+        return cast(IDs, resp.json())
+
+    @override
+    async def _add(
+            self,
+            ids: IDs,
+            cluster_id: UUID,
+            embeddings: Optional[Embeddings] = None,
+            metadatas: Optional[Metadatas] = None,
+            documents: Optional[Documents] = None,
+            increment_index: bool = True,
+            api_key: Optional[str] = None
+    ) -> bool:
+        """Adds a batch of embeddings to the database"""
+        resp = await self._request(
+            "POST",
+            self._api_url + "/clusters/" + str(cluster_id) + "/add",
+            content=json.dumps(
+                {
+                    "ids": ids,
+                    "embeddings": await self._encode_embeddings(embeddings),
+                    "metadatas": metadatas,
+                    "documents": documents,
+                    "increment_index": increment_index,
+                }
+            ),
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+        return True
+
+    @override
+    async def _update(
+            self,
+            cluster_id: UUID,
+            ids: IDs,
+            embeddings: Optional[Embeddings] = None,
+            metadatas: Optional[Metadatas] = None,
+            documents: Optional[Documents] = None,
+            api_key: Optional[str] = None
+    ) -> bool:
+        """Updates a batch of embeddings in the database"""
+        resp = await self._request(
+            "POST",
+            self._api_url + "/clusters/" + str(cluster_id) + "/update",
+            content=json.dumps(
+                {
+                    "ids": ids,
+                    "embeddings": await self._encode_embeddings(embeddings),
+                    "metadatas": metadatas,
+                    "documents": documents,
+                }
+            ),
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+        return True
+
+    @override
+    async def _upsert(
+            self,
+            cluster_id: UUID,
+            ids: IDs,
+            embeddings: Optional[Embeddings] = None,
+            metadatas: Optional[Metadatas] = None,
+            documents: Optional[Documents] = None,
+            increment_index: bool = True,
+            api_key: Optional[str] = None
+    ) -> bool:
+        """Adds or updates a batch of embeddings in the database"""
+        resp = await self._request(
+            "POST",
+            self._api_url + "/clusters/" + str(cluster_id) + "/upsert",
+            content=json.dumps(
+                {
+                    "ids": ids,
+                    "embeddings": await self._encode_embeddings(embeddings),
+                    "metadatas": metadatas,
+                    "documents": documents,
+                    "increment_index": increment_index,
+                }
+            ),
+            headers=self._headers_with_api_key(api_key)
+        )
+        raise_bagel_error(resp)
+        return True
+
+    @override
+    async def _query(
+            self,
+            cluster_id: UUID,
+            query_embeddings: Optional[Embeddings],
+            n_results: int = 10,
+            where: Optional[Where] = {},
+            where_document: Optional[WhereDocument] = {},
+            include: Include = ["metadatas", "documents", "distances"],
+            query_texts: Optional[OneOrMany[Document]] = None,
+            api_key: Optional[str] = None,
+            as_numpy: Optional[bool] = None
+    ) -> QueryResult:
+        """Gets the nearest neighbors of the query embeddings or texts"""
+        url = self._api_url + "/clusters/" + str(cluster_id) + "/query"
+        content = json.dumps(
+            {
+                "query_embeddings": await self._encode_embeddings(query_embeddings),
+                "n_results": n_results,
+                "where": where,
+                "where_document": where_document,
+                "include": include,
+                "query_texts": query_texts,
+            }
+        )
+        send = partial(
+            self._request,
+            "POST",
+            url,
+            content=content,
+            headers=self._headers_with_api_key(api_key),
+        )
+        if self.hedger is not None:
+            resp = await self.hedger.arun(send)
+        else:
+            resp = await send()
+        raise_bagel_error(resp)
+        body = resp.json()
+        if self._as_numpy(as_numpy):
+            return ColumnarQueryResult.from_body(body)
+        return QueryResult(
+            ids=body["ids"],
+            distances=body.get("distances", None),
+            embeddings=decode_embeddings(body.get("embeddings", None)),
+            metadatas=body.get("metadatas", None),
+            documents=body.get("documents", None),
+        )
+
+    @override
+    async def create_index(self, cluster_name: str) -> bool:
+        """Creates an index for the given cluster"""
+        resp = await self._request(
+            "POST", self._api_url + "/clusters/" + cluster_name + "/create_index"
+        )
+        raise_bagel_error(resp)
+        return cast(bool, resp.json())
+
+    def _cluster_from_json(self, resp_json: Dict[str, Any]) -> AsyncCluster:
+        return AsyncCluster(
+            client=self,
+            id=resp_json["id"],
+            name=resp_json["name"],
+            metadata=resp_json["metadata"],
+            cluster_size=resp_json["cluster_size"],
+            embedding_size=resp_json["embedding_size"]
+        )
+
+    def _headers_with_api_key(self, api_key: Optional[str]) -> Dict[str, str]:
+        return headers_with_api_key(self._headers, api_key)
+
+    def _headers_and_user_id(
+        self, api_key: Optional[str], user_id: str
+    ) -> Tuple[Dict[str, str], str]:
+        return self._headers_with_api_key(api_key), resolve_user_id(user_id)
+
@@ -0,0 +1,443 @@
+"""In-process caches of query results.
+
+QueryCache keeps the raw response body of recent /query calls, keyed on everything that
+determines the result. It is bounded by entry count and total bytes (least recently used
+entries are evicted first) and entries expire after a TTL.
+
+SemanticQueryCache keeps the result row of each recent query embedding, and answers a
+new query from the row of a cached embedding within max_distance cosine distance of it,
+provided the cluster, n_results, filters and include are the same.
+
+The client invalidates a cluster's entries in both caches whenever it writes to that
+cluster.
+"""
+import contextvars
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Hashable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from bagel.api.types import filter_key
+
+
+# The number of cluster generations kept before those of uncached clusters are pruned
+_MIN_GENERATIONS = 64
+
+_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "bagel_bypass_query_cache", default=False
+)
+
+
+@contextmanager
+def bypass_query_cache() -> Iterator[None]:
+    """Queries inside the block always go to the server, e.g. when polling for a
+    change"""
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def query_cache_bypassed() -> bool:
+    return _bypass.get()
+
+
+class _Entry(NamedTuple):
+    cluster_id: str
+    expires_at: Optional[float]
+    body: bytes
+
+
+def embeddings_digest(embeddings: Any) -> Optional[Tuple[Tuple[int, ...], str]]:
+    """A compact hash of a batch of embeddings, over their own dtype and bytes. A list
+    hashes like the array numpy makes of it; float32 and float64 batches differ, as
+    they encode to different request bodies."""
+    if embeddings is None:
+        return None
+    try:
+        block = np.ascontiguousarray(embeddings)
+    except ValueError:
+        block = None
+    if block is None or block.dtype.hasobject:
+        # Ragged batches have no array form
+        data = _canonical(embeddings).encode()
+        return (), hashlib.blake2b(data, digest_size=16).hexdigest()
+    digest = hashlib.blake2b(block.dtype.str.encode(), digest_size=16)
+    digest.update(block.data)
+    return block.shape, digest.hexdigest()
+
+
+def _canonical(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+def _filter(value: Any) -> Hashable:
+    """Keys a where or where_document filter by value, the same key compile_where
+    caches it under, without serialising it"""
+    key = filter_key(value or {})
+    return key if key is not None else _canonical(value)
+
+
+class _ClusterCache:
+    """Counters and write invalidation shared by the query caches"""
+
+    def __init__(self, ttl: Optional[float]):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Set to a new value of _counter on every invalidation, so results of queries
+        # that raced a write are not stored. Clusters without an entry read _floor,
+        # which is no older than the last write to any of them.
+        self._generations: Dict[str, int] = {}
+        self._global_generation = 0
+        self._counter = 0
+        self._floor = 0
+        self._prune_at = _MIN_GENERATIONS
+        self._lock = threading.Lock()
+
+    def generation(self, cluster_id: Any) -> Tuple[int, int]:
+        """Read before sending a query and passed to put with its result"""
+        with self._lock:
+            return self._global_generation, self._cluster_generation(str(cluster_id))
+
+    def _cluster_generation(self, cluster_id: str) -> int:
+        return self._generations.get(cluster_id, self._floor)
+
+    def _is_current(self, cluster_id: str, generation: Tuple[int, int]) -> bool:
+        return generation == (
+            self._global_generation,
+            self._cluster_generation(cluster_id),
+        )
+
+    def _expires_at(self) -> Optional[float]:
+        return None if self.ttl is None else time.monotonic() + self.ttl
+
+    def invalidate(self, cluster_id: Optional[Any] = None) -> None:
+        """Drops the entries of one cluster, or of every cluster if cluster_id is None"""
+        with self._lock:
+            self.invalidations += 1
+            if cluster_id is None:
+                self._global_generation += 1
+                self._generations.clear()
+                self._drop(None)
+                return
+            cluster_id = str(cluster_id)
+            self._counter += 1
+            self._generations[cluster_id] = self._counter
+            self._drop(cluster_id)
+            if len(self._generations) > self._prune_at:
+                self._prune_generations()
+
+    def _prune_generations(self) -> None:
+        """Forget the generations of clusters with no cached entries. Their in-flight
+        queries then compare against a raised floor and are not stored, which is safe.
+        Runs when the count doubles, so it costs O(1) amortized per invalidation."""
+        cached = self._cached_clusters()
+        for cluster_id in [c for c in self._generations if c not in cached]:
+            self._floor = max(self._floor, self._generations.pop(cluster_id))
+        self._prune_at = max(_MIN_GENERATIONS, 2 * len(self._generations))
+
+    def _drop(self, cluster_id: Optional[str]) -> None:
+        raise NotImplementedError()
+
+    def _cached_clusters(self) -> Set[str]:
+        raise NotImplementedError()
+
+
+class QueryCache(_ClusterCache):
+    """Exact-match cache of query response bodies.
+
+    Args:
+        max_entries: The maximum number of cached results.
+        max_bytes: The maximum total size of the cached response bodies.
+        ttl: The number of seconds a result stays valid, or None for no expiry.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: Optional[float] = 60.0,
+    ):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, _Entry]" = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def key(
+        cluster_id: Any,
+        query_embeddings: Any,
+        query_texts: Any,
+        n_results: int,
+        where: Any,
+        where_document: Any,
+        include: Any,
+    ) -> Hashable:
+        return (
+            str(cluster_id),
+            embeddings_digest(query_embeddings),
+            tuple(query_texts) if query_texts is not None else None,
+            n_results,
+            _filter(where),
+            _filter(where_document),
+            tuple(include),
+        )
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """The cached response body for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (
+                entry.expires_at is None or entry.expires_at > time.monotonic()
+            ):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.body
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(
+        self, key: Hashable, cluster_id: Any, body: bytes, generation: Tuple[int, int]
+    ) -> None:
+        """Stores a response body, unless the cluster was written to since generation
+        was read or the body alone exceeds max_bytes"""
+        cluster_id = str(cluster_id)
+        if len(body) > self.max_bytes:
+            return
+        expires_at = self._expires_at()
+        with self._lock:
+            if not self._is_current(cluster_id, generation):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(cluster_id, expires_at, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, cluster_id: Optional[str]) -> None:
+        if cluster_id is None:
+            self._entries.clear()
+            self._bytes = 0
+            return
+        for key in [k for k, e in self._entries.items() if e.cluster_id == cluster_id]:
+            self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+
+    def _cached_clusters(self) -> Set[str]:
+        return {entry.cluster_id for entry in self._entries.values()}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+class _Row(NamedTuple):
+    cluster_id: str
+    context: Hashable
+    expires_at: Optional[float]
+    row: Dict[str, Any]
+
+
+class SemanticQueryCache(_ClusterCache):
+    """Cache of per-query result rows, looked up by cosine similarity of the query
+    embedding. Each query context (API key, cluster, n_results, where, where_document
+    and include) has a small matrix of unit-normalized recent query vectors; a lookup is
+    one matrix-vector product over it.
+
+    A hit serves the rows of a different, nearby query, so its distances would be those
+    of that query. They are left out: a hit has distances None, and callers that need
+    exact distances should not enable the cache.
+
+    Args:
+        max_distance: The largest cosine distance at which a cached row is served.
+        max_entries: The maximum number of cached rows over all contexts.
+        ttl: The number of seconds a row stays valid, or None for no expiry.
+    """
+
+    def __init__(
+        self,
+        max_distance: float = 0.05,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 60.0,
+    ):
+        super().__init__(ttl)
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self._rows: "OrderedDict[int, _Row]" = OrderedDict()
+        # context -> (row ids, unit vectors), row i of the matrix belongs to ids[i]
+        self._index: Dict[Hashable, Tuple[List[int], np.ndarray]] = {}
+        self._next_id = 0
+
+    @staticmethod
+    def context(
+        api_key: Optional[str],
+        cluster_id: Any,
+        n_results: int,
+        where: Any,
+        where_document: Any,
+        include: Any,
+    ) -> Hashable:
+        return (
+            api_key,
+            str(cluster_id),
+            n_results,
+            _filter(where),
+            _filter(where_document),
+            tuple(include),
+        )
+
+    @staticmethod
+    def _unit(embeddings: Any) -> Optional[np.ndarray]:
+        try:
+            vectors = np.asarray(embeddings, dtype=np.float32)
+        except ValueError:
+            return None
+        if vectors.ndim != 2 or not len(vectors):
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        if not np.all(norms > 0):
+            return None
+        return vectors / norms
+
+    def get(self, context: Hashable, query_embeddings: Any) -> Optional[Dict[str, Any]]:
+        """A query response body assembled from cached rows, without distances, or None
+        unless every query embedding has a cached neighbour within max_distance"""
+        vectors = self._unit(query_embeddings)
+        with self._lock:
+            self._purge_expired(context)
+            entry = self._index.get(context)
+            if vectors is None or entry is None or vectors.shape[1] != entry[1].shape[1]:
+                self.misses += 1
+                return None
+            ids, matrix = entry
+            similarity = vectors @ matrix.T
+            best = similarity.argmax(axis=1)
+            rows = []
+            for i, j in enumerate(best):
+                if 1.0 - similarity[i, j] > self.max_distance:
+                    self.misses += 1
+                    return None
+                rows.append(self._rows[ids[j]])
+            for j in best:
+                self._rows.move_to_end(ids[j])
+            self.hits += 1
+        body: Dict[str, Any] = {}
+        for key in rows[0].row:
+            column = [row.row[key] for row in rows]
+            # Fields the server left out stay None rather than a list of None
+            body[key] = None if all(v is None for v in column) else copy.deepcopy(column)
+        if "distances" in body:
+            # Measured from the cached queries, not from these
+            body["distances"] = None
+        return body
+
+    def put(
+        self,
+        context: Hashable,
+        cluster_id: Any,
+        query_embeddings: Any,
+        body: Dict[str, Any],
+        generation: Tuple[int, int],
+    ) -> None:
+        """Stores one row per query embedding of a decoded query response body"""
+        vectors = self._unit(query_embeddings)
+        if vectors is None:
+            return
+        cluster_id = str(cluster_id)
+        keys = [key for key, value in body.items() if isinstance(value, list)]
+        rows = [
+            {key: copy.deepcopy(body[key][i]) if key in keys else None for key in body}
+            for i in range(len(vectors))
+        ]
+        expires_at = self._expires_at()
+        with self._lock:
+            if not self._is_current(cluster_id, generation):
+                return
+            ids, matrix = self._index.get(
+                context, ([], np.empty((0, vectors.shape[1]), dtype=np.float32))
+            )
+            if matrix.shape[1] != vectors.shape[1]:
+                return
+            new_ids = list(range(self._next_id, self._next_id + len(rows)))
+            self._next_id += len(rows)
+            for row_id, row in zip(new_ids, rows):
+                self._rows[row_id] = _Row(cluster_id, context, expires_at, row)
+            self._index[context] = (ids + new_ids, np.vstack([matrix, vectors]))
+            while len(self._rows) > self.max_entries:
+                self._remove(next(iter(self._rows)))
+                self.evictions += 1
+
+    def _purge_expired(self, context: Hashable) -> None:
+        """Removes the expired rows of a context, so they are neither matched nor kept"""
+        if self.ttl is None or context not in self._index:
+            return
+        ids, matrix = self._index[context]
+        now = time.monotonic()
+        expiries = [self._rows[row_id].expires_at for row_id in ids]
+        keep = [i for i, expires_at in enumerate(expiries) if expires_at is None or expires_at > now]
+        if len(keep) == len(ids):
+            return
+        for i in set(range(len(ids))).difference(keep):
+            del self._rows[ids[i]]
+        if keep:
+            self._index[context] = ([ids[i] for i in keep], matrix[keep])
+        else:
+            del self._index[context]
+
+    def _remove(self, row_id: int) -> None:
+        row = self._rows.pop(row_id)
+        ids, matrix = self._index[row.context]
+        position = ids.index(row_id)
+        if len(ids) == 1:
+            del self._index[row.context]
+            return
+        self._index[row.context] = (
+            ids[:position] + ids[position + 1 :],
+            np.delete(matrix, position, axis=0),
+        )
+
+    def _drop(self, cluster_id: Optional[str]) -> None:
+        if cluster_id is None:
+            self._rows.clear()
+            self._index.clear()
+            return
+        for row_id in [i for i, r in self._rows.items() if r.cluster_id == cluster_id]:
+            self._remove(row_id)
+
+    def _cached_clusters(self) -> Set[str]:
+        return {row.cluster_id for row in self._rows.values()}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._rows),
+            }
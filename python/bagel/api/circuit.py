@@ -0,0 +1,185 @@
+"""Client-side circuit breakers for the REST clients.
+
+Each (host, route class) pair has its own CircuitBreaker, so a failing dataset service
+does not stop queries. A breaker is closed while calls succeed. When the share of failed
+or slow calls in its rolling window crosses a threshold it opens, and calls fail fast
+with CircuitOpenError instead of waiting on the server. After open_seconds it half opens
+and lets a few probe calls through: if they all succeed it closes again, otherwise it
+reopens.
+"""
+import threading
+import time
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from typing_extensions import Literal
+
+from bagel.api.timeouts import WRITE_ROUTES
+from bagel.errors import CircuitOpenError
+
+if TYPE_CHECKING:
+    from bagel.config import Settings
+
+CircuitState = Literal["closed", "open", "half_open"]
+RouteClass = Literal["query", "write", "dataset", "other"]
+
+_QUERY_ROUTES = ("/query", "/get", "/count")
+
+
+def route_class(url: str) -> RouteClass:
+    """The route class a request URL belongs to"""
+    path = urlsplit(url).path.rstrip("/")
+    if "dataset" in path or "/asset" in path:
+        return "dataset"
+    if path.endswith(_QUERY_ROUTES):
+        return "query"
+    if path.endswith(WRITE_ROUTES):
+        return "write"
+    return "other"
+
+
+class CircuitBreaker:
+    """Args:
+    failure_rate: The share of failed calls in the window that opens the circuit.
+    slow_call_seconds: Calls slower than this count as slow, None disables the check.
+    slow_call_rate: The share of slow calls in the window that opens the circuit.
+    min_calls: The circuit never opens on fewer calls than this in the window.
+    window: The length of the rolling window, in seconds.
+    open_seconds: How long the circuit stays open before it half opens.
+    half_open_calls: The number of probe calls allowed while half open.
+    """
+
+    def __init__(
+        self,
+        failure_rate: float = 0.5,
+        slow_call_seconds: Optional[float] = None,
+        slow_call_rate: float = 0.5,
+        min_calls: int = 20,
+        window: float = 30.0,
+        open_seconds: float = 10.0,
+        half_open_calls: int = 3,
+    ):
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+        self._state: CircuitState = "closed"
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_successes = 0
+        # (finished at, failed, slow) for every call in the window
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            self._maybe_half_open(time.monotonic())
+            return self._state
+
+    def _maybe_half_open(self, now: float) -> None:
+        if self._state == "open" and now - self._opened_at >= self.open_seconds:
+            self._state = "half_open"
+            self._probes = 0
+            self._probe_successes = 0
+
+    def _open(self, now: float) -> None:
+        self._state = "open"
+        self._opened_at = now
+        self._calls.clear()
+
+    def before_call(self, name: str = "circuit") -> None:
+        """Raises CircuitOpenError if the call must not be sent"""
+        with self._lock:
+            now = time.monotonic()
+            self._maybe_half_open(now)
+            if self._state == "closed":
+                return
+            if self._state == "half_open" and self._probes < self.half_open_calls:
+                self._probes += 1
+                return
+            state = self._state
+            retry_after = max(0.0, self._opened_at + self.open_seconds - now)
+        raise CircuitOpenError(f"The {name} circuit is {state}", retry_after)
+
+    def release(self) -> None:
+        """Gives back the probe slot of a call that ended without an outcome, such as a
+        cancelled hedge"""
+        with self._lock:
+            if self._state == "half_open" and self._probes > 0:
+                self._probes -= 1
+
+    def record(self, latency: float, failed: bool) -> None:
+        """Records the outcome of a call let through by before_call"""
+        slow = self.slow_call_seconds is not None and latency > self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            if self._state == "half_open":
+                if failed or slow:
+                    self._open(now)
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_calls:
+                    self._state = "closed"
+                return
+            if self._state == "open":
+                return
+
+            self._calls.append((now, failed, slow))
+            while self._calls and self._calls[0][0] < now - self.window:
+                self._calls.popleft()
+            n = len(self._calls)
+            if n < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            slow_calls = sum(1 for _, _, s in self._calls if s)
+            if failures / n >= self.failure_rate or (
+                self.slow_call_seconds is not None
+                and slow_calls / n >= self.slow_call_rate
+            ):
+                self._open(now)
+
+
+class CircuitBreakers:
+    """The circuit breakers of one client, created on first use per host and route
+    class. Every breaker is configured like the given template values."""
+
+    def __init__(self, enabled: bool = True, **breaker_args: Any):
+        self.enabled = enabled
+        self._breaker_args = breaker_args
+        self._breakers: Dict[Tuple[str, RouteClass], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "CircuitBreakers":
+        return cls(
+            enabled=settings.bagel_circuit_breaker,
+            failure_rate=settings.bagel_circuit_failure_rate,
+            slow_call_seconds=settings.bagel_circuit_slow_call_seconds,
+            slow_call_rate=settings.bagel_circuit_slow_call_rate,
+            min_calls=settings.bagel_circuit_min_calls,
+            window=settings.bagel_circuit_window,
+            open_seconds=settings.bagel_circuit_open_seconds,
+            half_open_calls=settings.bagel_circuit_half_open_calls,
+        )
+
+    def get(self, url: str) -> Optional[Tuple[str, CircuitBreaker]]:
+        """The name and breaker guarding a request URL, or None if disabled"""
+        if not self.enabled:
+            return None
+        key = (urlsplit(url).netloc, route_class(url))
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(**self._breaker_args)
+        return f"{key[0]} {key[1]}", breaker
+
+    def states(self) -> Dict[str, CircuitState]:
+        """The state of every breaker, keyed by "<host> <route class>" """
+        with self._lock:
+            items = list(self._breakers.items())
+        return {f"{host} {route}": breaker.state for (host, route), breaker in items}
@@ -0,0 +1,155 @@
+"""Micro-batching of concurrent queries.
+
+A QueryCoalescer merges queries issued at about the same time from different threads
+into one /query request. The first query of a batch waits up to window seconds for
+others with the same context (cluster, n_results, filters, include and query kind),
+sends them all as one request, and splits the per-query result rows back to the
+callers.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+
+from bagel.api.encoding import decode_embeddings
+from bagel.api.timeouts import remaining
+from bagel.api.types import filter_key
+
+# Sends a merged batch of query embeddings or texts and returns the response body
+FetchBody = Callable[[Optional[Any], Optional[List[Any]]], Dict[str, Any]]
+
+
+def _concat(parts: List[Any]) -> Any:
+    """Concatenates batches of query embeddings, keeping ndarrays as one array"""
+    if all(isinstance(part, np.ndarray) for part in parts):
+        return np.concatenate(parts)
+    merged: List[Any] = []
+    for part in parts:
+        merged.extend(part.tolist() if isinstance(part, np.ndarray) else part)
+    return merged
+
+
+def split_body(body: Dict[str, Any], sizes: List[int]) -> List[Dict[str, Any]]:
+    """Splits a query response body into one body per caller, in order"""
+    body = dict(body)
+    body["embeddings"] = decode_embeddings(body.get("embeddings", None))
+    parts = []
+    start = 0
+    for size in sizes:
+        parts.append(
+            {
+                key: value[start : start + size] if isinstance(value, list) else value
+                for key, value in body.items()
+            }
+        )
+        start += size
+    return parts
+
+
+class _Batch:
+    def __init__(self) -> None:
+        self.parts: List[Any] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: List[Dict[str, Any]] = []
+        self.error: Optional[BaseException] = None
+
+    @property
+    def size(self) -> int:
+        return sum(len(part) for part in self.parts)
+
+
+class QueryCoalescer:
+    """Args:
+    window: The number of seconds the first query of a batch waits for others.
+    max_batch: The maximum number of queries in one request; a full batch is sent at
+        once.
+    """
+
+    def __init__(self, window: float = 0.002, max_batch: int = 64):
+        self.window = window
+        self.max_batch = max_batch
+        self.queries = 0
+        self.requests = 0
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def context(
+        api_key: Optional[str],
+        cluster_id: Any,
+        query_embeddings: Optional[Any],
+        query_texts: Optional[List[Any]],
+        n_results: int,
+        where: Any,
+        where_document: Any,
+        include: Any,
+    ) -> Optional[Hashable]:
+        """The key of the batches a query can join, or None if its filters hold
+        unhashable values and it is sent on its own"""
+        where_key = filter_key(where or {})
+        where_document_key = filter_key(where_document or {})
+        if where_key is None or where_document_key is None:
+            return None
+        if query_embeddings is not None:
+            kind: Tuple[Any, ...] = ("embeddings", len(query_embeddings[0]))
+        else:
+            kind = ("texts",)
+        return (
+            api_key,
+            str(cluster_id),
+            kind,
+            n_results,
+            where_key,
+            where_document_key,
+            tuple(include),
+        )
+
+    def run(
+        self,
+        context: Hashable,
+        query_embeddings: Optional[Any],
+        query_texts: Optional[List[Any]],
+        fetch: FetchBody,
+    ) -> Dict[str, Any]:
+        """Adds the queries to the open batch of their context, or opens one, and
+        returns the response body holding just their rows"""
+        part = query_embeddings if query_embeddings is not None else query_texts
+        with self._lock:
+            self.queries += len(part)
+            batch = self._pending.get(context)
+            leader = batch is None or batch.size + len(part) > self.max_batch
+            if leader:
+                batch = self._pending[context] = _Batch()
+            index = len(batch.parts)
+            batch.parts.append(part)
+            if batch.size >= self.max_batch:
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._pending.get(context) is batch:
+                    del self._pending[context]
+                self.requests += 1
+            try:
+                merged = _concat(batch.parts)
+                if query_embeddings is not None:
+                    body = fetch(merged, None)
+                else:
+                    body = fetch(None, merged)
+                batch.results = split_body(body, [len(p) for p in batch.parts])
+            except BaseException as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        elif not batch.done.wait(remaining()):
+            raise TimeoutError("Deadline exceeded waiting for a coalesced query")
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"queries": self.queries, "requests": self.requests}
@@ -0,0 +1,202 @@
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from bagel.api.encoding import decode_array, is_encoded
+from bagel.api.types import GetResult, QueryResult
+
+_QUERY_KEYS = ("ids", "embeddings", "documents", "metadatas", "distances")
+_GET_KEYS = ("ids", "embeddings", "documents", "metadatas")
+
+
+def _as_block(value: Any, dtype: Any) -> np.ndarray:
+    """Turns an encoded block, an ndarray or nested lists into an ndarray"""
+    if is_encoded(value):
+        return decode_array(value)
+    return np.asarray(value, dtype=dtype)
+
+
+def _stack_rows(rows: Sequence[Any], lengths: np.ndarray, dtype: Any, fill: Any) -> np.ndarray:
+    """Stacks per-query rows into one (queries, k, ...) array. Queries that returned
+    fewer than k results are padded with fill."""
+    if is_encoded(rows) or isinstance(rows, np.ndarray):
+        return _as_block(rows, dtype)
+    blocks = [_as_block(row, dtype) for row in rows]
+    k = int(lengths.max()) if len(lengths) else 0
+    if all(len(block) == k for block in blocks):
+        return np.stack(blocks) if blocks else np.empty((0, 0), dtype=dtype)
+    tail = next((block.shape[1:] for block in blocks if len(block)), ())
+    # String blocks are sized to the longest id so padding never truncates
+    out_dtype = np.result_type(*blocks) if blocks else dtype
+    out = np.full((len(blocks), k) + tail, fill, dtype=out_dtype)
+    for i, block in enumerate(blocks):
+        out[i, : len(block)] = block
+    return out
+
+
+class ColumnarQueryResult(Mapping[str, Any]):
+    """A QueryResult backed by NumPy arrays.
+
+    ids is a (queries, k) unicode array, distances a (queries, k) float32 array and
+    embeddings a contiguous (queries, k, dim) float32 array. Queries that matched fewer
+    than k records are padded; lengths holds the real number of results per query.
+
+    Indexing it like the QueryResult dict (result["ids"], ...) lazily converts that field
+    to the nested list shape, so existing code keeps working.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        lengths: np.ndarray,
+        embeddings: Optional[np.ndarray] = None,
+        distances: Optional[np.ndarray] = None,
+        metadatas: Optional[List[List[Any]]] = None,
+        documents: Optional[List[List[Any]]] = None,
+    ):
+        self.ids = ids
+        self.lengths = lengths
+        self.embeddings = embeddings
+        self.distances = distances
+        self.metadatas = metadatas
+        self.documents = documents
+        self._lists: Dict[str, Any] = {}
+
+    @classmethod
+    def from_body(cls, body: Mapping[str, Any]) -> "ColumnarQueryResult":
+        """Builds the result from a /query response body"""
+        id_rows = body["ids"]
+        lengths = np.array([len(row) for row in id_rows], dtype=np.int64)
+        embeddings = body.get("embeddings", None)
+        distances = body.get("distances", None)
+        return cls(
+            ids=_stack_rows(id_rows, lengths, np.str_, ""),
+            lengths=lengths,
+            embeddings=(
+                _stack_rows(embeddings, lengths, np.float32, 0.0)
+                if embeddings is not None
+                else None
+            ),
+            distances=(
+                _stack_rows(distances, lengths, np.float32, np.nan)
+                if distances is not None
+                else None
+            ),
+            metadatas=body.get("metadatas", None),
+            documents=body.get("documents", None),
+        )
+
+    @classmethod
+    def concat(cls, results: Sequence["ColumnarQueryResult"]) -> "ColumnarQueryResult":
+        """Stacks the results of consecutive query batches into one, padding every batch
+        to the largest k"""
+        lengths = np.concatenate([r.lengths for r in results] or [np.empty(0, np.int64)])
+
+        def stack(field: str, fill: Any) -> Optional[np.ndarray]:
+            blocks = [getattr(r, field) for r in results]
+            if not blocks or any(block is None for block in blocks):
+                return None
+            k = max(block.shape[1] for block in blocks)
+            padded = []
+            for block in blocks:
+                if block.shape[1] < k:
+                    pad = [(0, 0), (0, k - block.shape[1])] + [(0, 0)] * (block.ndim - 2)
+                    block = np.pad(block, pad, constant_values=fill)
+                padded.append(block)
+            return np.concatenate(padded)
+
+        def join(field: str) -> Optional[List[Any]]:
+            rows = [getattr(r, field) for r in results]
+            if not rows or any(row is None for row in rows):
+                return None
+            return [row for chunk in rows for row in chunk]
+
+        return cls(
+            ids=stack("ids", ""),
+            lengths=lengths,
+            embeddings=stack("embeddings", 0.0),
+            distances=stack("distances", np.nan),
+            metadatas=join("metadatas"),
+            documents=join("documents"),
+        )
+
+    def _to_rows(self, array: np.ndarray) -> List[Any]:
+        return [row[:n].tolist() for row, n in zip(array, self.lengths)]
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _QUERY_KEYS:
+            raise KeyError(key)
+        if key not in self._lists:
+            value = getattr(self, key)
+            if isinstance(value, np.ndarray):
+                value = self._to_rows(value)
+            self._lists[key] = value
+        return self._lists[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_QUERY_KEYS)
+
+    def __len__(self) -> int:
+        return len(_QUERY_KEYS)
+
+    def to_dict(self) -> QueryResult:
+        """Returns the result in the nested list QueryResult shape"""
+        return QueryResult(**{key: self[key] for key in _QUERY_KEYS})  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"ColumnarQueryResult(queries={len(self.lengths)}, k={self.ids.shape[1] if self.ids.ndim == 2 else 0})"
+
+
+class ColumnarGetResult(Mapping[str, Any]):
+    """A GetResult backed by NumPy arrays: ids is a unicode array and embeddings a
+    contiguous (n, dim) float32 array. Indexing it like the GetResult dict lazily
+    converts that field to lists."""
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        embeddings: Optional[np.ndarray] = None,
+        metadatas: Optional[List[Any]] = None,
+        documents: Optional[List[Any]] = None,
+    ):
+        self.ids = ids
+        self.embeddings = embeddings
+        self.metadatas = metadatas
+        self.documents = documents
+        self._lists: Dict[str, Any] = {}
+
+    @classmethod
+    def from_body(cls, body: Mapping[str, Any]) -> "ColumnarGetResult":
+        """Builds the result from a /get response body"""
+        embeddings = body.get("embeddings", None)
+        return cls(
+            ids=np.asarray(body["ids"], dtype=np.str_),
+            embeddings=(
+                _as_block(embeddings, np.float32) if embeddings is not None else None
+            ),
+            metadatas=body.get("metadatas", None),
+            documents=body.get("documents", None),
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in _GET_KEYS:
+            raise KeyError(key)
+        if key not in self._lists:
+            value = getattr(self, key)
+            if isinstance(value, np.ndarray):
+                value = value.tolist()
+            self._lists[key] = value
+        return self._lists[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(_GET_KEYS)
+
+    def __len__(self) -> int:
+        return len(_GET_KEYS)
+
+    def to_dict(self) -> GetResult:
+        """Returns the result in the list based GetResult shape"""
+        return GetResult(**{key: self[key] for key in _GET_KEYS})  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"ColumnarGetResult(n={len(self.ids)})"
@@ -0,0 +1,79 @@
+"""Compact wire encoding for embeddings.
+
+Embeddings are sent as a little-endian float32 block, base64 encoded, together with a
+shape header:
+
+    {"encoding": "float32-base64", "shape": [n, dim], "data": "<base64>"}
+
+This is ~3-4x smaller than a JSON list of floats and is encoded in C rather than by
+json.dumps walking every float. Servers advertise support with the
+EMBEDDING_ENCODINGS_HEADER response header; otherwise the client keeps sending JSON
+lists.
+"""
+import base64
+from typing import Any, Dict, Mapping, Optional
+
+import numpy as np
+
+from bagel.api.types import Embeddings
+
+FLOAT32_BASE64 = "float32-base64"
+JSON = "json"
+
+# Response header listing the encodings a server understands, comma separated
+EMBEDDING_ENCODINGS_HEADER = "x-bagel-embedding-encodings"
+# Request header telling the server which encoding the client accepts in responses
+ACCEPT_EMBEDDING_ENCODING_HEADER = "x-bagel-accept-embedding-encoding"
+
+_FLOAT32_LE = np.dtype("<f4")
+
+
+def server_supports(headers: Mapping[str, str], encoding: str) -> bool:
+    """Returns True if the response headers advertise the given embedding encoding"""
+    advertised = headers.get(EMBEDDING_ENCODINGS_HEADER, "")
+    return encoding in [e.strip() for e in advertised.split(",")]
+
+
+def encode_embeddings(embeddings: Optional[Embeddings]) -> Any:
+    """Encodes a batch of embeddings as a float32 block. Ragged batches, which have no
+    rectangular shape, are returned unchanged and travel as JSON lists."""
+    if embeddings is None:
+        return None
+    try:
+        block = np.asarray(embeddings, dtype=_FLOAT32_LE)
+    except ValueError:
+        return embeddings
+    if block.ndim != 2:
+        return embeddings
+    return {
+        "encoding": FLOAT32_BASE64,
+        "shape": list(block.shape),
+        "data": base64.b64encode(np.ascontiguousarray(block).tobytes()).decode("ascii"),
+    }
+
+
+def embeddings_to_json(embeddings: Optional[Embeddings]) -> Any:
+    """Returns embeddings as JSON serializable lists; arrays are converted in one call"""
+    if isinstance(embeddings, np.ndarray):
+        return embeddings.tolist()
+    return embeddings
+
+
+def is_encoded(value: Any) -> bool:
+    return isinstance(value, dict) and value.get("encoding") == FLOAT32_BASE64
+
+
+def decode_array(value: Dict[str, Any]) -> np.ndarray:
+    """Decodes a float32 block into an ndarray of its original shape"""
+    buffer = base64.b64decode(value["data"])
+    return np.frombuffer(buffer, dtype=_FLOAT32_LE).reshape(value["shape"])
+
+
+def decode_embeddings(value: Any) -> Any:
+    """Decodes embeddings from a response body. Query results may carry one block per
+    query. Values that are not encoded blocks (JSON lists, None) are returned unchanged."""
+    if is_encoded(value):
+        return decode_array(value).tolist()
+    if isinstance(value, list) and value and is_encoded(value[0]):
+        return [decode_array(v).tolist() for v in value]
+    return value
@@ -1,4 +1,4 @@
-from typing import Optional, cast, Any, List, Tuple
+from typing import Iterator, Optional, cast, Any, List, Tuple
 from bagel.api import API
 from bagel.config import System
 from bagel.api.types import (
@@ -18,10 +18,39 @@ from bagel.api.types import (
 )
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 import json
+import threading
+from contextlib import contextmanager
+from functools import partial
 from typing import Sequence, Dict
 from bagel.api.Cluster import Cluster
-import bagel.errors as errors
+from bagel.api.columnar import ColumnarGetResult, ColumnarQueryResult
+from bagel.api.cache import QueryCache, SemanticQueryCache, query_cache_bypassed
+from bagel.api.circuit import CircuitBreakers
+from bagel.api.coalescing import QueryCoalescer
+from bagel.api.hedging import Hedger
+from bagel.api.http import (
+    BAGEL_API_KEY,
+    BAGEL_USER_ID,
+    DEFAULT_TENANT,
+    X_API_KEY,
+    headers_with_api_key,
+    raise_bagel_error,
+    resolve_api_key,
+    resolve_user_id,
+)
+from bagel.api.retry import RetryPolicy
+from bagel.api.timeouts import OperationClass, Timeouts, remaining
+from bagel.api.encoding import (
+    ACCEPT_EMBEDDING_ENCODING_HEADER,
+    JSON,
+    decode_embeddings,
+    embeddings_to_json,
+    encode_embeddings,
+    server_supports,
+)
 from uuid import UUID
 from overrides import override
 import base64
@@ -32,13 +61,29 @@ import time
 
 import tempfile, zipfile
 
-BAGEL_USER_ID = "BAGEL_USER_ID"
-BAGEL_API_KEY = "BAGEL_API_KEY"
+DEFAULT_DATABASE = "default_database"
 
-X_API_KEY = 'x-api-key'
 
-DEFAULT_TENANT = "default_tenant"
-DEFAULT_DATABASE = "default_database"
+# Failures of the connection or the server that a later attempt may not hit. Any other
+# RequestException (InvalidURL, MissingSchema, InvalidHeader) fails the same way every
+# time and is raised at once.
+_TRANSIENT_ERRORS = (
+    requests.ConnectionError,
+    requests.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+
+
+def _never_sent(e: requests.RequestException) -> bool:
+    """Whether a request failed before any of it reached the server: the connection
+    timed out or could not be opened (refused, unresolvable host). requests wraps the
+    urllib3 cause, usually in a MaxRetryError, as the first argument."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    if not isinstance(e, requests.ConnectionError) or not e.args:
+        return False
+    cause = getattr(e.args[0], "reason", e.args[0])
+    return isinstance(cause, (NewConnectionError, ConnectTimeoutError))
 
 
 class FastAPI(API):
@@ -52,10 +97,192 @@ class FastAPI(API):
         else:
             self._api_url = f"{url_prefix}://{system.settings.bagel_server_host}/api/v1"
 
+        # One pooled session is shared by every Cluster handle of this client
+        self._keepalive_timeout = system.settings.bagel_http_keepalive_timeout
+        self._session = self._create_session()
+        self._session_lock = threading.Lock()
+        self._last_request_time = time.monotonic()
+        # Replaceable at runtime, e.g. client.retry_policy = RetryPolicy(max_attempts=1)
+        self.timeouts = Timeouts.from_settings(system.settings)
+        self.retry_policy = RetryPolicy.from_settings(system.settings)
+        # client.circuit_breakers.states() shows the state of every circuit
+        self.circuit_breakers = CircuitBreakers.from_settings(system.settings)
+        # client.query_cache.stats() reports hits and misses
+        self.query_cache: Optional[QueryCache] = None
+        if system.settings.bagel_query_cache:
+            self.query_cache = QueryCache(
+                max_entries=system.settings.bagel_query_cache_max_entries,
+                max_bytes=system.settings.bagel_query_cache_max_bytes,
+                ttl=system.settings.bagel_query_cache_ttl,
+            )
+        self.semantic_cache: Optional[SemanticQueryCache] = None
+        if system.settings.bagel_semantic_cache:
+            self.semantic_cache = SemanticQueryCache(
+                max_distance=system.settings.bagel_semantic_cache_distance,
+                max_entries=system.settings.bagel_semantic_cache_max_entries,
+                ttl=system.settings.bagel_semantic_cache_ttl,
+            )
+        self.coalescer: Optional[QueryCoalescer] = None
+        if system.settings.bagel_coalesce_queries:
+            self.coalescer = QueryCoalescer(
+                window=system.settings.bagel_coalesce_window,
+                max_batch=system.settings.bagel_coalesce_max_batch,
+            )
+        self.hedger: Optional[Hedger] = None
+        if system.settings.bagel_hedge_queries:
+            self.hedger = Hedger(
+                percentile=system.settings.bagel_hedge_percentile,
+                max_ratio=system.settings.bagel_hedge_max_ratio,
+                min_delay=system.settings.bagel_hedge_min_delay,
+            )
+
+        # Compact embedding encoding is negotiated with the server on first use
+        self._embedding_encoding = system.settings.bagel_embedding_encoding
+        self._server_accepts_encoding: Optional[bool] = None
+        if self._embedding_encoding != JSON:
+            self.__headers[ACCEPT_EMBEDDING_ENCODING_HEADER] = self._embedding_encoding
+
+    def _create_session(self) -> requests.Session:
+        """Create a keep-alive session backed by a bounded connection pool"""
+        settings = self._system.settings
+        adapter = HTTPAdapter(
+            pool_connections=settings.bagel_http_pool_connections,
+            pool_maxsize=settings.bagel_http_pool_maxsize,
+        )
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        idempotent: Optional[bool] = None,
+        operation: Optional[OperationClass] = None,
+        **kwargs: Any,
+    ) -> requests.Response:
+        """Send a request, retrying transient failures as retry_policy decides.
+        idempotent overrides the policy's per-verb rules for this request. operation
+        selects the timeout class when it cannot be inferred from the route; an explicit
+        timeout keyword takes precedence. No attempt or retry outlives the current
+        deadline. Returns the last response, or raises the last connection error. Errors
+        that cannot be transient, such as an invalid URL, are raised without a retry."""
+        policy = self.retry_policy
+        timeout = kwargs.pop("timeout", None)
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            kwargs["timeout"] = self.timeouts.for_request(method, url, operation, timeout)
+            try:
+                resp = self._send(method, url, **kwargs)
+            except _TRANSIENT_ERRORS as e:
+                delay = policy.next_delay(
+                    attempt,
+                    method,
+                    url,
+                    time.monotonic() - start,
+                    error=e,
+                    sent=not _never_sent(e),
+                    idempotent=idempotent,
+                    deadline=remaining(),
+                )
+                if delay is None:
+                    raise
+            else:
+                delay = policy.next_delay(
+                    attempt,
+                    method,
+                    url,
+                    time.monotonic() - start,
+                    status=resp.status_code,
+                    headers=resp.headers,
+                    idempotent=idempotent,
+                    deadline=remaining(),
+                )
+                if delay is None:
+                    return resp
+            time.sleep(delay)
+
+    def _send(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send one request through the circuit breaker of its host and route class"""
+        circuit = self.circuit_breakers.get(url)
+        if circuit is None:
+            return self._send_pooled(method, url, **kwargs)
+        name, breaker = circuit
+        breaker.before_call(name)
+        start = time.monotonic()
+        try:
+            resp = self._send_pooled(method, url, **kwargs)
+        except _TRANSIENT_ERRORS:
+            breaker.record(time.monotonic() - start, failed=True)
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(time.monotonic() - start, failed=resp.status_code >= 500)
+        return resp
+
+    def _send_pooled(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        """Send one request over the pooled session.
+        Idle keep-alive connections older than bagel_http_keepalive_timeout are dropped
+        first, so a request never lands on a socket the server has already closed."""
+        with self._session_lock:
+            now = time.monotonic()
+            if (
+                self._keepalive_timeout is not None
+                and now - self._last_request_time > self._keepalive_timeout
+            ):
+                self._session.close()
+            self._last_request_time = now
+        return self._session.request(method, url, **kwargs)
+
+    @override
+    def stop(self) -> None:
+        super().stop()
+        if self.hedger is not None:
+            self.hedger.shutdown()
+        self._session.close()
+
+    def _encode_embeddings(self, embeddings: Optional[Embeddings]) -> Any:
+        """Encode embeddings for a request body, using the compact encoding only if it
+        is enabled and the server advertises support for it. Only a successful probe is
+        remembered: after an error response JSON is sent and the next call probes again."""
+        if embeddings is None:
+            return None
+        if self._embedding_encoding != JSON:
+            accepts = self._server_accepts_encoding
+            if accepts is None:
+                resp = self._request("GET", self._api_url, headers=self.__headers)
+                if resp.ok:
+                    accepts = server_supports(resp.headers, self._embedding_encoding)
+                    self._server_accepts_encoding = accepts
+            if accepts:
+                return encode_embeddings(embeddings)
+        return embeddings_to_json(embeddings)
+
+    @contextmanager
+    def _invalidates_queries(self, cluster_id: Optional[UUID] = None) -> Iterator[None]:
+        """Wraps a write: cached query results of the cluster, or of every cluster if
+        cluster_id is None, are dropped once it completes or fails"""
+        try:
+            yield
+        finally:
+            if self.query_cache is not None:
+                self.query_cache.invalidate(cluster_id)
+            if self.semantic_cache is not None:
+                self.semantic_cache.invalidate(cluster_id)
+
+    def _as_numpy(self, as_numpy: Optional[bool]) -> bool:
+        if as_numpy is None:
+            return self._system.settings.bagel_result_format == "numpy"
+        return as_numpy
+
     @override
     def ping(self) -> int:
         """Returns the current server time in nanoseconds to check if the server is alive"""
-        resp = requests.get(self._api_url, headers=self.__headers)
+        resp = self._request("GET", self._api_url, headers=self.__headers)
         raise_bagel_error(resp)
         return int(resp.json()["nanosecond heartbeat"])
 
@@ -63,14 +290,14 @@ class FastAPI(API):
     def join_waitlist(self, email: str) -> Dict[str, str]:
         """Add email to waitlist"""
         url = self._api_url.replace("/api/v1", "")
-        resp = requests.get(url + "/join_waitlist/" + email, timeout=60)
+        resp = self._request("GET", url + "/join_waitlist/" + email, timeout=60)
         return resp.json()
 
     @override
     def get_all_clusters(self, user_id: str = DEFAULT_TENANT, api_key: Optional[str] = None) -> Sequence[Cluster]:
         """Returns a list of all clusters"""
         headers, user_id = self._extract_headers_with_key_and_user_id(api_key, user_id)
-        resp = requests.get(self._api_url + "/clusters", headers=headers, params={"user_id": user_id});
+        resp = self._request("GET", self._api_url + "/clusters", headers=headers, params={"user_id": user_id});
         raise_bagel_error(resp)
         json_clusters = resp.json()
         clusters = []
@@ -92,7 +319,8 @@ class FastAPI(API):
     ) -> Cluster:
         """Creates a cluster"""
         headers, user_id = self._extract_headers_with_key_and_user_id(api_key, user_id)
-        resp = requests.post(
+        resp = self._request(
+            "POST",
             self._api_url + "/clusters",
             data=json.dumps(
                 {"name": name, "metadata": metadata, "get_or_create": get_or_create,
@@ -121,7 +349,7 @@ class FastAPI(API):
         """Returns a cluster"""
         headers, user_id = self._extract_headers_with_key_and_user_id(api_key, user_id)
         url = f"{self._api_url}/clusters/{name}"
-        resp = requests.get(url, headers=headers, params={
+        resp = self._request("GET", url, headers=headers, params={
             "user_id": user_id
         })
         raise_bagel_error(resp)
@@ -160,7 +388,8 @@ class FastAPI(API):
     ) -> None:
         """Updates a cluster"""
         headers = self._popuate_headers_with_api_key(api_key)
-        resp = requests.put(
+        resp = self._request(
+            "PUT",
             self._api_url + "/clusters/" + str(id),
             data=json.dumps({"new_metadata": new_metadata, "new_name": new_name}),
             headers=headers
@@ -174,7 +403,8 @@ class FastAPI(API):
         """Deletes a cluster"""
         headers, user_id = self._extract_headers_with_key_and_user_id(api_key, user_id)
         url = f"{self._api_url}/clusters/{name}?user_id={user_id}"
-        resp = requests.delete(url, headers=headers)
+        with self._invalidates_queries():
+            resp = self._request("DELETE", url, headers=headers)
         raise_bagel_error(resp)
 
     @override
@@ -182,7 +412,7 @@ class FastAPI(API):
                api_key: Optional[str] = None) -> int:
         """Returns the number of embeddings in the database"""
         headers = self._popuate_headers_with_api_key(api_key)
-        resp = requests.get(self._api_url + "/clusters/" + str(cluster_id) + "/count", headers=headers)
+        resp = self._request("GET", self._api_url + "/clusters/" + str(cluster_id) + "/count", headers=headers)
         raise_bagel_error(resp)
         return cast(int, resp.json())
 
@@ -208,7 +438,8 @@ class FastAPI(API):
             page_size: Optional[int] = None,
             where_document: Optional[WhereDocument] = {},
             include: Include = ["metadatas", "documents"],
-            api_key: Optional[str] = None
+            api_key: Optional[str] = None,
+            as_numpy: Optional[bool] = None
     ) -> GetResult:
         """Gets embeddings from the database"""
         headers = self._popuate_headers_with_api_key(api_key)
@@ -216,7 +447,8 @@ class FastAPI(API):
             offset = (page - 1) * page_size
             limit = page_size
 
-        resp = requests.post(
+        resp = self._request(
+            "POST",
             self._api_url + "/clusters/" + str(cluster_id) + "/get",
             data=json.dumps(
                 {
@@ -234,9 +466,11 @@ class FastAPI(API):
 
         raise_bagel_error(resp)
         body = resp.json()
+        if self._as_numpy(as_numpy):
+            return ColumnarGetResult.from_body(body)
         return GetResult(
             ids=body["ids"],
-            embeddings=body.get("embeddings", None),
+            embeddings=decode_embeddings(body.get("embeddings", None)),
             metadatas=body.get("metadatas", None),
             documents=body.get("documents", None),
         )
@@ -252,12 +486,14 @@ class FastAPI(API):
     ) -> IDs:
         """Deletes embeddings from the database"""
 
-        resp = requests.post(
-            self._api_url + "/clusters/" + str(cluster_id) + "/delete",
-            data=json.dumps(
-                {"where": where, "ids": ids, "where_document": where_document}
-            ),
-        )
+        with self._invalidates_queries(cluster_id):
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + str(cluster_id) + "/delete",
+                data=json.dumps(
+                    {"where": where, "ids": ids, "where_document": where_document}
+                ),
+            )
 
         raise_bagel_error(resp)
         return cast(IDs, resp.json())
@@ -303,11 +539,13 @@ class FastAPI(API):
             "increment_index": True,
             "documents": [image_data]
         })
-        resp = requests.post(
-            self._api_url + "/clusters/" + str(cluster_id) + "/add_image",
-            data=data,
-            headers=headers
-        )
+        with self._invalidates_queries(cluster_id):
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + str(cluster_id) + "/add_image",
+                data=data,
+                headers=headers
+            )
         raise_bagel_error(resp)
         return resp
 
@@ -329,19 +567,21 @@ class FastAPI(API):
         -     and then manually create the index yourself with cluster.create_index()
         """
         headers = self._popuate_headers_with_api_key(api_key)
-        resp = requests.post(
-            self._api_url + "/clusters/" + str(cluster_id) + "/add",
-            data=json.dumps(
-                {
-                    "ids": ids,
-                    "embeddings": embeddings,
-                    "metadatas": metadatas,
-                    "documents": documents,
-                    "increment_index": increment_index,
-                }
-            ),
-            headers=headers
-        )
+        with self._invalidates_queries(cluster_id):
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + str(cluster_id) + "/add",
+                data=json.dumps(
+                    {
+                        "ids": ids,
+                        "embeddings": self._encode_embeddings(embeddings),
+                        "metadatas": metadatas,
+                        "documents": documents,
+                        "increment_index": increment_index,
+                    }
+                ),
+                headers=headers
+            )
 
         raise_bagel_error(resp)
         return True
@@ -361,18 +601,20 @@ class FastAPI(API):
         - pass in column oriented data lists
         """
         headers = self._popuate_headers_with_api_key(api_key)
-        resp = requests.post(
-            self._api_url + "/clusters/" + str(cluster_id) + "/update",
-            data=json.dumps(
-                {
-                    "ids": ids,
-                    "embeddings": embeddings,
-                    "metadatas": metadatas,
-                    "documents": documents,
-                }
-            ),
-            headers=headers
-        )
+        with self._invalidates_queries(cluster_id):
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + str(cluster_id) + "/update",
+                data=json.dumps(
+                    {
+                        "ids": ids,
+                        "embeddings": self._encode_embeddings(embeddings),
+                        "metadatas": metadatas,
+                        "documents": documents,
+                    }
+                ),
+                headers=headers
+            )
 
         resp.raise_for_status()
         return True
@@ -395,19 +637,21 @@ class FastAPI(API):
         
         headers = self._popuate_headers_with_api_key(api_key)
 
-        resp = requests.post(
-            self._api_url + "/clusters/" + str(cluster_id) + "/upsert",
-            data=json.dumps(
-                {
-                    "ids": ids,
-                    "embeddings": embeddings,
-                    "metadatas": metadatas,
-                    "documents": documents,
-                    "increment_index": increment_index,
-                }
-            ),
-            headers = headers
-        )
+        with self._invalidates_queries(cluster_id):
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + str(cluster_id) + "/upsert",
+                data=json.dumps(
+                    {
+                        "ids": ids,
+                        "embeddings": self._encode_embeddings(embeddings),
+                        "metadatas": metadatas,
+                        "documents": documents,
+                        "increment_index": increment_index,
+                    }
+                ),
+                headers = headers
+            )
 
         resp.raise_for_status()
         return True
@@ -422,42 +666,125 @@ class FastAPI(API):
             where_document: Optional[WhereDocument] = {},
             include: Include = ["metadatas", "documents", "distances"],
             query_texts: Optional[OneOrMany[Document]] = None,
-            api_key: Optional[str] = None
+            api_key: Optional[str] = None,
+            as_numpy: Optional[bool] = None
     ) -> QueryResult:
         """Gets the nearest neighbors of a single embedding"""
         headers = self._popuate_headers_with_api_key(api_key)
-        
-        max_retries = 3
-        retry_delay = 1  # in seconds
-        
-        for attempt in range(max_retries):
-            resp = requests.post(
-                self._api_url + "/clusters/" + str(cluster_id) + "/query",
-                data=json.dumps(
-                    {
-                        "query_embeddings": query_embeddings,
-                        "n_results": n_results,
-                        "where": where,
-                        "where_document": where_document,
-                        "include": include,
-                        "query_texts": query_texts,
-                    }
+        bypassed = query_cache_bypassed()
+        cache = None if bypassed else self.query_cache
+        semantic = None
+        if query_embeddings is not None and not bypassed:
+            semantic = self.semantic_cache
+        if cache is not None:
+            key = (
+                headers.get(X_API_KEY),
+                cache.key(
+                    cluster_id,
+                    query_embeddings,
+                    query_texts,
+                    n_results,
+                    where,
+                    where_document,
+                    include,
                 ),
-                headers=headers
             )
-            
-            if resp.ok:
-                break
-            elif attempt < max_retries - 1:
-                time.sleep(retry_delay)
-        
+            content = cache.get(key)
+            if content is not None:
+                return self._query_result(json.loads(content), as_numpy)
+            generation = cache.generation(cluster_id)
+        if semantic is not None:
+            semantic_context = semantic.context(
+                headers.get(X_API_KEY),
+                cluster_id,
+                n_results,
+                where,
+                where_document,
+                include,
+            )
+            body = semantic.get(semantic_context, query_embeddings)
+            if body is not None:
+                return self._query_result(body, as_numpy)
+            semantic_generation = semantic.generation(cluster_id)
+
+        fetch = partial(
+            self._fetch_query,
+            cluster_id,
+            n_results=n_results,
+            where=where,
+            where_document=where_document,
+            include=include,
+            headers=headers,
+        )
+        coalesce_context = None
+        if self.coalescer is not None:
+            coalesce_context = self.coalescer.context(
+                headers.get(X_API_KEY),
+                cluster_id,
+                query_embeddings,
+                query_texts,
+                n_results,
+                where,
+                where_document,
+                include,
+            )
+        if self.coalescer is not None and coalesce_context is not None:
+            body = self.coalescer.run(
+                coalesce_context, query_embeddings, query_texts, lambda e, t: fetch(e, t)[0]
+            )
+            content = None
+        else:
+            body, content = fetch(query_embeddings, query_texts)
+        if cache is not None:
+            if content is None:
+                content = json.dumps(body).encode()
+            cache.put(key, cluster_id, content, generation)
+        if semantic is not None:
+            body["embeddings"] = decode_embeddings(body.get("embeddings", None))
+            semantic.put(
+                semantic_context, cluster_id, query_embeddings, body, semantic_generation
+            )
+        return self._query_result(body, as_numpy)
+
+    def _fetch_query(
+        self,
+        cluster_id: UUID,
+        query_embeddings: Optional[Embeddings],
+        query_texts: Optional[List[Document]],
+        n_results: int,
+        where: Optional[Where],
+        where_document: Optional[WhereDocument],
+        include: Include,
+        headers: Dict[str, str],
+    ) -> Tuple[Dict[str, Any], bytes]:
+        """Sends one /query request and returns the response body, parsed and raw"""
+        url = self._api_url + "/clusters/" + str(cluster_id) + "/query"
+        data = json.dumps(
+            {
+                "query_embeddings": self._encode_embeddings(query_embeddings),
+                "n_results": n_results,
+                "where": where,
+                "where_document": where_document,
+                "include": include,
+                "query_texts": query_texts,
+            }
+        )
+        send = partial(self._request, "POST", url, data=data, headers=headers)
+        if self.hedger is not None:
+            resp = self.hedger.run(send, discard=requests.Response.close)
+        else:
+            resp = send()
         raise_bagel_error(resp)
-        body = resp.json()
+        return resp.json(), resp.content
+
+    def _query_result(self, body: Dict[str, Any], as_numpy: Optional[bool]) -> QueryResult:
+        if self._as_numpy(as_numpy):
+            return ColumnarQueryResult.from_body(body)
 
         return QueryResult(
             ids=body["ids"],
             distances=body.get("distances", None),
-            embeddings=body.get("embeddings", None),
+            embeddings=decode_embeddings(body.get("embeddings", None)),
             metadatas=body.get("metadatas", None),
             documents=body.get("documents", None),
         )
@@ -465,29 +792,32 @@ class FastAPI(API):
     @override
     def reset(self) -> None:
         """Resets the database"""
-        resp = requests.post(self._api_url + "/reset")
+        with self._invalidates_queries():
+            resp = self._request("POST", self._api_url + "/reset")
         raise_bagel_error(resp)
 
     @override
     def persist(self) -> bool:
         """Persists the database"""
-        resp = requests.post(self._api_url + "/persist")
+        resp = self._request("POST", self._api_url + "/persist")
         raise_bagel_error(resp)
         return cast(bool, resp.json())
 
     @override
     def create_index(self, cluster_name: str) -> bool:
         """Creates an index for the given space key"""
-        resp = requests.post(
-            self._api_url + "/clusters/" + cluster_name + "/create_index"
-        )
+        with self._invalidates_queries():
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + cluster_name + "/create_index"
+            )
         raise_bagel_error(resp)
         return cast(bool, resp.json())
 
     @override
     def get_version(self) -> str:
         """Returns the version of the server"""
-        resp = requests.get(self._api_url + "/version", headers=self.__headers)
+        resp = self._request("GET", self._api_url + "/version", headers=self.__headers)
         raise_bagel_error(resp)
         return cast(str, resp.json())
 
@@ -496,7 +826,8 @@ class FastAPI(API):
 
         headers = self._popuate_headers_with_api_key(None)
 
-        resp = requests.post(
+        resp = self._request(
+            "POST",
             self._api_url + "/share-cluster",
             data=json.dumps(
                 {
@@ -524,18 +855,20 @@ class FastAPI(API):
         if metadatas is None:
             metadatas = [{"url": str(url)} for url in urls]
 
-        resp = requests.post(
-            self._api_url + "/clusters/" + str(cluster_id) + "/add_image_url",
-            data=json.dumps(
-                {
-                    "ids": ids,
-                    "image_urls": urls,
-                    "metadatas": metadatas,
-                    "increment_index": increment_index,
-                }
-            ),
-            headers=headers
-        )
+        with self._invalidates_queries(cluster_id):
+            resp = self._request(
+                "POST",
+                self._api_url + "/clusters/" + str(cluster_id) + "/add_image_url",
+                data=json.dumps(
+                    {
+                        "ids": ids,
+                        "image_urls": urls,
+                        "metadatas": metadatas,
+                        "increment_index": increment_index,
+                    }
+                ),
+                headers=headers
+            )
 
         raise_bagel_error(resp)
         return resp.json()
@@ -546,18 +879,10 @@ class FastAPI(API):
         return headers, user_id
 
     def _popuate_headers_with_api_key(self, api_key):
-        headers = self.__headers.copy()  # Make a copy of headers to avoid modifying original headers
-        if os.environ.get(BAGEL_API_KEY) is not None and api_key is None:
-            api_key = os.environ.get(BAGEL_API_KEY)
-        headers[X_API_KEY] = api_key  # Add API key to headers
-        return headers
+        return headers_with_api_key(self.__headers, api_key)
 
     def _extract_user_id_and_api_key(self, api_key, user_id):
-        if os.environ.get(BAGEL_USER_ID) is not None and user_id == DEFAULT_TENANT:
-            user_id = os.environ.get(BAGEL_USER_ID)
-        if os.environ.get(BAGEL_API_KEY) is not None and api_key is None:
-            api_key = os.environ.get(BAGEL_API_KEY)
-        return api_key, user_id
+        return resolve_api_key(api_key), resolve_user_id(user_id)
     
     @override
     def create_dataset(
@@ -584,7 +909,7 @@ class FastAPI(API):
             "user_id": user_id
         }
         
-        resp = requests.post(url, headers=headers, data=json.dumps(data))
+        resp = self._request("POST", url, headers=headers, data=json.dumps(data))
         raise_bagel_error(resp)
         
         resp_text = resp.text
@@ -605,7 +930,7 @@ class FastAPI(API):
         
         data = {'dataset_id': dataset_id, 'path': path}
         
-        resp = requests.get(url, headers=headers, params=data)
+        resp = self._request("GET", url, headers=headers, params=data)
 
         resp_json = resp.json()
         
@@ -628,7 +953,9 @@ class FastAPI(API):
 
         files = {'data_file': (file_name, file_content)}
         
-        resp = requests.post(url, headers=headers, files=files, params=params)
+        resp = self._request(
+            "POST", url, operation="upload", headers=headers, files=files, params=params
+        )
         
         return resp.text
     
@@ -645,7 +972,7 @@ class FastAPI(API):
         
         params = {'dataset_id': dataset_id, 'file_path': file_path}
         
-        resp = requests.get(url, headers=headers, params=params)
+        resp = self._request("GET", url, operation="download", headers=headers, params=params)
         # raise_bagel_error(resp)
         
         file_content = resp.content
@@ -709,7 +1036,7 @@ class FastAPI(API):
             raise ValueError("Invalid dataset_type. Must be 'RAW', 'MODEL', or 'VECTOR'")
 
         # Make a POST request to create a dataset
-        response = requests.post(url, json=payload, headers=headers)
+        response = self._request("POST", url, json=payload, headers=headers)
 
         # Check the response status code
         if response.status_code == 200:
@@ -727,7 +1054,7 @@ class FastAPI(API):
 
         try:
             url = f"{self._api_url}/datasets?owner=${user_id}"
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
             if response.status_code == 200:
                 assets_list = response.json()
                 return assets_list
@@ -744,7 +1071,7 @@ class FastAPI(API):
         try:
             url = f"{self._api_url}/asset/{asset_id}"
             
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
             
             if response.status_code == 200:
                 asset_info = response.json()
@@ -762,7 +1089,7 @@ class FastAPI(API):
         url = f"{self._api_url}/asset/{dataset_id}"
 
         headers = self._popuate_headers_with_api_key(api_key)
-        response = requests.delete(url, headers=headers)
+        response = self._request("DELETE", url, headers=headers)
         try:
             if response.status_code == 204:
                 return (f"Dataset {dataset_id} deleted successfully!")
@@ -780,7 +1107,7 @@ class FastAPI(API):
         url = f"{self._api_url}/jobs/asset/{asset_id}/files/{file_name}"
         headers = self._popuate_headers_with_api_key(api_key)
         try:
-            response = requests.get(url, headers=headers, stream=True)
+            response = self._request("GET", url, operation="download", headers=headers, stream=True)
             if response.status_code == 200:
                 with open(file_name, "wb") as f:
                     for chunks in response.iter_content(chunk_size=8192):
@@ -800,7 +1127,7 @@ class FastAPI(API):
         try:
             url = f"{self._api_url}/jobs/asset/{asset_id}/download" 
             file_name = f'{asset_id}.zip'
-            response = requests.get(url, headers=headers, stream=True)
+            response = self._request("GET", url, operation="download", headers=headers, stream=True)
             if response.status_code == 200:
                 with open(file_name, "wb") as f:
                     for chunks in response.iter_content(chunk_size=8192):
@@ -834,7 +1161,7 @@ class FastAPI(API):
                         ]
                     }
             # Make a POST request to query the asset
-            response = requests.post(url, headers=headers, data=json.dumps(request_payload))
+            response = self._request("POST", url, headers=headers, data=json.dumps(request_payload))
             # Check the response status code
             if response.status_code == 201:
                 response_data = response.json()
@@ -859,7 +1186,7 @@ class FastAPI(API):
             with open(file_path, "rb") as file:
                 files = {"image_file":(file_name, file.read())}
             # Make a POST request to query the asset
-            response = requests.post(url, headers=headers, files=files)
+            response = self._request("POST", url, operation="upload", headers=headers, files=files)
             # Check the response status code
             if response.status_code == 200:
                 return "Image embedding successful!"
@@ -895,7 +1222,7 @@ class FastAPI(API):
             query_url = f"{self._api_url}/asset/{asset_id}/query"
 
             # Make a POST request to query the asset
-            response = requests.post(query_url, headers=headers, data=json.dumps(payload))
+            response = self._request("POST", query_url, headers=headers, data=json.dumps(payload))
 
             # Check the response status code
             if response.status_code == 200:
@@ -917,7 +1244,7 @@ class FastAPI(API):
             update_url = f"{self._api_url}/datasets/{asset_id}"
 
             # Make a PUT request to update the asset
-            response = requests.put(update_url, headers=headers, data=json.dumps(payload))
+            response = self._request("PUT", update_url, headers=headers, data=json.dumps(payload))
 
             # Check the response status code
             if response.status_code == 200:
@@ -964,7 +1291,7 @@ class FastAPI(API):
                         "output_column": output_column
                     }
                 }
-            response = requests.post(url, json=payload, headers=headers)
+            response = self._request("POST", url, operation="jobs", json=payload, headers=headers)
             
             # Check the response status code
             if response.status_code == 200:
@@ -982,7 +1309,7 @@ class FastAPI(API):
         headers = self._popuate_headers_with_api_key(api_key)
         try:
             url = f"{self._api_url}/asset/{asset_id}/{file_name}/get_column_names"  # Replace with the actual base URL
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
             if response.status_code != 200:
                 error_detail = response.json()
                 print('Error response:', error_detail)
@@ -1002,7 +1329,7 @@ class FastAPI(API):
         }
         try:
             url = f"{self._api_url}/jobs/{job_id}"  # Replace with the actual base URL
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
             if response.status_code != 200:
                 error_detail = response.json()
                 print('Error response:', error_detail)
@@ -1025,7 +1352,7 @@ class FastAPI(API):
             url = f"{self._api_url}/jobs/asset/{asset_id}"
 
             # Make a GET request to get job by asset
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
 
             # Check the response status code
             if response.status_code == 200:
@@ -1043,7 +1370,7 @@ class FastAPI(API):
 
         url = f"{self._api_url}/jobs/created_by/{user_id}"
 
-        response = requests.get(url, headers=headers)
+        response = self._request("GET", url, headers=headers)
 
         if response.status_code == 200:
             return ('List jobs response:', response.json())
@@ -1064,7 +1391,7 @@ class FastAPI(API):
 
             with open(file_path, "rb") as file:
                 files = {"data_file":(file_name, file.read())}
-            response = requests.post(url, files=files, headers=headers)
+            response = self._request("POST", url, operation="upload", files=files, headers=headers)
 
             if response.status_code == 200:
                 return ("Data uploaded successfully! ", response.json())
@@ -1082,7 +1409,7 @@ class FastAPI(API):
 
         try:
             url = f"{self._api_url}/asset/{asset_id}/buy/{user_id}"
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
             if response.status_code == 200:
                 return ("Buy asset successful: ", response.json())
             else:
@@ -1099,7 +1426,7 @@ class FastAPI(API):
         headers = self._popuate_headers_with_api_key(api_key)
 
         try:
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
 
             if response.status_code == 200:
                 return response.json()
@@ -1117,7 +1444,7 @@ class FastAPI(API):
         headers = self._popuate_headers_with_api_key(api_key)
 
         try:
-            response = requests.get(url, headers=headers)
+            response = self._request("GET", url, headers=headers)
 
             if response.status_code == 200:
                 return response.json()
@@ -1126,28 +1453,4 @@ class FastAPI(API):
         except Exception as e:
             return ("Error: ", e)
     
-def raise_bagel_error(resp: requests.Response) -> None:
-    """Raises an error if the response is not ok, using a BagelError if possible"""
-    if resp.ok:
-        return
-
-    bagel_error = None
-    try:
-        body = resp.json()
-        if "error" in body:
-            if body["error"] in errors.error_types:
-                bagel_error = errors.error_types[body["error"]](body["message"])
-
-    except BaseException:
-        pass
-
-    if bagel_error:
-        raise bagel_error
-
-    try:
-        resp.raise_for_status()
-    except requests.HTTPError:
-        raise (Exception(resp.text))
-
-
 #===========================================================
@@ -0,0 +1,429 @@
+"""Client-side evaluation of where and where_document filters.
+
+The server applies filters to its own records; this module applies the same filters to
+records held in the client, e.g. by a LocalCluster, or to results already fetched. A
+record whose metadata lacks the filtered key never matches, whatever the operator, and
+$gt, $gte, $lt and $lte only match numbers.
+
+compile_where and compile_where_document validate a filter and turn it into a tree of
+closures once; compiled filters are cached by value, so passing an equal filter again
+skips both validation and compilation. A compiled filter tests one record when called,
+and many at once with mask, which works on MetadataColumns: one array per metadata
+key, built on first use and reusable for every filter over the same records.
+"""
+import functools
+import operator
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
+
+import numpy as np
+
+from bagel.api.columnar import ColumnarGetResult, ColumnarQueryResult
+from bagel.api.types import (
+    Document,
+    GetResult,
+    Metadata,
+    QueryResult,
+    Where,
+    WhereDocument,
+    filter_from_key,
+    filter_key,
+    validate_where,
+    validate_where_document,
+)
+
+_ORDERINGS = {
+    "$gt": operator.gt,
+    "$gte": operator.ge,
+    "$lt": operator.lt,
+    "$lte": operator.le,
+}
+
+
+class MetadataColumns:
+    """The metadatas of a sequence of records as columns. For each key, values is an
+    object array holding the value of every record (None where missing), present marks
+    the records that have the key and numbers holds the numeric values as float64 (NaN
+    for strings, booleans and missing values). Columns are built when first asked for.
+    """
+
+    def __init__(self, metadatas: Sequence[Optional[Metadata]]):
+        self.size = len(metadatas)
+        self._metadatas = metadatas
+        self._values: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._numbers: Dict[str, np.ndarray] = {}
+
+    def values(self, key: str) -> Tuple[np.ndarray, np.ndarray]:
+        """The values and present arrays of key"""
+        column = self._values.get(key)
+        if column is None:
+            values = np.empty(self.size, dtype=object)
+            present = np.zeros(self.size, dtype=bool)
+            for i, metadata in enumerate(self._metadatas):
+                if metadata is not None and key in metadata:
+                    values[i] = metadata[key]
+                    present[i] = True
+            column = self._values[key] = (values, present)
+        return column
+
+    def numbers(self, key: str) -> np.ndarray:
+        column = self._numbers.get(key)
+        if column is None:
+            values, _ = self.values(key)
+            column = self._numbers[key] = np.array(
+                [
+                    v if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+                    for v in values
+                ],
+                dtype=np.float64,
+            )
+        return column
+
+
+Predicate = Callable[[Any], bool]
+Mask = Callable[[Any], np.ndarray]
+
+
+def _leaf(key: str, op: str, operand: Any) -> Tuple[Predicate, Mask]:
+    """The predicate and mask of one key compared with one operand"""
+    if op in ("$eq", "$ne"):
+        equal = op == "$eq"
+
+        def predicate(metadata: Optional[Metadata]) -> bool:
+            if metadata is None or key not in metadata:
+                return False
+            return bool(metadata[key] == operand) is equal
+
+        def mask(columns: MetadataColumns) -> np.ndarray:
+            values, present = columns.values(key)
+            same = np.asarray(values == operand, dtype=bool)
+            return present & (same if equal else ~same)
+
+        return predicate, mask
+
+    compare = _ORDERINGS[op]
+
+    def ordered(metadata: Optional[Metadata]) -> bool:
+        if metadata is None or key not in metadata:
+            return False
+        value = metadata[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return False
+        return bool(compare(value, operand))
+
+    def ordered_mask(columns: MetadataColumns) -> np.ndarray:
+        # NaN, standing for anything but a number, compares False
+        return cast(np.ndarray, compare(columns.numbers(key), operand))
+
+    return ordered, ordered_mask
+
+
+def _combine(
+    logical: str, parts: List[Tuple[Predicate, Mask]]
+) -> Tuple[Predicate, Mask]:
+    predicates = [predicate for predicate, _ in parts]
+    masks = [mask for _, mask in parts]
+    test = all if logical == "$and" else any
+    reduce = np.logical_and if logical == "$and" else np.logical_or
+
+    def predicate(record: Any) -> bool:
+        return test(p(record) for p in predicates)
+
+    def mask(columns: Any) -> np.ndarray:
+        out = masks[0](columns)
+        for m in masks[1:]:
+            out = reduce(out, m(columns))
+        return cast(np.ndarray, out)
+
+    return predicate, mask
+
+
+def _compile_where(where: Where) -> Tuple[Predicate, Mask]:
+    key, value = next(iter(where.items()))
+    if key in ("$and", "$or"):
+        return _combine(key, [_compile_where(w) for w in cast(List[Where], value)])
+    if isinstance(value, dict):
+        op, operand = next(iter(value.items()))
+        return _leaf(key, op, operand)
+    return _leaf(key, "$eq", value)
+
+
+def _compile_where_document(where_document: WhereDocument) -> Tuple[Predicate, Mask]:
+    op, operand = next(iter(where_document.items()))
+    if op in ("$and", "$or"):
+        return _combine(
+            op,
+            [
+                _compile_where_document(w)
+                for w in cast(List[WhereDocument], operand)
+            ],
+        )
+
+    def predicate(document: Optional[Document]) -> bool:
+        return document is not None and operand in document
+
+    def mask(documents: Sequence[Optional[Document]]) -> np.ndarray:
+        return np.fromiter(
+            (d is not None and operand in d for d in documents),
+            dtype=bool,
+            count=len(documents),
+        )
+
+    return predicate, mask
+
+
+class CompiledWhere:
+    """A where filter compiled by compile_where. Calling it with a record's metadata
+    tells whether the record matches; mask does the same for many records at once."""
+
+    def __init__(self, where: Optional[Where]):
+        self.where = where or None
+        self._predicate: Optional[Predicate] = None
+        self._mask: Optional[Mask] = None
+        if self.where:
+            self._predicate, self._mask = _compile_where(self.where)
+
+    def __call__(self, metadata: Optional[Metadata]) -> bool:
+        return self._predicate is None or self._predicate(metadata)
+
+    def mask(
+        self, metadatas: Union[MetadataColumns, Sequence[Optional[Metadata]]]
+    ) -> np.ndarray:
+        """A boolean array marking the matching records. Pass the same MetadataColumns
+        to filter the same records repeatedly without rebuilding the columns."""
+        if not isinstance(metadatas, MetadataColumns):
+            metadatas = MetadataColumns(metadatas)
+        if self._mask is None:
+            return np.ones(metadatas.size, dtype=bool)
+        return self._mask(metadatas)
+
+
+class CompiledWhereDocument:
+    """A where_document filter compiled by compile_where_document, called with a
+    document or masking a sequence of documents"""
+
+    def __init__(self, where_document: Optional[WhereDocument]):
+        self.where_document = where_document or None
+        self._predicate: Optional[Predicate] = None
+        self._mask: Optional[Mask] = None
+        if self.where_document:
+            self._predicate, self._mask = _compile_where_document(self.where_document)
+
+    def __call__(self, document: Optional[Document]) -> bool:
+        return self._predicate is None or self._predicate(document)
+
+    def mask(self, documents: Sequence[Optional[Document]]) -> np.ndarray:
+        if self._mask is None:
+            return np.ones(len(documents), dtype=bool)
+        return self._mask(documents)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compiled_where(key: Hashable) -> CompiledWhere:
+    # Invalid filters raise, and exceptions are not cached
+    where = filter_from_key(key)
+    return CompiledWhere(validate_where(where) if where else None)
+
+
+@functools.lru_cache(maxsize=1024)
+def _compiled_where_document(key: Hashable) -> CompiledWhereDocument:
+    where_document = filter_from_key(key)
+    return CompiledWhereDocument(
+        validate_where_document(where_document) if where_document else None
+    )
+
+
+def compile_where(where: Optional[Where]) -> CompiledWhere:
+    """Validates a where filter and compiles it, or returns the cached compiled filter
+    of an equal one. An empty or None filter matches every record.
+
+    Raises:
+        ValueError: If where is not a valid filter
+    """
+    key = filter_key(where or {})
+    if key is None:
+        # Only invalid filters hold unhashable values
+        return CompiledWhere(validate_where(cast(Where, where)))
+    return _compiled_where(key)
+
+
+def compile_where_document(
+    where_document: Optional[WhereDocument],
+) -> CompiledWhereDocument:
+    """Validates a where_document filter and compiles it, see compile_where"""
+    key = filter_key(where_document or {})
+    if key is None:
+        return CompiledWhereDocument(
+            validate_where_document(cast(WhereDocument, where_document))
+        )
+    return _compiled_where_document(key)
+
+
+def matches_where(where: Optional[Where], metadata: Optional[Metadata]) -> bool:
+    """Whether a record's metadata satisfies a where filter"""
+    return compile_where(where)(metadata)
+
+
+def matches_where_document(
+    where_document: Optional[WhereDocument], document: Optional[str]
+) -> bool:
+    """Whether a record's document satisfies a where_document filter"""
+    return compile_where_document(where_document)(document)
+
+
+def _keep(
+    where: CompiledWhere,
+    where_document: CompiledWhereDocument,
+    metadatas: Optional[Sequence[Any]],
+    documents: Optional[Sequence[Any]],
+    size: int,
+) -> np.ndarray:
+    if where.where and metadatas is None:
+        raise ValueError("Filtering a result by where needs its metadatas")
+    if where_document.where_document and documents is None:
+        raise ValueError("Filtering a result by where_document needs its documents")
+    keep = np.ones(size, dtype=bool)
+    if where.where:
+        keep &= where.mask(cast(Sequence[Any], metadatas))
+    if where_document.where_document:
+        keep &= where_document.mask(cast(Sequence[Any], documents))
+    return keep
+
+
+R = TypeVar("R", GetResult, QueryResult, ColumnarGetResult, ColumnarQueryResult)
+
+
+def filter_result(
+    result: R,
+    where: Optional[Where] = None,
+    where_document: Optional[WhereDocument] = None,
+) -> R:
+    """Drops the records of a get or find result that do not satisfy the filters,
+    e.g. to narrow a cached or wider result without another request. The result keeps
+    its type and the order of its records; a find result keeps one row per query.
+
+    Raises:
+        ValueError: If a filter is invalid, or the result lacks the metadatas or
+            documents it filters on
+    """
+    compiled_where = compile_where(where)
+    compiled_document = compile_where_document(where_document)
+    if not compiled_where.where and not compiled_document.where_document:
+        return result
+
+    if isinstance(result, ColumnarGetResult):
+        keep = _keep(
+            compiled_where, compiled_document, result.metadatas, result.documents, len(result.ids)
+        )
+        return cast(R, _select_get(result, keep))
+    if isinstance(result, ColumnarQueryResult):
+        return cast(R, _select_query(result, compiled_where, compiled_document))
+    if "distances" in result:
+        rows = [
+            _keep(
+                compiled_where,
+                compiled_document,
+                result["metadatas"][i] if result["metadatas"] is not None else None,
+                result["documents"][i] if result["documents"] is not None else None,
+                len(ids),
+            )
+            for i, ids in enumerate(result["ids"])
+        ]
+        return cast(
+            R,
+            {
+                key: (
+                    [_pick(row, keep) for row, keep in zip(value, rows)]
+                    if value is not None
+                    else None
+                )
+                for key, value in result.items()
+            },
+        )
+    keep = _keep(
+        compiled_where,
+        compiled_document,
+        result["metadatas"],
+        result["documents"],
+        len(result["ids"]),
+    )
+    return cast(
+        R,
+        {
+            key: _pick(value, keep) if value is not None else None
+            for key, value in result.items()
+        },
+    )
+
+
+def _pick(values: Any, keep: np.ndarray) -> Any:
+    if isinstance(values, np.ndarray):
+        return values[keep]
+    return [value for value, kept in zip(values, keep) if kept]
+
+
+def _select_get(result: ColumnarGetResult, keep: np.ndarray) -> ColumnarGetResult:
+    return ColumnarGetResult(
+        ids=result.ids[keep],
+        embeddings=result.embeddings[keep] if result.embeddings is not None else None,
+        metadatas=_pick(result.metadatas, keep) if result.metadatas is not None else None,
+        documents=_pick(result.documents, keep) if result.documents is not None else None,
+    )
+
+
+def _select_query(
+    result: ColumnarQueryResult,
+    where: CompiledWhere,
+    where_document: CompiledWhereDocument,
+) -> ColumnarQueryResult:
+    """Keeps the matching results of each query, moved to the front of its row and
+    padded as ColumnarQueryResult.from_body pads"""
+    queries = len(result.lengths)
+    keeps = [
+        _keep(
+            where,
+            where_document,
+            result.metadatas[i] if result.metadatas is not None else None,
+            result.documents[i] if result.documents is not None else None,
+            int(result.lengths[i]),
+        )
+        for i in range(queries)
+    ]
+    lengths = np.array([int(keep.sum()) for keep in keeps], dtype=np.int64)
+    k = int(lengths.max()) if queries else 0
+
+    def pack(block: Optional[np.ndarray], fill: Any) -> Optional[np.ndarray]:
+        if block is None:
+            return None
+        out = np.full((queries, k) + block.shape[2:], fill, dtype=block.dtype)
+        for i, keep in enumerate(keeps):
+            out[i, : lengths[i]] = block[i, : len(keep)][keep]
+        return out
+
+    return ColumnarQueryResult(
+        ids=cast(np.ndarray, pack(result.ids, "")),
+        lengths=lengths,
+        embeddings=pack(result.embeddings, 0.0),
+        distances=pack(result.distances, np.nan),
+        metadatas=(
+            [_pick(row, keep) for row, keep in zip(result.metadatas, keeps)]
+            if result.metadatas is not None
+            else None
+        ),
+        documents=(
+            [_pick(row, keep) for row, keep in zip(result.documents, keeps)]
+            if result.documents is not None
+            else None
+        ),
+    )
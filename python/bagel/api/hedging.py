@@ -0,0 +1,218 @@
+"""Hedged requests for read paths.
+
+A Hedger sends a request and, if no response arrived after the configured latency
+percentile of recent requests, sends a duplicate and returns whichever completes first.
+Synchronous requests and their hedges run in a thread pool while the caller waits; when
+every worker is busy a request is sent on the caller's thread without a hedge, so the
+pool never limits how many requests are in flight. Hedges are drawn from a token bucket that refills by max_ratio per request, so they
+never add more than about max_ratio extra load.
+"""
+import asyncio
+import bisect
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Deque, List, Optional, Set, TypeVar
+
+from bagel.api.retry import RetryBudget
+
+T = TypeVar("T")
+
+
+class Hedger:
+    """Args:
+    percentile: The latency percentile of recent requests after which a hedge is sent.
+    max_ratio: The maximum number of hedges per request, averaged over time.
+    min_delay: The shortest wait before a hedge, in seconds.
+    window: The number of recent latencies the percentile is taken over.
+    min_samples: No request is hedged until this many latencies were observed.
+    max_workers: The size of the thread pool running synchronous requests and hedges.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        max_ratio: float = 0.05,
+        min_delay: float = 0.01,
+        window: int = 1000,
+        min_samples: int = 20,
+        max_workers: int = 16,
+    ):
+        if not 0 < percentile < 1:
+            raise ValueError(f"Expected percentile between 0 and 1, got {percentile}")
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # The window in arrival order, to evict the oldest, and in sorted order, to
+        # read the percentile without sorting on every request
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._sorted: List[float] = []
+        self._budget = RetryBudget(max_tokens=10.0, ratio=max_ratio)
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self._in_flight: Set["Future[Any]"] = set()
+
+    def delay(self) -> Optional[float]:
+        """The current hedge delay, or None while there are too few samples"""
+        with self._lock:
+            n = len(self._sorted)
+            if n < self.min_samples:
+                return None
+            latency = self._sorted[min(n - 1, int(self.percentile * n))]
+        return max(self.min_delay, latency)
+
+    def _observe(self, latency: float) -> None:
+        with self._lock:
+            if len(self._latencies) == self._latencies.maxlen:
+                del self._sorted[bisect.bisect_left(self._sorted, self._latencies[0])]
+            self._latencies.append(latency)
+            bisect.insort(self._sorted, latency)
+
+    def _start(self) -> Optional[float]:
+        with self._lock:
+            self.requests += 1
+        self._budget.record_success()
+        return self.delay()
+
+    def _try_hedge(self) -> bool:
+        if not self._budget.try_spend():
+            return False
+        with self._lock:
+            self.hedges += 1
+        return True
+
+    def _timed(self, send: Callable[[], T]) -> T:
+        start = time.monotonic()
+        result = send()
+        self._observe(time.monotonic() - start)
+        return result
+
+    def run(
+        self,
+        send: Callable[[], T],
+        discard: Optional[Callable[[T], Any]] = None,
+    ) -> T:
+        """Call send, hedging it with a second call if it is slow, and return the first
+        successful result. A losing call that could not be cancelled before it started
+        is left to finish in the background, and its result is passed to discard."""
+        delay = self._start()
+        if delay is None:
+            return self._timed(send)
+
+        # Each call runs in a copy of the caller's context, so deadlines carry over
+        context = contextvars.copy_context()
+        primary = self._submit(context, send)
+        if primary is None:
+            return self._timed(send)
+        futures = [primary]
+        done, _ = wait(futures, timeout=delay)
+        if not done and self._try_hedge():
+            hedge = self._submit(contextvars.copy_context(), send)
+            if hedge is not None:
+                futures.append(hedge)
+
+        pending = set(futures)
+        errors: List[BaseException] = []
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is not None:
+                    errors.append(error)
+                    continue
+                if future is not primary:
+                    with self._lock:
+                        self.hedge_wins += 1
+                for loser in pending:
+                    if not loser.cancel() and discard is not None:
+                        loser.add_done_callback(_discard_result(discard))
+                return future.result()
+        raise errors[0]
+
+    def _submit(
+        self, context: contextvars.Context, send: Callable[[], T]
+    ) -> Optional["Future[T]"]:
+        """Run send in the pool, or return None if every worker is busy or the hedger
+        was shut down"""
+        with self._lock:
+            if self._closed or len(self._in_flight) >= self._max_workers:
+                return None
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self._max_workers, thread_name_prefix="bagel-hedge"
+                )
+            future = self._executor.submit(context.run, self._timed, send)
+            self._in_flight.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future: "Future[Any]") -> None:
+        with self._lock:
+            self._in_flight.discard(future)
+
+    async def arun(self, send: Callable[[], Awaitable[T]]) -> T:
+        """The asyncio form of run. The losing request is cancelled."""
+        delay = self._start()
+
+        async def timed() -> T:
+            start = time.monotonic()
+            result = await send()
+            self._observe(time.monotonic() - start)
+            return result
+
+        if delay is None:
+            return await timed()
+
+        primary = asyncio.ensure_future(timed())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done and self._try_hedge():
+                tasks.append(asyncio.ensure_future(timed()))
+
+            pending = set(tasks)
+            errors: List[BaseException] = []
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is not None:
+                        errors.append(error)
+                        continue
+                    if task is not primary:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return task.result()
+            raise errors[0]
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def shutdown(self) -> None:
+        """Stop using the pool and cancel the calls not started yet"""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+            in_flight = list(self._in_flight)
+        for future in in_flight:
+            future.cancel()
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+
+def _discard_result(discard: Callable[[Any], Any]) -> Callable[["Future[Any]"], None]:
+    def callback(future: "Future[Any]") -> None:
+        if not future.cancelled() and future.exception() is None:
+            discard(future.result())
+
+    return callback
@@ -0,0 +1,62 @@
+"""Request headers and error mapping shared by the REST clients.
+
+FastAPI sends requests with requests and AsyncFastAPI with httpx; both build their
+headers and turn error responses into exceptions here, so the two cannot drift apart.
+"""
+import os
+from typing import Any, Dict, Optional
+
+import bagel.errors as errors
+
+BAGEL_USER_ID = "BAGEL_USER_ID"
+BAGEL_API_KEY = "BAGEL_API_KEY"
+
+X_API_KEY = "x-api-key"
+
+DEFAULT_TENANT = "default_tenant"
+
+
+def resolve_api_key(api_key: Optional[str]) -> Optional[str]:
+    """The api_key passed, or the BAGEL_API_KEY environment variable if None"""
+    if api_key is None:
+        return os.environ.get(BAGEL_API_KEY)
+    return api_key
+
+
+def resolve_user_id(user_id: str) -> str:
+    """The user_id passed, or the BAGEL_USER_ID environment variable if it is the
+    default tenant"""
+    if user_id == DEFAULT_TENANT and os.environ.get(BAGEL_USER_ID) is not None:
+        return os.environ[BAGEL_USER_ID]
+    return user_id
+
+
+def headers_with_api_key(headers: Dict[str, str], api_key: Optional[str]) -> Dict[str, str]:
+    """A copy of headers with the x-api-key header set, unless there is no key"""
+    headers = headers.copy()
+    api_key = resolve_api_key(api_key)
+    if api_key is not None:
+        headers[X_API_KEY] = api_key
+    return headers
+
+
+def raise_bagel_error(resp: Any) -> None:
+    """Raises an error if the response, from requests or httpx, has a 4xx or 5xx
+    status, using a BagelError if possible"""
+    if resp.status_code < 400:
+        return
+
+    bagel_error = None
+    try:
+        body = resp.json()
+        if "error" in body:
+            if body["error"] in errors.error_types:
+                bagel_error = errors.error_types[body["error"]](body["message"])
+
+    except BaseException:
+        pass
+
+    if bagel_error:
+        raise bagel_error
+
+    raise Exception(resp.text)
@@ -0,0 +1,551 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from contextvars import copy_context
+from typing import TYPE_CHECKING, Any, Callable, Deque, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Set, Tuple, Union
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+from bagel.api.types import (
+    BatchFailure,
+    Document,
+    Documents,
+    Embedding,
+    Embeddings,
+    ID,
+    IDs,
+    IngestSummary,
+    Metadata,
+    Metadatas,
+    OneOrMany,
+    Where,
+    WhereDocument,
+    maybe_cast_one_to_many,
+    validate_embedding_set,
+    validate_ids,
+    validate_where,
+    validate_where_document,
+)
+import bagel.errors as errors
+
+if TYPE_CHECKING:
+    from bagel.api.Cluster import Cluster
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_MAX_BATCH_BYTES = 8 * 1024 * 1024
+
+# A float serialized by json.dumps plus its separator. Used to size batches
+# conservatively, so they stay under max_bytes even on the JSON wire format.
+_JSON_BYTES_PER_FLOAT = 20
+_RECORD_OVERHEAD_BYTES = 16
+
+Columns = Tuple[IDs, Optional[Embeddings], Optional[Metadatas], Optional[Documents]]
+# (id, embedding, metadata, document) or a dict with those keys; all but id are optional
+Record = Union[
+    Tuple[ID, Optional[Embedding], Optional[Metadata], Optional[Document]],
+    Mapping[str, Any],
+]
+WriteBatch = Callable[[IDs, Optional[Embeddings], Optional[Metadatas], Optional[Documents]], Any]
+
+
+def estimate_record_bytes(
+    id: str,
+    embedding_dim: int,
+    metadata: Optional[Any] = None,
+    document: Optional[str] = None,
+) -> int:
+    """Estimates the serialized size of one record in a write request body. Streamed
+    records are sized before they are validated, so an id that is not a str is sized by
+    its str() and rejected later with the rest of its batch."""
+    size = _RECORD_OVERHEAD_BYTES + len(str(id)) + embedding_dim * _JSON_BYTES_PER_FLOAT
+    if metadata:
+        size += len(json.dumps(metadata))
+    if document:
+        size += len(document)
+    return size
+
+
+def plan_batches(
+    columns: Columns,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_bytes: Optional[int] = DEFAULT_MAX_BATCH_BYTES,
+) -> List[Tuple[int, int]]:
+    """Splits the records into [start, end) ranges of at most batch_size records and,
+    if max_bytes is set, at most max_bytes of estimated payload. A single record larger
+    than max_bytes gets a batch of its own."""
+    if batch_size <= 0:
+        raise ValueError(f"Expected batch_size to be a positive int, got {batch_size}")
+    ids, embeddings, metadatas, documents = columns
+    n = len(ids)
+    if max_bytes is None:
+        return [(start, min(start + batch_size, n)) for start in range(0, n, batch_size)]
+
+    batches = []
+    start = 0
+    batch_bytes = 0
+    for i in range(n):
+        record_bytes = estimate_record_bytes(
+            ids[i],
+            len(embeddings[i]) if embeddings is not None else 0,
+            metadatas[i] if metadatas is not None else None,
+            documents[i] if documents is not None else None,
+        )
+        if i > start and (i - start >= batch_size or batch_bytes + record_bytes > max_bytes):
+            batches.append((start, i))
+            start = i
+            batch_bytes = 0
+        batch_bytes += record_bytes
+    if start < n:
+        batches.append((start, n))
+    return batches
+
+
+def slice_columns(columns: Columns, start: int, end: int) -> Columns:
+    """Returns the records in [start, end). Arrays are sliced as views, not copied."""
+    return tuple(  # type: ignore
+        column[start:end] if column is not None else None for column in columns
+    )
+
+
+def summarize(
+    records: int, batches: int, failed_batches: List[BatchFailure], started: float
+) -> IngestSummary:
+    elapsed = time.monotonic() - started
+    records_failed = sum(failure["end"] - failure["start"] for failure in failed_batches)
+    written = records - records_failed
+    return IngestSummary(
+        records=records,
+        records_failed=records_failed,
+        batches=batches,
+        failed_batches=sorted(failed_batches, key=lambda failure: failure["batch"]),
+        elapsed_seconds=elapsed,
+        records_per_second=written / elapsed if elapsed > 0 else float(written),
+    )
+
+
+def batch_failure(
+    batch: int, start: int, end: int, ids: Sequence[str], error: BaseException
+) -> BatchFailure:
+    logger.warning(f"Batch {batch} ({end - start} records) failed: {error}")
+    return BatchFailure(batch=batch, start=start, end=end, ids=list(ids), error=str(error))
+
+
+def write_batches(
+    write: WriteBatch,
+    columns: Columns,
+    batches: List[Tuple[int, int]],
+    workers: int = 4,
+) -> IngestSummary:
+    """Writes every batch with up to workers requests in flight. A failed batch does
+    not stop the others; it is reported in the summary's failed_batches. At most
+    2 * workers batches are sliced and submitted at a time, so the pool's queue does not
+    hold a copy of every batch."""
+    started = time.monotonic()
+    workers = max(1, workers)
+    failed_batches: List[BatchFailure] = []
+    pending: Dict[Future, Tuple[int, int, int]] = {}
+
+    def collect(done: Iterable[Future]) -> None:
+        for future in done:
+            batch, start, end = pending.pop(future)
+            error = future.exception()
+            if error is not None:
+                failed_batches.append(
+                    batch_failure(batch, start, end, columns[0][start:end], error)
+                )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for batch, (start, end) in enumerate(batches):
+            if len(pending) >= 2 * workers:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            future = executor.submit(copy_context().run, write, *slice_columns(columns, start, end))
+            pending[future] = (batch, start, end)
+        collect(as_completed(list(pending)))
+    return summarize(len(columns[0]), len(batches), failed_batches, started)
+
+
+def _unpack_record(record: Record) -> Tuple[Any, Any, Any, Any]:
+    if isinstance(record, Mapping):
+        return (
+            record["id"],
+            record.get("embedding"),
+            record.get("metadata"),
+            record.get("document"),
+        )
+    id, embedding, metadata, document = record
+    return id, embedding, metadata, document
+
+
+def records_to_columns(records: Sequence[Record]) -> Columns:
+    """Turns a batch of records into validated column lists. Missing metadata become {};
+    a column that is missing for every record is None."""
+    ids, embeddings, metadatas, documents = zip(*(_unpack_record(r) for r in records))
+    has_embeddings = [e is not None for e in embeddings]
+    has_documents = [d is not None for d in documents]
+    if any(has_embeddings) and not all(has_embeddings):
+        raise ValueError("Expected every record in a batch to have an embedding, or none")
+    if any(has_documents) and not all(has_documents):
+        raise ValueError("Expected every record in a batch to have a document, or none")
+
+    embedding_column: Optional[Embeddings] = None
+    if all(has_embeddings):
+        if isinstance(embeddings[0], np.ndarray):
+            embedding_column = np.stack(embeddings)
+        else:
+            embedding_column = [list(e) for e in embeddings]
+    metadata_column = (
+        [m if m is not None else {} for m in metadatas]
+        if any(m is not None for m in metadatas)
+        else None
+    )
+    return validate_embedding_set(
+        list(ids),
+        embedding_column,
+        metadata_column,
+        list(documents) if all(has_documents) else None,
+    )
+
+
+def stream_batches(
+    records: Iterable[Record],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_bytes: Optional[int] = DEFAULT_MAX_BATCH_BYTES,
+) -> Iterator[Tuple[int, List[Record]]]:
+    """Consumes records lazily and yields (offset, batch) pairs, where each batch has at
+    most batch_size records and, if max_bytes is set, at most max_bytes of estimated
+    payload. Only the batch being built is held in memory."""
+    if batch_size <= 0:
+        raise ValueError(f"Expected batch_size to be a positive int, got {batch_size}")
+    batch: List[Record] = []
+    batch_bytes = 0
+    offset = 0
+    for record in records:
+        record_bytes = 0
+        if max_bytes is not None:
+            id, embedding, metadata, document = _unpack_record(record)
+            record_bytes = estimate_record_bytes(
+                id, len(embedding) if embedding is not None else 0, metadata, document
+            )
+        if batch and (
+            len(batch) >= batch_size
+            or (max_bytes is not None and batch_bytes + record_bytes > max_bytes)
+        ):
+            yield offset, batch
+            offset += len(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(record)
+        batch_bytes += record_bytes
+    if batch:
+        yield offset, batch
+
+
+def write_stream(
+    write: WriteBatch,
+    batches: Iterator[Tuple[int, List[Record]]],
+    max_in_flight: int = 4,
+) -> IngestSummary:
+    """Writes batches as they are produced, with at most max_in_flight requests
+    outstanding. The producer blocks while that many are in flight, which bounds memory
+    to roughly max_in_flight + 1 batches."""
+    started = time.monotonic()
+    max_in_flight = max(1, max_in_flight)
+    slots = threading.BoundedSemaphore(max_in_flight)
+    failures_lock = threading.Lock()
+    failed_batches: List[BatchFailure] = []
+    records = 0
+    count = 0
+
+    def write_records(batch: int, offset: int, chunk: List[Record]) -> None:
+        try:
+            write(*records_to_columns(chunk))
+        except Exception as e:
+            ids = [_unpack_record(r)[0] for r in chunk]
+            with failures_lock:
+                failed_batches.append(
+                    batch_failure(batch, offset, offset + len(chunk), ids, e)
+                )
+
+    def release(_: Future) -> None:
+        slots.release()
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for offset, chunk in batches:
+            slots.acquire()
+            future = executor.submit(copy_context().run, write_records, count, offset, chunk)
+            future.add_done_callback(release)
+            records += len(chunk)
+            count += 1
+    return summarize(records, count, failed_batches, started)
+
+
+class _PendingBatch:
+    """Records of consecutive writes of one kind, coalesced into a single request"""
+
+    def __init__(self, kind: str, signature: Tuple[Any, ...], offset: int):
+        self.kind = kind
+        self.signature = signature
+        self.offset = offset
+        self.records: List[Any] = []
+        self.ids: Set[str] = set()
+        self.bytes = 0
+        self.created = time.monotonic()
+        self.where: Optional[Where] = None
+        self.where_document: Optional[WhereDocument] = None
+
+
+class BufferedWriter:
+    """Coalesces small add, upsert and delete calls into large batched requests, sent by
+    a background flusher thread. Use it through Cluster.buffered().
+
+    Consecutive calls of the same kind share a batch until it reaches max_records or
+    max_bytes, is older than flush_interval seconds, or a call would repeat an id already
+    in it. Batches are sent one at a time in call order, so the writes to any id are
+    applied in the order they were made. Callers block while max_pending_batches sealed
+    batches wait to be sent.
+
+    Failed batches are collected and raised as a BufferedWriteError by the next flush()
+    or by close().
+    """
+
+    def __init__(
+        self,
+        cluster: "Cluster",
+        max_records: int = DEFAULT_BATCH_SIZE,
+        max_bytes: Optional[int] = DEFAULT_MAX_BATCH_BYTES,
+        flush_interval: Optional[float] = 1.0,
+        increment_index: bool = True,
+        max_pending_batches: int = 4,
+    ):
+        if max_records <= 0:
+            raise ValueError(f"Expected max_records to be a positive int, got {max_records}")
+        self._cluster = cluster
+        self._max_records = max_records
+        self._max_bytes = max_bytes
+        self._flush_interval = flush_interval
+        self._increment_index = increment_index
+        self._max_pending_batches = max(1, max_pending_batches)
+
+        self._cond = threading.Condition()
+        self._current: Optional[_PendingBatch] = None
+        self._sealed: Deque[_PendingBatch] = deque()
+        self._sending = False
+        self._closed = False
+        self._offset = 0
+        self._batches = 0
+        self._failed_batches: List[BatchFailure] = []
+
+        # The flusher runs in a copy of the caller's context, so a writer opened inside
+        # Cluster.bulk_load defers indexing like the block's other writes
+        self._thread = threading.Thread(
+            target=copy_context().run,
+            args=(self._run,),
+            name="bagel-buffered-writer",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def add(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[OneOrMany[Embedding]] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+    ) -> None:
+        """Queue records to be added. They are validated immediately."""
+        self._append("add", validate_embedding_set(ids, embeddings, metadatas, documents))
+
+    def upsert(
+        self,
+        ids: OneOrMany[ID],
+        embeddings: Optional[OneOrMany[Embedding]] = None,
+        metadatas: Optional[OneOrMany[Metadata]] = None,
+        documents: Optional[OneOrMany[Document]] = None,
+    ) -> None:
+        """Queue records to be upserted. They are validated immediately."""
+        self._append("upsert", validate_embedding_set(ids, embeddings, metadatas, documents))
+
+    def delete(
+        self,
+        ids: Optional[OneOrMany[ID]] = None,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+    ) -> None:
+        """Queue a delete. Deletes by id are coalesced; a delete with a where or
+        where_document filter is sent on its own, after everything queued before it."""
+        ids = validate_ids(maybe_cast_one_to_many(ids)) if ids else None
+        if where or where_document:
+            with self._cond:
+                self._check_open()
+                # Room for the batch being built and this one, so nothing is appended
+                # between them while waiting
+                self._wait_for_room(lambda: 1 + (self._current is not None))
+                self._seal()
+                batch = _PendingBatch("delete", ("delete", "filter"), self._offset)
+                batch.records = list(ids or [])
+                batch.where = validate_where(where) if where else None
+                batch.where_document = (
+                    validate_where_document(where_document) if where_document else None
+                )
+                self._enqueue(batch)
+            return
+        if ids:
+            self._append("delete", (ids, None, None, None))
+
+    def flush(self) -> None:
+        """Send everything queued so far and wait for it to complete.
+
+        Raises:
+            BufferedWriteError: If any batch failed since the last flush
+        """
+        with self._cond:
+            self._wait_for_room(lambda: 1)
+            self._seal()
+            self._cond.notify_all()
+            self._cond.wait_for(lambda: not self._sealed and not self._sending)
+            failed, self._failed_batches = self._failed_batches, []
+        if failed:
+            raise errors.BufferedWriteError(
+                f"{len(failed)} buffered batches failed, first error: {failed[0]['error']}",
+                failed,
+            )
+
+    def close(self) -> None:
+        """Flush and stop the background flusher"""
+        if self._closed:
+            return
+        try:
+            self.flush()
+        finally:
+            with self._cond:
+                self._closed = True
+                self._cond.notify_all()
+            self._thread.join()
+
+    def __enter__(self) -> "BufferedWriter":
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # Don't mask the exception raised in the block with a flush failure
+        try:
+            self.close()
+        except errors.BufferedWriteError as e:
+            logger.error(f"Buffered writes failed while handling another error: {e}")
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("This buffered writer is closed")
+
+    def _append(self, kind: str, columns: Columns) -> None:
+        ids, embeddings, metadatas, documents = columns
+        signature = (kind, embeddings is not None, metadatas is not None, documents is not None)
+        with self._cond:
+            self._check_open()
+            for i, id in enumerate(ids):
+                embedding = embeddings[i] if embeddings is not None else None
+                metadata = metadatas[i] if metadatas is not None else None
+                document = documents[i] if documents is not None else None
+                record_bytes = estimate_record_bytes(
+                    id, len(embedding) if embedding is not None else 0, metadata, document
+                )
+                batch = self._current
+                while batch is not None and (
+                    batch.signature != signature
+                    or id in batch.ids
+                    or len(batch.records) >= self._max_records
+                    or (
+                        self._max_bytes is not None
+                        and batch.bytes + record_bytes > self._max_bytes
+                    )
+                ):
+                    if self._wait_for_room(lambda: 1):
+                        # Other writers may have sealed or grown the batch meanwhile
+                        batch = self._current
+                        continue
+                    self._seal()
+                    batch = None
+                if batch is None:
+                    batch = self._current = _PendingBatch(kind, signature, self._offset)
+                batch.records.append(id if kind == "delete" else (id, embedding, metadata, document))
+                batch.ids.add(id)
+                batch.bytes += record_bytes
+                self._offset += 1
+
+    def _wait_for_room(self, batches: Callable[[], int]) -> bool:
+        """Block until the send queue has room for batches() more, or at least is empty,
+        and return whether it had to wait. The lock is released while waiting, so callers
+        re-read the state they depend on. Called with the lock held."""
+
+        def has_room() -> bool:
+            n = batches()
+            return len(self._sealed) + n <= max(self._max_pending_batches, n)
+
+        if has_room():
+            return False
+        self._cond.wait_for(lambda: has_room() or self._closed)
+        self._check_open()
+        return True
+
+    def _seal(self) -> None:
+        """Move the batch being built to the send queue, which must have room for it.
+        Called with the lock held."""
+        if self._current is not None:
+            batch, self._current = self._current, None
+            self._enqueue(batch)
+
+    def _enqueue(self, batch: _PendingBatch) -> None:
+        self._sealed.append(batch)
+        self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._sealed or self._closed, timeout=self._flush_interval
+                )
+                if not self._sealed and self._current is not None and (
+                    self._flush_interval is not None
+                    and time.monotonic() - self._current.created >= self._flush_interval
+                ):
+                    self._seal()
+                if not self._sealed:
+                    if self._closed:
+                        return
+                    continue
+                batch = self._sealed.popleft()
+                self._sending = True
+                self._cond.notify_all()
+            try:
+                self._send(batch)
+            except Exception as e:
+                ids = [r if batch.kind == "delete" else r[0] for r in batch.records]
+                failure = batch_failure(
+                    self._batches, batch.offset, batch.offset + len(batch.records), ids, e
+                )
+                with self._cond:
+                    self._failed_batches.append(failure)
+            with self._cond:
+                self._batches += 1
+                self._sending = False
+                self._cond.notify_all()
+
+    def _send(self, batch: _PendingBatch) -> None:
+        cluster = self._cluster
+        if batch.kind == "delete":
+            cluster._client._delete(
+                cluster.id, batch.records or None, batch.where, batch.where_document
+            )
+            return
+        cluster._write_batch(
+            *records_to_columns(batch.records),
+            increment_index=self._increment_index,
+            upsert=batch.kind == "upsert",
+        )
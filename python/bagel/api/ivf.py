@@ -0,0 +1,332 @@
+"""Approximate nearest-neighbour search with an inverted file (IVF) index.
+
+IVFIndex clusters the rows of a matrix with k-means into n_lists inverted lists and
+answers a query by searching only the nprobe lists whose centroids are nearest to it,
+so recall and latency are traded by nprobe. With pq_subvectors set, rows in the lists
+are also product-quantised: each is stored as one byte per subvector, candidates are
+ranked by their approximate distance, and the best refine * k are re-ranked exactly.
+
+The index stores row numbers, never vectors: searches read the candidates' vectors from
+the matrix passed in, so the exact distances of the results always follow the matrix.
+Rows are added incrementally with add; rows that were never added are searched exactly.
+"""
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from bagel.api.search import Space, nearest, validate_space
+
+# The rows the centroids and the codebooks are trained on at most, sampled from the
+# matrix
+_MAX_TRAINING_ROWS = 100_000
+_MAX_PQ_TRAINING_ROWS = 20_000
+_PQ_CENTROIDS = 256
+# The largest number of distances computed at once by assign
+_MAX_BLOCK = 1 << 24
+
+
+def assign(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """The index of the nearest centroid to each row of data, by l2 distance"""
+    norms = np.einsum("ij,ij->i", centroids, centroids)
+    out = np.empty(len(data), dtype=np.int64)
+    block = max(1, _MAX_BLOCK // max(1, len(centroids)))
+    for start in range(0, len(data), block):
+        # |x - c|^2 = |x|^2 - 2 x.c + |c|^2, and |x|^2 does not change the argmin
+        part = norms - 2.0 * (data[start : start + block] @ centroids.T)
+        out[start : start + block] = part.argmin(axis=1)
+    return out
+
+
+def kmeans(
+    data: np.ndarray, k: int, iterations: int = 10, seed: int = 0
+) -> np.ndarray:
+    """The k centroids of data found by Lloyd's algorithm, starting from k distinct
+    rows. Clusters that become empty are restarted at a random row."""
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign(data, centroids)
+        counts = np.bincount(assignment, minlength=k)
+        order = np.argsort(assignment, kind="stable")
+        starts = np.searchsorted(assignment[order], np.arange(k))
+        empty = counts == 0
+        sums = np.add.reduceat(data[order], starts[~empty], axis=0)
+        centroids[~empty] = sums / counts[~empty, None]
+        if empty.any():
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()))]
+    return centroids
+
+
+class IVFIndex:
+    """Args:
+    dimension: The dimension of the indexed vectors.
+    space: The distance function of the matrix, one of `"l2"`, `"cosine"` and `"ip"`.
+    n_lists: The number of inverted lists, 4 * sqrt(rows) when trained if None.
+    nprobe: The number of lists searched per query.
+    pq_subvectors: The number of bytes each row is compressed to, or None to rank
+        candidates by exact distance. Must divide dimension.
+    refine: With product quantisation, refine * k candidates are re-ranked exactly.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        space: Space = "l2",
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        pq_subvectors: Optional[int] = None,
+        refine: int = 4,
+    ):
+        if pq_subvectors is not None and dimension % pq_subvectors:
+            raise ValueError(
+                f"Expected pq_subvectors to divide the dimension {dimension}, got {pq_subvectors}"
+            )
+        self.dimension = dimension
+        self.space = validate_space(space)
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.pq_subvectors = pq_subvectors
+        self.refine = refine
+        self.centroids: Optional[np.ndarray] = None
+        # (subvectors, 256, dimension / subvectors) codebooks of the residuals
+        self.codebooks: Optional[np.ndarray] = None
+        # The list of each row, -1 for rows not in the index
+        self.assignment = np.full(0, -1, dtype=np.int64)
+        self.codes = np.zeros((0, pq_subvectors or 0), dtype=np.uint8)
+        # Rows appended to each list since it was last compacted; entries whose
+        # assignment changed since are dropped when the list is next searched
+        self._lists: List[List[np.ndarray]] = []
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _coarse(self, vectors: np.ndarray) -> np.ndarray:
+        """Vectors as clustered: unit length for cosine"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.space != "cosine":
+            return vectors
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-30)
+
+    def train(self, matrix: np.ndarray, rows: Optional[np.ndarray] = None, seed: int = 0) -> None:
+        """Learns the centroids, and codebooks with product quantisation, from a sample
+        of the rows of matrix, all rows if rows is None. Clears the index."""
+        rng = np.random.default_rng(seed)
+        if rows is None:
+            rows = np.arange(len(matrix))
+        if len(rows) > _MAX_TRAINING_ROWS:
+            rows = np.sort(rng.choice(rows, _MAX_TRAINING_ROWS, replace=False))
+        if not len(rows):
+            raise ValueError("Cannot train an index without rows")
+        sample = self._coarse(matrix[rows])
+        n_lists = self.n_lists or int(4 * np.sqrt(len(rows)))
+        self.centroids = kmeans(sample, max(1, min(n_lists, len(sample))), seed=seed)
+        self.n_lists = len(self.centroids)
+        self.codebooks = None
+        if self.pq_subvectors is not None:
+            if len(sample) > _MAX_PQ_TRAINING_ROWS:
+                sample = sample[rng.choice(len(sample), _MAX_PQ_TRAINING_ROWS, replace=False)]
+            residuals = sample - self.centroids[assign(sample, self.centroids)]
+            self.codebooks = np.stack(
+                [
+                    kmeans(part, _PQ_CENTROIDS, seed=seed)
+                    for part in np.split(residuals, self.pq_subvectors, axis=1)
+                ]
+            )
+        self.assignment = np.full(0, -1, dtype=np.int64)
+        self.codes = np.zeros((0, self.pq_subvectors or 0), dtype=np.uint8)
+        self._lists = [[] for _ in range(self.n_lists)]
+
+    def _encode(self, residuals: np.ndarray) -> np.ndarray:
+        assert self.codebooks is not None
+        parts = np.split(residuals, self.pq_subvectors or 1, axis=1)
+        codes = [
+            assign(part, codebook)
+            for part, codebook in zip(parts, self.codebooks)
+        ]
+        return np.stack(codes, axis=1).astype(np.uint8)
+
+    def _grow(self, size: int) -> None:
+        if size > len(self.assignment):
+            extra = size - len(self.assignment)
+            self.assignment = np.concatenate(
+                [self.assignment, np.full(extra, -1, dtype=np.int64)]
+            )
+            self.codes = np.concatenate(
+                [self.codes, np.zeros((extra, self.codes.shape[1]), dtype=np.uint8)]
+            )
+
+    def add(self, rows: np.ndarray, vectors: np.ndarray) -> None:
+        """Adds rows with the given vectors, moving rows that were already added"""
+        if self.centroids is None:
+            raise ValueError("The index must be trained before rows are added")
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        self._grow(int(rows.max()) + 1)
+        coarse = self._coarse(vectors)
+        lists = assign(coarse, self.centroids)
+        self.assignment[rows] = lists
+        if self.codebooks is not None:
+            self.codes[rows] = self._encode(coarse - self.centroids[lists])
+        for list_id, members in _group(rows, lists, len(self._lists)):
+            self._lists[list_id].append(members)
+
+    def remove(self, rows: np.ndarray) -> None:
+        """Drops rows from the index, e.g. when their records are deleted"""
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = rows[rows < len(self.assignment)]
+        self.assignment[rows] = -1
+
+    def _list(self, list_id: int) -> np.ndarray:
+        """The current rows of a list, compacting it"""
+        chunks = self._lists[list_id]
+        if not chunks:
+            return np.empty(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(chunks))
+        rows = rows[self.assignment[rows] == list_id]
+        self._lists[list_id] = [rows]
+        return rows
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        matrix: np.ndarray,
+        allowed: Optional[np.ndarray] = None,
+        nprobe: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """The approximate k nearest rows of matrix to each query, as nearest does. Only
+        rows where the boolean mask allowed is set are returned, all rows of matrix if
+        it is None. Rows of matrix that are not in the index are searched exactly, and
+        a query whose probed lists hold too few allowed rows is answered exactly."""
+        if self.centroids is None:
+            raise ValueError("The index must be trained before it is searched")
+        queries = np.asarray(queries, dtype=np.float32)
+        size = len(matrix)
+        if allowed is None:
+            allowed = np.ones(size, dtype=bool)
+        allowed = allowed[:size]
+        self._grow(size)
+        k = min(k, int(allowed.sum()))
+        rows = np.empty((len(queries), k), dtype=np.int64)
+        found = np.empty((len(queries), k), dtype=np.float32)
+        if not k:
+            return rows, found
+
+        unindexed = np.flatnonzero(allowed & (self.assignment[:size] < 0))
+        coarse = self._coarse(queries)
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        probes = nearest(coarse, self.centroids, nprobe, "l2")[0]
+        # The allowed rows of each probed list, shared by the queries probing it
+        lists: Dict[int, np.ndarray] = {}
+        for i, query in enumerate(queries):
+            parts = [unindexed]
+            for list_id in probes[i]:
+                if list_id not in lists:
+                    members = self._list(int(list_id))
+                    members = members[members < size]
+                    lists[list_id] = members[allowed[members]]
+                parts.append(lists[list_id])
+            candidates = np.concatenate(parts)
+            if len(candidates) < k:
+                candidates = np.flatnonzero(allowed)
+            elif self.codebooks is not None and len(candidates) > self.refine * k:
+                candidates = self._shortlist(coarse[i], candidates, self.refine * k)
+            top, distances = nearest(query[None], matrix, k, self.space, candidates=candidates)
+            rows[i], found[i] = top[0], distances[0]
+        return rows, found
+
+    def _shortlist(self, query: np.ndarray, candidates: np.ndarray, n: int) -> np.ndarray:
+        """The n candidates nearest to query by product-quantised distance. Rows added
+        to the index are always quantised; unindexed candidates are kept."""
+        assert self.codebooks is not None and self.centroids is not None
+        indexed = candidates[self.assignment[candidates] >= 0]
+        kept = candidates[self.assignment[candidates] < 0]
+        residuals = query[None, :] - self.centroids[self.assignment[indexed]]
+        parts = np.split(residuals, self.pq_subvectors or 1, axis=1)
+        approximate = np.zeros(len(indexed), dtype=np.float32)
+        for j, (part, codebook) in enumerate(zip(parts, self.codebooks)):
+            approximate += ((part - codebook[self.codes[indexed, j]]) ** 2).sum(axis=1)
+        if len(indexed) > n:
+            indexed = indexed[np.argpartition(approximate, n - 1)[:n]]
+        return np.concatenate([kept, indexed])
+
+    def save(self, path: str) -> None:
+        """Writes the index to path atomically"""
+        temporary = path + ".tmp.npz"
+        arrays: Dict[str, Any] = {
+            "settings": np.array(
+                [self.dimension, self.n_lists or 0, self.nprobe, self.pq_subvectors or 0, self.refine]
+            ),
+            "space": np.array(self.space),
+            "centroids": self.centroids if self.centroids is not None else np.zeros((0, self.dimension)),
+            "assignment": self.assignment,
+            "codes": self.codes,
+        }
+        if self.codebooks is not None:
+            arrays["codebooks"] = self.codebooks
+        np.savez(temporary, **arrays)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        with np.load(path) as data:
+            dimension, n_lists, nprobe, pq_subvectors, refine = (int(v) for v in data["settings"])
+            index = cls(
+                dimension,
+                space=str(data["space"]),  # type: ignore[arg-type]
+                n_lists=n_lists or None,
+                nprobe=nprobe,
+                pq_subvectors=pq_subvectors or None,
+                refine=refine,
+            )
+            if len(data["centroids"]):
+                index.centroids = data["centroids"].astype(np.float32)
+                index._lists = [[] for _ in range(len(index.centroids))]
+            if "codebooks" in data:
+                index.codebooks = data["codebooks"].astype(np.float32)
+            index.assignment = data["assignment"].astype(np.int64)
+            index.codes = data["codes"].astype(np.uint8)
+        # Rebuild the lists from the assignment
+        indexed = np.flatnonzero(index.assignment >= 0)
+        for list_id, members in _group(indexed, index.assignment[indexed], len(index._lists)):
+            index._lists[list_id].append(members)
+        return index
+
+
+def _group(rows: np.ndarray, lists: np.ndarray, n_lists: int) -> List[Tuple[int, np.ndarray]]:
+    order = np.argsort(lists, kind="stable")
+    bounds = np.searchsorted(lists[order], np.arange(n_lists + 1))
+    return [
+        (int(list_id), rows[order[bounds[list_id] : bounds[list_id + 1]]])
+        for list_id in np.flatnonzero(np.diff(bounds))
+    ]
+
+
+def measure_recall(
+    index: IVFIndex,
+    matrix: np.ndarray,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobe: Optional[int] = None,
+) -> Dict[str, float]:
+    """Compares the index with exact search on queries: the mean fraction of the exact
+    k nearest rows it returns, and the mean seconds per query of both"""
+    start = time.perf_counter()
+    exact = nearest(queries, matrix, k, index.space)[0]
+    exact_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    approximate = index.search(queries, k, matrix, nprobe=nprobe)[0]
+    approximate_seconds = time.perf_counter() - start
+    hits = sum(len(np.intersect1d(a, e)) for a, e in zip(approximate, exact))
+    return {
+        "recall": hits / max(1, exact.size),
+        "exact_seconds_per_query": exact_seconds / max(1, len(queries)),
+        "index_seconds_per_query": approximate_seconds / max(1, len(queries)),
+    }
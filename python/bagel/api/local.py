@@ -0,0 +1,1036 @@
+"""An embedded engine implementing the API in process, with no server.
+
+Selected with Settings(bagel_api_impl="local"). Clusters and their records' ids,
+metadatas and documents live in SQLite; each cluster's embeddings are the rows of a
+float32 matrix in its own file under persist_directory, memory-mapped. where and
+where_document filters are translated to SQL, and find is an exact search over the
+matrix until create_index builds an approximate IVF index of the cluster (see
+bagel.api.ivf), kept next to its vectors and updated as records are written.
+
+With sqlite_database=":memory:", the default, nothing is written to disk. Any other
+value names the SQLite file, relative to persist_directory, and the data persists.
+
+The engine has no embedding model, so records need embeddings and clusters are
+searched by query_embeddings. Dataset, asset and job calls need the hosted server.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence, Tuple, cast
+from uuid import UUID
+
+import numpy as np
+from overrides import override
+
+from bagel.api import API, DEFAULT_TENANT
+from bagel.api.Cluster import Cluster
+from bagel.api.columnar import ColumnarGetResult, ColumnarQueryResult
+from bagel.api.ivf import IVFIndex
+from bagel.api.search import Space, nearest, row_norms, validate_space
+from bagel.api.types import (
+    ClusterMetadata,
+    Document,
+    Documents,
+    Embeddings,
+    GetResult,
+    IDs,
+    Include,
+    Metadata,
+    Metadatas,
+    OneOrMany,
+    QueryResult,
+    Where,
+    WhereDocument,
+)
+from bagel.config import System
+import bagel.errors as errors
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clusters (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    metadata TEXT,
+    dimension INTEGER
+);
+CREATE TABLE IF NOT EXISTS records (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    cluster_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    metadata TEXT,
+    document TEXT,
+    UNIQUE (cluster_id, id)
+);
+CREATE INDEX IF NOT EXISTS records_row ON records (cluster_id, row);
+"""
+
+# The metadata key choosing a cluster's distance function, as on the server
+SPACE_KEY = "hnsw:space"
+
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<=", "$ne": "!=", "$eq": "="}
+
+
+def where_sql(where: Where) -> Tuple[str, List[Any]]:
+    """A SQL condition on the metadata column equivalent to a validated where filter.
+    Records whose metadata lacks the key never match, as in bagel.api.filters."""
+    key, value = next(iter(where.items()))
+    if key in ("$and", "$or"):
+        parts = [where_sql(w) for w in value]
+        joiner = " AND " if key == "$and" else " OR "
+        return (
+            "(" + joiner.join(sql for sql, _ in parts) + ")",
+            [param for _, params in parts for param in params],
+        )
+    path = "$." + json.dumps(key)
+    operator, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+    sql = f"json_extract(metadata, ?) {_COMPARISONS[operator]} ?"
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        # Only numbers are ordered, strings never match
+        return f"(json_type(metadata, ?) IN ('integer', 'real') AND {sql})", [
+            path,
+            path,
+            operand,
+        ]
+    return sql, [path, operand]
+
+
+def where_document_sql(where_document: WhereDocument) -> Tuple[str, List[Any]]:
+    """A SQL condition on the document column equivalent to a validated where_document
+    filter"""
+    operator, operand = next(iter(where_document.items()))
+    if operator in ("$and", "$or"):
+        parts = [where_document_sql(w) for w in cast(List[WhereDocument], operand)]
+        joiner = " AND " if operator == "$and" else " OR "
+        return (
+            "(" + joiner.join(sql for sql, _ in parts) + ")",
+            [param for _, params in parts for param in params],
+        )
+    return "instr(document, ?) > 0", [operand]
+
+
+class _Vectors:
+    """The embeddings of one cluster: a (capacity, dimension) float32 matrix in a
+    memory-mapped file, or in memory if path is None. Rows are addressed by number and
+    capacity doubles as rows are added. live marks the rows holding a record; the rows
+    of deleted records are reused."""
+
+    def __init__(self, path: Optional[str], dimension: int, rows: Sequence[int]):
+        self.path = path
+        self.dimension = dimension
+        self.live = np.zeros(max(rows, default=-1) + 1, dtype=bool)
+        self.live[list(rows)] = True
+        capacity = len(self.live)
+        if path is not None and os.path.exists(path):
+            capacity = max(capacity, os.path.getsize(path) // (4 * dimension))
+        self.matrix = self._allocate(capacity, None)
+        self._norms: Optional[np.ndarray] = None
+
+    @property
+    def size(self) -> int:
+        """The number of rows in use or freed, the searched part of the matrix"""
+        return len(self.live)
+
+    def _allocate(self, capacity: int, old: Optional[np.ndarray]) -> np.ndarray:
+        if self.path is None:
+            matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+            if old is not None:
+                matrix[: len(old)] = old
+            return matrix
+        if isinstance(old, np.memmap):
+            old.flush()
+        with open(self.path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        if capacity == 0:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.memmap(
+            self.path, dtype="<f4", mode="r+", shape=(capacity, self.dimension)
+        )
+
+    def allocate(self, count: int) -> np.ndarray:
+        """Row numbers for count new records, reusing freed rows first"""
+        free = np.flatnonzero(~self.live)[:count]
+        new = np.arange(self.size, self.size + count - len(free))
+        rows = np.concatenate([free, new]).astype(np.int64)
+        if len(new):
+            self.live = np.concatenate([self.live, np.zeros(len(new), dtype=bool)])
+        if self.size > len(self.matrix):
+            self.matrix = self._allocate(max(self.size, 2 * len(self.matrix), 64), self.matrix)
+        return rows
+
+    def write(self, rows: np.ndarray, embeddings: np.ndarray) -> None:
+        self.matrix[rows] = embeddings
+        self.live[rows] = True
+        if self._norms is not None:
+            if len(self._norms) < self.size:
+                self._norms = np.concatenate(
+                    [self._norms, np.zeros(self.size - len(self._norms), np.float32)]
+                )
+            self._norms[rows] = row_norms(embeddings)
+
+    def free(self, rows: np.ndarray) -> None:
+        self.live[rows] = False
+
+    def norms(self) -> np.ndarray:
+        """The squared norm of every row up to size, kept current by write"""
+        if self._norms is None or len(self._norms) < self.size:
+            self._norms = row_norms(np.asarray(self.matrix[: self.size]))
+        return self._norms[: self.size]
+
+    def flush(self) -> None:
+        if isinstance(self.matrix, np.memmap):
+            self.matrix.flush()
+
+    def remove(self) -> None:
+        self.matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class LocalAPI(API):
+    def __init__(self, system: System):
+        super().__init__(system)
+        settings = system.settings
+        database = settings.sqlite_database or ":memory:"
+        self._directory: Optional[str] = None
+        if database != ":memory:":
+            self._directory = settings.persist_directory
+            os.makedirs(os.path.join(self._directory, "vectors"), exist_ok=True)
+            database = os.path.join(self._directory, database)
+        self._db = sqlite3.connect(database, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._vectors: Dict[str, _Vectors] = {}
+        # The approximate index of each cluster that has one, loaded lazily
+        self._indexes: Dict[str, Optional[IVFIndex]] = {}
+        self._result_format = settings.bagel_result_format
+
+    def _as_numpy(self, as_numpy: Optional[bool]) -> bool:
+        if as_numpy is None:
+            return self._result_format == "numpy"
+        return as_numpy
+
+    @override
+    def stop(self) -> None:
+        super().stop()
+        self.persist()
+
+    # Clusters
+
+    def _cluster_row(self, name_or_id: Any) -> Tuple[str, str, Optional[str], Optional[int]]:
+        row = self._db.execute(
+            "SELECT id, name, metadata, dimension FROM clusters WHERE name = ? OR id = ?",
+            (str(name_or_id), str(name_or_id)),
+        ).fetchone()
+        if row is None:
+            raise ValueError(f"Cluster {name_or_id} does not exist.")
+        return cast(Tuple[str, str, Optional[str], Optional[int]], row)
+
+    def _cluster(self, row: Tuple[str, str, Optional[str], Optional[int]]) -> Cluster:
+        id, name, metadata, dimension = row
+        count = self._db.execute(
+            "SELECT COUNT(*) FROM records WHERE cluster_id = ?", (id,)
+        ).fetchone()[0]
+        return Cluster(
+            client=self,
+            id=UUID(id),
+            name=name,
+            metadata=json.loads(metadata) if metadata else None,
+            cluster_size=count,
+            embedding_size=dimension,
+        )
+
+    def _space(self, cluster_id: str) -> Space:
+        _, _, metadata, _ = self._cluster_row(cluster_id)
+        space = (json.loads(metadata) if metadata else {}).get(SPACE_KEY, "l2")
+        return validate_space(space)
+
+    def _store(self, cluster_id: str, dimension: Optional[int] = None) -> Optional[_Vectors]:
+        """The vectors of a cluster, or None if nothing was added to it yet. Passing a
+        dimension sets the cluster's dimension on its first write and checks it after."""
+        store = self._vectors.get(cluster_id)
+        if store is None:
+            _, _, _, known = self._cluster_row(cluster_id)
+            if known is None and dimension is not None:
+                self._db.execute(
+                    "UPDATE clusters SET dimension = ? WHERE id = ?", (dimension, cluster_id)
+                )
+                known = dimension
+            if known is None:
+                return None
+            rows = [
+                r for (r,) in self._db.execute(
+                    "SELECT row FROM records WHERE cluster_id = ?", (cluster_id,)
+                )
+            ]
+            path = None
+            if self._directory is not None:
+                path = os.path.join(self._directory, "vectors", cluster_id + ".f32")
+            store = self._vectors[cluster_id] = _Vectors(path, known, rows)
+        if dimension is not None and dimension != store.dimension:
+            raise ValueError(
+                f"Embedding dimension {dimension} does not match cluster dimensionality {store.dimension}"
+            )
+        return store
+
+    def _index_path(self, cluster_id: str) -> Optional[str]:
+        if self._directory is None:
+            return None
+        return os.path.join(self._directory, "vectors", cluster_id + ".ivf.npz")
+
+    def _index(self, cluster_id: str) -> Optional[IVFIndex]:
+        """The approximate index of a cluster, or None if create_index was not called"""
+        if cluster_id not in self._indexes:
+            path = self._index_path(cluster_id)
+            self._indexes[cluster_id] = (
+                IVFIndex.load(path) if path is not None and os.path.exists(path) else None
+            )
+        return self._indexes[cluster_id]
+
+    def _drop_index(self, cluster_id: str) -> None:
+        self._indexes.pop(cluster_id, None)
+        path = self._index_path(cluster_id)
+        if path is not None and os.path.exists(path):
+            os.remove(path)
+
+    def index(self, cluster_name: str) -> Optional[IVFIndex]:
+        """The approximate index of a cluster by name or id, or None if it has none.
+        Set its nprobe to trade recall for latency."""
+        with self._lock:
+            return self._index(self._cluster_row(cluster_name)[0])
+
+    @override
+    def ping(self) -> int:
+        """Returns the current time in nanoseconds"""
+        return time.time_ns()
+
+    @override
+    def join_waitlist(self, email: str) -> Dict[str, str]:
+        raise NotImplementedError("join_waitlist needs the hosted Bagel server")
+
+    @override
+    def get_all_clusters(self, user_id: str = DEFAULT_TENANT, api_key: Optional[str] = None) -> Sequence[Cluster]:
+        """Returns a list of all clusters"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, name, metadata, dimension FROM clusters ORDER BY name"
+            ).fetchall()
+            return [self._cluster(row) for row in rows]
+
+    @override
+    def create_cluster(
+            self,
+            name: str,
+            metadata: Optional[ClusterMetadata] = None,
+            get_or_create: bool = False,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None,
+            embedding_model: Optional[str] = None,
+            dimension: Optional[int] = None
+    ) -> Cluster:
+        """Creates a cluster. embedding_model is ignored, as the engine does not
+        embed documents."""
+        if metadata is not None and SPACE_KEY in metadata:
+            validate_space(cast(str, metadata[SPACE_KEY]))
+        with self._lock, self._db:
+            existing = self._db.execute(
+                "SELECT id FROM clusters WHERE name = ?", (name,)
+            ).fetchone()
+            if existing is not None:
+                if not get_or_create:
+                    raise ValueError(f"Cluster {name} already exists.")
+                if metadata is not None:
+                    self._db.execute(
+                        "UPDATE clusters SET metadata = ? WHERE id = ?",
+                        (json.dumps(metadata), existing[0]),
+                    )
+            else:
+                self._db.execute(
+                    "INSERT INTO clusters (id, name, metadata, dimension) VALUES (?, ?, ?, ?)",
+                    (
+                        str(uuid.uuid4()),
+                        name,
+                        json.dumps(metadata) if metadata is not None else None,
+                        dimension,
+                    ),
+                )
+            return self._cluster(self._cluster_row(name))
+
+    @override
+    def get_cluster(
+            self,
+            name: str,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None
+    ) -> Cluster:
+        """Returns a cluster by name or id"""
+        with self._lock:
+            return self._cluster(self._cluster_row(name))
+
+    @override
+    def get_or_create_cluster(
+            self,
+            name: str,
+            metadata: Optional[ClusterMetadata] = None,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None,
+            embedding_model: Optional[str] = None,
+            dimension: Optional[int] = None
+    ) -> Cluster:
+        """Get a cluster, or create it if it does not exist"""
+        return self.create_cluster(name, metadata, get_or_create=True, dimension=dimension)
+
+    @override
+    def _modify(
+            self,
+            id: UUID,
+            new_name: Optional[str] = None,
+            new_metadata: Optional[ClusterMetadata] = None,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None
+    ) -> None:
+        """Updates a cluster"""
+        if new_metadata is not None and SPACE_KEY in new_metadata:
+            validate_space(cast(str, new_metadata[SPACE_KEY]))
+        with self._lock, self._db:
+            self._cluster_row(id)
+            if new_name is not None:
+                self._db.execute(
+                    "UPDATE clusters SET name = ? WHERE id = ?", (new_name, str(id))
+                )
+            if new_metadata is not None:
+                self._db.execute(
+                    "UPDATE clusters SET metadata = ? WHERE id = ?",
+                    (json.dumps(new_metadata), str(id)),
+                )
+
+    @override
+    def delete_cluster(self, name: str,
+                       user_id: str = DEFAULT_TENANT,
+                       api_key: Optional[str] = None) -> None:
+        """Deletes a cluster by name or id"""
+        with self._lock, self._db:
+            id = self._cluster_row(name)[0]
+            store = self._store(id)
+            self._db.execute("DELETE FROM records WHERE cluster_id = ?", (id,))
+            self._db.execute("DELETE FROM clusters WHERE id = ?", (id,))
+            if store is not None:
+                store.remove()
+            self._vectors.pop(id, None)
+            self._drop_index(id)
+
+    # Records
+
+    @override
+    def _count(self, cluster_id: UUID,
+               api_key: Optional[str] = None) -> int:
+        """Returns the number of embeddings in the cluster"""
+        with self._lock:
+            return cast(
+                int,
+                self._db.execute(
+                    "SELECT COUNT(*) FROM records WHERE cluster_id = ?",
+                    (str(cluster_id),),
+                ).fetchone()[0],
+            )
+
+    @override
+    def _peek(self, cluster_id: UUID, n: int = 10,
+              api_key: Optional[str] = None) -> GetResult:
+        return self._get(
+            cluster_id,
+            limit=n,
+            include=["embeddings", "documents", "metadatas"]
+        )
+
+    def _select(
+            self,
+            columns: str,
+            cluster_id: str,
+            ids: Optional[IDs] = None,
+            where: Optional[Where] = None,
+            where_document: Optional[WhereDocument] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+    ) -> List[Tuple[Any, ...]]:
+        """The matching records of a cluster in insertion order"""
+        sql = f"SELECT {columns} FROM records WHERE cluster_id = ?"
+        params: List[Any] = [cluster_id]
+        if ids is not None:
+            sql += " AND id IN (SELECT value FROM json_each(?))"
+            params.append(json.dumps(ids))
+        if where:
+            condition, where_params = where_sql(where)
+            sql += " AND " + condition
+            params.extend(where_params)
+        if where_document:
+            condition, where_params = where_document_sql(where_document)
+            sql += " AND " + condition
+            params.extend(where_params)
+        sql += " ORDER BY seq"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            params.extend([-1 if limit is None else limit, offset or 0])
+        return self._db.execute(sql, params).fetchall()
+
+    @override
+    def _get(
+            self,
+            cluster_id: UUID,
+            ids: Optional[IDs] = None,
+            where: Optional[Where] = {},
+            sort: Optional[str] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None,
+            page: Optional[int] = None,
+            page_size: Optional[int] = None,
+            where_document: Optional[WhereDocument] = {},
+            include: Include = ["metadatas", "documents"],
+            api_key: Optional[str] = None,
+            as_numpy: Optional[bool] = None
+    ) -> GetResult:
+        """Gets embeddings from the cluster in insertion order. sort is not
+        supported and ignored."""
+        if page and page_size:
+            offset = (page - 1) * page_size
+            limit = page_size
+        cluster_id = str(cluster_id)
+        with self._lock:
+            self._cluster_row(cluster_id)
+            records = self._select(
+                "id, row, metadata, document",
+                cluster_id,
+                ids,
+                where,
+                where_document,
+                limit,
+                offset,
+            )
+            embeddings = None
+            if "embeddings" in include:
+                store = self._store(cluster_id)
+                rows = np.array([r[1] for r in records], dtype=np.int64)
+                embeddings = (
+                    np.array(store.matrix[rows], dtype=np.float32)
+                    if store is not None
+                    else np.empty((0, 0), dtype=np.float32)
+                )
+
+        metadatas = (
+            [json.loads(r[2]) if r[2] else None for r in records]
+            if "metadatas" in include
+            else None
+        )
+        documents = [r[3] for r in records] if "documents" in include else None
+        if self._as_numpy(as_numpy):
+            return ColumnarGetResult(  # type: ignore[return-value]
+                ids=np.array([r[0] for r in records], dtype=np.str_),
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+            )
+        return GetResult(
+            ids=[r[0] for r in records],
+            embeddings=embeddings.tolist() if embeddings is not None else None,
+            metadatas=metadatas,
+            documents=documents,
+        )
+
+    @staticmethod
+    def _embeddings(embeddings: Optional[Embeddings], count: int) -> np.ndarray:
+        if embeddings is None:
+            raise ValueError(
+                "The local engine has no embedding model, records need embeddings"
+            )
+        block = np.asarray(embeddings, dtype=np.float32)
+        if block.ndim != 2 or len(block) != count:
+            raise ValueError(f"Expected {count} embeddings of equal dimension")
+        return block
+
+    @override
+    def _add(
+            self,
+            ids: IDs,
+            cluster_id: UUID,
+            embeddings: Optional[Embeddings] = None,
+            metadatas: Optional[Metadatas] = None,
+            documents: Optional[Documents] = None,
+            increment_index: bool = True,
+            api_key: Optional[str] = None
+    ) -> bool:
+        """Adds a batch of embeddings to the cluster"""
+        block = self._embeddings(embeddings, len(ids))
+        cluster_id = str(cluster_id)
+        with self._lock, self._db:
+            existing = self._select("id", cluster_id, ids=list(ids))
+            if existing or len(set(ids)) != len(ids):
+                duplicates = [r[0] for r in existing] or ids
+                raise errors.DuplicateIDError(
+                    f"IDs {', '.join(map(str, duplicates[:10]))} already exist"
+                )
+            self._insert(
+                cluster_id, list(ids), block, metadatas, documents, increment_index
+            )
+        return True
+
+    def _insert(
+            self,
+            cluster_id: str,
+            ids: List[str],
+            block: np.ndarray,
+            metadatas: Optional[Metadatas],
+            documents: Optional[Documents],
+            increment_index: bool = True,
+    ) -> None:
+        """Inserts new records. Without increment_index they stay out of the
+        approximate index and are searched exactly until create_index."""
+        store = cast(_Vectors, self._store(cluster_id, block.shape[1]))
+        rows = store.allocate(len(ids))
+        self._db.executemany(
+            "INSERT INTO records (cluster_id, id, row, metadata, document) VALUES (?, ?, ?, ?, ?)",
+            [
+                (
+                    cluster_id,
+                    id,
+                    int(row),
+                    json.dumps(metadatas[i]) if metadatas and metadatas[i] is not None else None,
+                    documents[i] if documents else None,
+                )
+                for i, (id, row) in enumerate(zip(ids, rows))
+            ],
+        )
+        store.write(rows, block)
+        index = self._index(cluster_id)
+        if index is not None and increment_index:
+            index.add(rows, block)
+
+    def _rows(self, cluster_id: str, ids: List[str]) -> Dict[str, int]:
+        return {
+            id: row for id, row in self._select("id, row", cluster_id, ids=ids)
+        }
+
+    @override
+    def _update(
+            self,
+            cluster_id: UUID,
+            ids: IDs,
+            embeddings: Optional[Embeddings] = None,
+            metadatas: Optional[Metadatas] = None,
+            documents: Optional[Documents] = None,
+            api_key: Optional[str] = None
+    ) -> bool:
+        """Updates the given fields of existing records. Unknown ids are skipped."""
+        block = self._embeddings(embeddings, len(ids)) if embeddings is not None else None
+        cluster_id = str(cluster_id)
+        with self._lock, self._db:
+            rows = self._rows(cluster_id, list(ids))
+            missing = [id for id in ids if id not in rows]
+            if missing:
+                logger.warning(f"Update of nonexisting ids: {', '.join(missing[:10])}")
+            self._replace(cluster_id, list(ids), rows, block, metadatas, documents)
+        return True
+
+    def _replace(
+            self,
+            cluster_id: str,
+            ids: List[str],
+            rows: Dict[str, int],
+            block: Optional[np.ndarray],
+            metadatas: Optional[Metadatas],
+            documents: Optional[Documents],
+    ) -> None:
+        """Overwrites the given fields of the records of ids found in rows"""
+        known = [i for i, id in enumerate(ids) if id in rows]
+        if not known:
+            return
+        if metadatas is not None:
+            self._db.executemany(
+                "UPDATE records SET metadata = ? WHERE cluster_id = ? AND id = ?",
+                [
+                    (json.dumps(metadatas[i]) if metadatas[i] is not None else None, cluster_id, ids[i])
+                    for i in known
+                ],
+            )
+        if documents is not None:
+            self._db.executemany(
+                "UPDATE records SET document = ? WHERE cluster_id = ? AND id = ?",
+                [(documents[i], cluster_id, ids[i]) for i in known],
+            )
+        if block is not None:
+            store = cast(_Vectors, self._store(cluster_id, block.shape[1]))
+            replaced = np.array([rows[ids[i]] for i in known], dtype=np.int64)
+            store.write(replaced, block[known])
+            index = self._index(cluster_id)
+            if index is not None:
+                index.add(replaced, block[known])
+
+    @override
+    def _upsert(
+            self,
+            cluster_id: UUID,
+            ids: IDs,
+            embeddings: Optional[Embeddings] = None,
+            metadatas: Optional[Metadatas] = None,
+            documents: Optional[Documents] = None,
+            increment_index: bool = True,
+            api_key: Optional[str] = None
+    ) -> bool:
+        """Adds new records and updates existing ones"""
+        block = self._embeddings(embeddings, len(ids))
+        cluster_id = str(cluster_id)
+        ids = list(ids)
+        with self._lock, self._db:
+            rows = self._rows(cluster_id, ids)
+            self._replace(cluster_id, ids, rows, block, metadatas, documents)
+            new = [i for i, id in enumerate(ids) if id not in rows]
+            if new:
+                self._insert(
+                    cluster_id,
+                    [ids[i] for i in new],
+                    block[new],
+                    [metadatas[i] for i in new] if metadatas else None,
+                    [documents[i] for i in new] if documents else None,
+                    increment_index,
+                )
+        return True
+
+    @override
+    def _delete(
+            self,
+            cluster_id: UUID,
+            ids: Optional[IDs] = None,
+            where: Optional[Where] = {},
+            where_document: Optional[WhereDocument] = {},
+            api_key: Optional[str] = None
+    ) -> IDs:
+        """Deletes the matching records, or all records without ids and filters"""
+        cluster_id = str(cluster_id)
+        with self._lock, self._db:
+            self._cluster_row(cluster_id)
+            records = self._select(
+                "seq, id, row", cluster_id, ids, where, where_document
+            )
+            self._db.executemany(
+                "DELETE FROM records WHERE seq = ?", [(r[0],) for r in records]
+            )
+            rows = np.array([r[2] for r in records], dtype=np.int64)
+            store = self._store(cluster_id)
+            if store is not None:
+                store.free(rows)
+            index = self._index(cluster_id)
+            if index is not None:
+                index.remove(rows)
+        return [r[1] for r in records]
+
+    @override
+    def _query(
+            self,
+            cluster_id: UUID,
+            query_embeddings: Embeddings,
+            n_results: int = 10,
+            where: Optional[Where] = {},
+            where_document: Optional[WhereDocument] = {},
+            include: Include = ["metadatas", "documents", "distances"],
+            query_texts: Optional[OneOrMany[Document]] = None,
+            api_key: Optional[str] = None,
+            as_numpy: Optional[bool] = None
+    ) -> QueryResult:
+        """Gets the nearest neighbors of each query embedding, by exact search or with
+        the cluster's approximate index"""
+        if query_embeddings is None:
+            raise ValueError(
+                "The local engine has no embedding model, query with query_embeddings"
+            )
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        cluster_id = str(cluster_id)
+        with self._lock:
+            space = self._space(cluster_id)
+            store = self._store(cluster_id)
+            if store is None:
+                neighbors = np.empty((len(queries), 0), dtype=np.int64)
+                distances = np.empty((len(queries), 0), dtype=np.float32)
+            else:
+                if queries.shape[1] != store.dimension:
+                    raise ValueError(
+                        f"Embedding dimension {queries.shape[1]} does not match cluster dimensionality {store.dimension}"
+                    )
+                candidates: Optional[np.ndarray] = None
+                if where or where_document:
+                    candidates = np.array(
+                        [r[0] for r in self._select("row", cluster_id, None, where, where_document)],
+                        dtype=np.int64,
+                    )
+                elif not store.live.all():
+                    candidates = np.flatnonzero(store.live)
+                index = self._index(cluster_id)
+                if index is not None and index.space == space:
+                    allowed = store.live
+                    if candidates is not None:
+                        allowed = np.zeros(store.size, dtype=bool)
+                        allowed[candidates] = True
+                    neighbors, distances = index.search(
+                        queries, n_results, store.matrix[: store.size], allowed=allowed
+                    )
+                else:
+                    neighbors, distances = nearest(
+                        queries,
+                        store.matrix[: store.size],
+                        n_results,
+                        space,
+                        norms=store.norms() if space != "ip" else None,
+                        candidates=candidates,
+                    )
+            records = {
+                r[0]: r[1:]
+                for r in self._db.execute(
+                    "SELECT row, id, metadata, document FROM records "
+                    "WHERE cluster_id = ? AND row IN (SELECT value FROM json_each(?))",
+                    (cluster_id, json.dumps(np.unique(neighbors).tolist())),
+                )
+            }
+            embeddings = (
+                np.array(store.matrix[neighbors.ravel()], dtype=np.float32).reshape(
+                    neighbors.shape + (store.dimension,)
+                )
+                if "embeddings" in include and store is not None
+                else None
+            )
+
+        ids = [[records[r][0] for r in row] for row in neighbors.tolist()]
+        metadatas = (
+            [
+                [json.loads(records[r][1]) if records[r][1] else None for r in row]
+                for row in neighbors.tolist()
+            ]
+            if "metadatas" in include
+            else None
+        )
+        documents = (
+            [[records[r][2] for r in row] for row in neighbors.tolist()]
+            if "documents" in include
+            else None
+        )
+        if self._as_numpy(as_numpy):
+            return ColumnarQueryResult(  # type: ignore[return-value]
+                ids=np.array(ids, dtype=np.str_).reshape(neighbors.shape),
+                lengths=np.full(len(neighbors), neighbors.shape[1], dtype=np.int64),
+                embeddings=embeddings,
+                distances=distances if "distances" in include else None,
+                metadatas=metadatas,
+                documents=documents,
+            )
+        return QueryResult(
+            ids=ids,
+            embeddings=embeddings.tolist() if embeddings is not None else None,
+            metadatas=metadatas,
+            documents=documents,
+            distances=distances.tolist() if "distances" in include else None,
+        )
+
+    @override
+    def reset(self) -> None:
+        """Deletes every cluster"""
+        if not self._system.settings.allow_reset:
+            raise ValueError("Resetting is not allowed by this configuration")
+        with self._lock, self._db:
+            for id, in self._db.execute("SELECT id FROM clusters").fetchall():
+                store = self._store(id)
+                if store is not None:
+                    store.remove()
+                self._drop_index(id)
+            self._db.execute("DELETE FROM records")
+            self._db.execute("DELETE FROM clusters")
+            self._vectors.clear()
+
+    @override
+    def persist(self) -> bool:
+        """Flushes the vectors and approximate indexes to disk. Writes are committed as
+        they are made."""
+        with self._lock:
+            for store in self._vectors.values():
+                store.flush()
+            for cluster_id, index in self._indexes.items():
+                path = self._index_path(cluster_id)
+                if index is not None and path is not None:
+                    index.save(path)
+        return True
+
+    @override
+    def create_index(self, cluster_name: str) -> bool:
+        """Builds an approximate IVF index of the cluster's records, replacing any
+        previous one, configured by the bagel_local_* settings. find uses it from then
+        on, and records written later are added to it."""
+        settings = self._system.settings
+        with self._lock:
+            cluster_id = self._cluster_row(cluster_name)[0]
+            store = self._store(cluster_id)
+            rows = np.flatnonzero(store.live) if store is not None else np.empty(0)
+            if store is None or not len(rows):
+                return True
+            index = IVFIndex(
+                store.dimension,
+                space=self._space(cluster_id),
+                n_lists=settings.bagel_local_ivf_lists,
+                nprobe=settings.bagel_local_ivf_nprobe,
+                pq_subvectors=settings.bagel_local_pq_subvectors,
+            )
+            index.train(store.matrix, rows)
+            index.add(rows, np.asarray(store.matrix[rows]))
+            self._indexes[cluster_id] = index
+            path = self._index_path(cluster_id)
+            if path is not None:
+                index.save(path)
+        return True
+
+    @override
+    def get_version(self) -> str:
+        """Returns the version of SQLite backing the engine"""
+        return "local-sqlite-" + sqlite3.sqlite_version
+
+    @override
+    def share_cluster(self, cluster_id: str, usernames: List[str]):
+        raise NotImplementedError("share_cluster needs the hosted Bagel server")
+
+    @override
+    def _add_image(
+            self, cluster_id: UUID, filename: str, metadata: Optional[Metadata] = None,
+            api_key: Optional[str] = None
+    ) -> Any:
+        raise NotImplementedError("Images need the hosted Bagel server to be embedded")
+
+    @override
+    def _add_image_urls(
+            self,
+            cluster_id: UUID,
+            ids: IDs,
+            urls: List[str],
+            metadatas: Optional[Metadatas] = None,
+            increment_index: bool = True,
+    ) -> Any:
+        raise NotImplementedError("Images need the hosted Bagel server to be embedded")
+
+    # Datasets, assets and jobs only exist on the hosted server
+
+    @override
+    def create_dataset(
+            self,
+            dataset_id: UUID,
+            name: str,
+            description: str,
+            user_id: str = DEFAULT_TENANT,
+            api_key: Optional[str] = None
+    ) -> str:
+        raise NotImplementedError("Datasets need the hosted Bagel server")
+
+    @override
+    def get_dataset_info(self, dataset_id: str, path: Optional[str] = "", api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Datasets need the hosted Bagel server")
+
+    @override
+    def upload_dataset(
+            self,
+            dataset_id: str,
+            chunk_number: int = 1,
+            file_name: str = "",
+            file_content: bytes = None,
+            api_key: Optional[str] = None
+    ) -> str:
+        raise NotImplementedError("Datasets need the hosted Bagel server")
+
+    @override
+    def download_dataset(self, dataset_id: str, file_path: Optional[str] = "", api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Datasets need the hosted Bagel server")
+
+    @override
+    def download_dataset_files(
+            self,
+            dataset_id: str,
+            target_dir: str,
+            file_path: Optional[str] = "",
+            api_key: Optional[str] = None
+    ) -> bool:
+        raise NotImplementedError("Datasets need the hosted Bagel server")
+
+    @override
+    def get_dataset_column_names(self, asset_id: str, file_name: str, api_key: Optional[str] = None):
+        raise NotImplementedError("Datasets need the hosted Bagel server")
+
+    @override
+    def create_asset(self, payload: dict, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def get_assets_list(self, user_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def get_asset_info(self, asset_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def delete_asset(self, dataset_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def download_model_file(self, asset_id: str, file_name: str, api_key: Optional[str] = None) -> Document:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def download_model(self, asset_id: str, api_key: Optional[str] = None) -> Any:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def add_text(self, asset_id: str, payload: dict, api_key: Optional[str] = None) -> dict:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def add_image(self, asset_id: str, file_path: str, api_key: Optional[str] = None):
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def query_asset(self, asset_id: str, payload: dict, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def update_asset(self, asset_id: str, payload: dict, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def buy_asset(self, asset_id: str, user_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def get_download_url(self, asset_id: str, file_name: str, api_key: Optional[str] = None) -> dict:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def get_model_files_list(self, asset_id: str, api_key: Optional[str] = None):
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def file_upload(self, file_path: str, asset_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Assets need the hosted Bagel server")
+
+    @override
+    def fine_tune(self, title: str, user_id: str, asset_id: str, file_name: str,
+                  base_model: str, epochs: Optional[int] = 3, learning_rate: Optional[float] = 0.001,
+                  input_column: str = None, output_column: str = None,
+                  api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Fine tuning needs the hosted Bagel server")
+
+    @override
+    def get_job(self, job_id, api_key) -> str:
+        raise NotImplementedError("Jobs need the hosted Bagel server")
+
+    @override
+    def get_job_by_asset_id(self, asset_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Jobs need the hosted Bagel server")
+
+    @override
+    def list_jobs(self, user_id: str, api_key: Optional[str] = None) -> str:
+        raise NotImplementedError("Jobs need the hosted Bagel server")
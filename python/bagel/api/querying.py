@@ -0,0 +1,207 @@
+"""Concurrent execution of many read requests.
+
+map_ordered runs a function over a sequence of inputs on a small thread pool and yields
+the results in input order. Cluster.find_many uses it to send batches of queries
+concurrently while streaming their results back in order, and Cluster.iter to fetch the
+next pages of a cluster while the caller processes the current one.
+
+scan_partitions reads disjoint offset ranges of a cluster concurrently for
+Cluster.scan, recording in a ScanProgress how far each range was consumed so an
+interrupted scan can be resumed.
+"""
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import Context, copy_context
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    TypeVar,
+)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+DEFAULT_QUERY_BATCH_SIZE = 256
+
+
+def map_ordered(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    workers: int = 4,
+    context: Optional[Context] = None,
+    max_pending: Optional[int] = None,
+) -> Iterator[R]:
+    """Applies fn to items on up to workers threads and yields the results in input
+    order. At most max_pending calls, 2 * workers by default, are running or waiting to
+    be consumed, so a slow consumer bounds memory. Every call runs in a copy of context,
+    by default the caller's context at the time of this call, so deadlines carry over.
+    Closing the iterator cancels the calls that have not started."""
+    workers = max(1, workers)
+    return _map_ordered(
+        fn,
+        items,
+        workers,
+        context if context is not None else copy_context(),
+        max(1, max_pending if max_pending is not None else 2 * workers),
+    )
+
+
+def _map_ordered(
+    fn: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    context: Context,
+    max_pending: int,
+) -> Iterator[R]:
+    pending: Deque["Future[R]"] = deque()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bagel-query")
+    try:
+        for item in items:
+            pending.append(executor.submit(context.copy().run, fn, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+# Reads limit records at offset and returns a page with an "ids" column
+FetchPage = Callable[[int, int], Mapping[str, Any]]
+
+
+class ScanProgress:
+    """How far each partition of a scan was consumed. Save to_dict() while scanning and
+    pass from_dict(saved) to Cluster.scan to resume after the last consumed page.
+
+    A partition is a list [start, next, end]: records from start to next were yielded
+    to the caller, and next to end are left. A page counts as consumed once the caller
+    asks for the following one, so a resumed scan may repeat the last page it handed
+    out, but never skips one.
+    """
+
+    def __init__(self, partitions: Optional[List[List[int]]] = None):
+        self.partitions: List[List[int]] = [list(p) for p in partitions or []]
+        self._lock = threading.Lock()
+
+    @classmethod
+    def plan(cls, count: int, partitions: int) -> "ScanProgress":
+        """Splits the offsets 0 to count into partitions ranges of about equal size"""
+        partitions = max(1, min(partitions, count))
+        bounds = [count * i // partitions for i in range(partitions + 1)]
+        return cls([[start, start, end] for start, end in zip(bounds, bounds[1:])])
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ScanProgress":
+        return cls(data["partitions"])
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"partitions": [list(p) for p in self.partitions]}
+
+    @property
+    def done(self) -> bool:
+        with self._lock:
+            return bool(self.partitions) and all(p[1] >= p[2] for p in self.partitions)
+
+    def _advance(self, partition: int, next: int) -> None:
+        with self._lock:
+            self.partitions[partition][1] = next
+
+    def _finish(self, partition: int) -> None:
+        with self._lock:
+            self.partitions[partition][1] = self.partitions[partition][2]
+
+
+_DONE = object()
+
+
+def scan_partitions(
+    fetch: FetchPage,
+    progress: ScanProgress,
+    page_size: int = 1000,
+    workers: int = 4,
+) -> Iterator[Mapping[str, Any]]:
+    """Reads the partitions of progress that are not done on up to workers threads,
+    each partition page by page in offset order, and yields non-empty pages as they
+    arrive. A partition ends at its end offset or at the first short page. At most
+    workers pages wait to be consumed. Closing the iterator stops the scan after the
+    requests in flight."""
+    workers = max(1, workers)
+    context = copy_context()
+    todo: "queue.Queue[int]" = queue.Queue()
+    for index, (_, next, end) in enumerate(progress.to_dict()["partitions"]):
+        if next < end:
+            todo.put(index)
+    pages: "queue.Queue[Any]" = queue.Queue(maxsize=workers)
+    stop = threading.Event()
+
+    def put(item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def work() -> None:
+        try:
+            while not stop.is_set():
+                try:
+                    index = todo.get_nowait()
+                except queue.Empty:
+                    return
+                _, offset, end = progress.to_dict()["partitions"][index]
+                while offset < end and not stop.is_set():
+                    limit = min(page_size, end - offset)
+                    page = fetch(offset, limit)
+                    size = len(page["ids"])
+                    offset += size
+                    last = offset >= end or size < limit
+                    if not put((index, offset, last, page)):
+                        return
+                    if last:
+                        break
+        except BaseException as e:
+            put(e)
+        finally:
+            put(_DONE)
+
+    threads = [
+        threading.Thread(
+            target=context.copy().run, args=(work,), name="bagel-scan", daemon=True
+        )
+        for _ in range(min(workers, todo.qsize()))
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        running = len(threads)
+        while running:
+            item = pages.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            index, offset, last, page = item
+            if len(page["ids"]):
+                yield page
+            if last:
+                progress._finish(index)
+            else:
+                progress._advance(index, offset)
+    finally:
+        stop.set()
@@ -0,0 +1,742 @@
+"""Local read replicas of clusters.
+
+A LocalCluster holds a copy of a cluster's records in the client process: the
+embeddings as one contiguous float32 matrix, optionally memory-mapped from disk, and
+the ids, metadatas and documents as columns. It answers count, get and find without
+network round trips, find by brute-force distance over the whole matrix or, after
+create_index, with an approximate IVF index (see bagel.api.ivf).
+
+A replica on disk is a directory with three files, and a fourth once indexed:
+
+    manifest.json   name, id, space, dimension, count and the number of patches
+    embeddings.f32  the (count, dimension) little-endian float32 matrix
+    records.jsonl   one JSON array [id, metadata, document] per row, in matrix order,
+                    then one [row, id, metadata, document] patch per row a sync wrote
+    index.npz       the approximate index of the rows
+
+LocalCluster.sync brings a replica up to date by comparing its records with a listing
+of the cluster and transferring only the records that were added or changed. Changes
+are applied in place: updated rows are overwritten, deleted rows are filled with the
+last row, and added rows are appended to the embeddings file. The rows a sync wrote are
+appended to records.jsonl as patches, replayed in order by LocalCluster.open, and the
+file is rewritten without them once there are more patches than rows.
+"""
+import json
+import logging
+import os
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Union,
+)
+
+import numpy as np
+from typing_extensions import Literal
+
+from bagel.api.columnar import ColumnarGetResult, ColumnarQueryResult
+from bagel.api.filters import MetadataColumns, compile_where, compile_where_document
+from bagel.api.ivf import IVFIndex
+from bagel.api.querying import map_ordered
+from bagel.api.search import Space, nearest, row_norms, validate_space
+from bagel.api.types import (
+    ID,
+    Document,
+    Embedding,
+    GetResult,
+    Include,
+    Metadata,
+    OneOrMany,
+    QueryResult,
+    SyncSummary,
+    Where,
+    WhereDocument,
+    maybe_cast_one_to_many,
+    validate_embeddings,
+    validate_ids,
+    validate_include,
+    validate_n_results,
+    validate_where,
+    validate_where_document,
+)
+
+if TYPE_CHECKING:
+    from bagel.api.Cluster import Cluster
+
+logger = logging.getLogger(__name__)
+
+# What sync compares to find changed records, see LocalCluster.sync
+Compare = Literal["ids", "records", "embeddings"]
+
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.f32"
+RECORDS_FILE = "records.jsonl"
+INDEX_FILE = "index.npz"
+
+
+class LocalCluster:
+    """A copy of a cluster searched in process, kept current with sync.
+
+    Args:
+        name: The name of the cluster.
+        id: The id of the cluster.
+        ids: The record ids, one per row of embeddings.
+        embeddings: The (count, dimension) float32 matrix, an ndarray or a memmap.
+        metadatas: The metadata of each record.
+        documents: The document of each record.
+        space: The distance function, one of `"l2"`, `"cosine"` and `"ip"`.
+        path: The directory the replica is stored in, or None if it is in memory only.
+        as_numpy: The default result format, see Cluster.get and Cluster.find.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        id: Any,
+        ids: List[ID],
+        embeddings: np.ndarray,
+        metadatas: List[Optional[Metadata]],
+        documents: List[Optional[Document]],
+        space: Space = "l2",
+        path: Optional[str] = None,
+        as_numpy: bool = False,
+    ):
+        validate_space(space)
+        if not len(ids) == len(embeddings) == len(metadatas) == len(documents):
+            raise ValueError("Expected one embedding, metadata and document per id")
+        self.name = name
+        self.id = id
+        self.space = space
+        self.path = path
+        self.as_numpy = as_numpy
+        self._ids = list(ids)
+        self._rows = {id: row for row, id in enumerate(self._ids)}
+        self._embeddings = embeddings
+        self._metadatas = list(metadatas)
+        self._documents = list(documents)
+        self._norms: Optional[np.ndarray] = None
+        self._index: Optional[IVFIndex] = None
+        # The metadatas as columns for filtering, built on the first filtered call
+        self._columns: Optional[MetadataColumns] = None
+        # The number of patches after the rows in records.jsonl
+        self._patches = 0
+
+    @classmethod
+    def open(cls, path: str, as_numpy: bool = False) -> "LocalCluster":
+        """Loads a replica written by Cluster.replicate_local, memory-mapping its
+        embeddings"""
+        with open(os.path.join(path, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+        ids: List[ID] = []
+        metadatas: List[Optional[Metadata]] = []
+        documents: List[Optional[Document]] = []
+        with open(os.path.join(path, RECORDS_FILE)) as f:
+            for line in f:
+                record = json.loads(line)
+                if len(record) == 3:
+                    row = len(ids)
+                    id, metadata, document = record
+                else:
+                    row, id, metadata, document = record
+                if row == len(ids):
+                    ids.append(id)
+                    metadatas.append(metadata)
+                    documents.append(document)
+                else:
+                    ids[row], metadatas[row], documents[row] = id, metadata, document
+        # Rows past count were deleted by a sync after they were written
+        count = manifest["count"]
+        del ids[count:], metadatas[count:], documents[count:]
+        replica = cls(
+            name=manifest["name"],
+            id=manifest["id"],
+            ids=ids,
+            embeddings=_map_embeddings(path, count, manifest["dimension"]),
+            metadatas=metadatas,
+            documents=documents,
+            space=manifest["space"],
+            path=path,
+            as_numpy=as_numpy,
+        )
+        replica._patches = manifest.get("patches", 0)
+        if os.path.exists(os.path.join(path, INDEX_FILE)):
+            replica._index = IVFIndex.load(os.path.join(path, INDEX_FILE))
+        return replica
+
+    @property
+    def dimension(self) -> int:
+        return int(self._embeddings.shape[1])
+
+    def count(self) -> int:
+        """The number of records in the replica"""
+        return len(self._ids)
+
+    def create_index(
+        self,
+        n_lists: Optional[int] = None,
+        nprobe: int = 8,
+        pq_subvectors: Optional[int] = None,
+    ) -> IVFIndex:
+        """Builds an approximate index of the replica that find uses from then on, and
+        that sync keeps current. See IVFIndex for the arguments.
+
+        Returns:
+            IVFIndex: The index, whose nprobe can be changed to trade recall for latency.
+        """
+        index = IVFIndex(
+            self.dimension,
+            space=self.space,
+            n_lists=n_lists,
+            nprobe=nprobe,
+            pq_subvectors=pq_subvectors,
+        )
+        index.train(self._embeddings)
+        index.add(np.arange(self.count()), np.asarray(self._embeddings))
+        self._index = index
+        if self.path is not None:
+            index.save(os.path.join(self.path, INDEX_FILE))
+        return index
+
+    def get(
+        self,
+        ids: Optional[OneOrMany[ID]] = None,
+        where: Optional[Where] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = ["metadatas", "documents"],
+        as_numpy: Optional[bool] = None,
+    ) -> GetResult:
+        """Get records and their associated data, see Cluster.get. Records are returned
+        in the order of ids if given, otherwise in replica order."""
+        where = validate_where(where) if where else None
+        where_document = (
+            validate_where_document(where_document) if where_document else None
+        )
+        ids = validate_ids(maybe_cast_one_to_many(ids)) if ids else None
+        include = validate_include(include, allow_distances=False)
+
+        if ids is not None:
+            rows = np.array(
+                [self._rows[id] for id in ids if id in self._rows], dtype=np.int64
+            )
+        else:
+            rows = np.arange(self.count(), dtype=np.int64)
+        rows = self._filter(rows, where, where_document)
+        start = offset or 0
+        rows = rows[start : None if limit is None else start + limit]
+
+        embeddings = (
+            np.array(self._embeddings[rows], dtype=np.float32)
+            if "embeddings" in include
+            else None
+        )
+        metadatas = (
+            [self._metadatas[row] for row in rows] if "metadatas" in include else None
+        )
+        documents = (
+            [self._documents[row] for row in rows] if "documents" in include else None
+        )
+        if self._as_numpy(as_numpy):
+            return ColumnarGetResult(  # type: ignore[return-value]
+                ids=np.array([self._ids[row] for row in rows], dtype=np.str_),
+                embeddings=embeddings,
+                metadatas=metadatas,
+                documents=documents,
+            )
+        return GetResult(
+            ids=[self._ids[row] for row in rows],
+            embeddings=embeddings.tolist() if embeddings is not None else None,
+            metadatas=metadatas,
+            documents=documents,
+        )
+
+    def find(
+        self,
+        query_embeddings: Optional[OneOrMany[Embedding]] = None,
+        query_texts: Optional[OneOrMany[Document]] = None,
+        n_results: int = 10,
+        where: Optional[Where] = None,
+        where_document: Optional[WhereDocument] = None,
+        include: Include = ["metadatas", "documents", "distances"],
+        as_numpy: Optional[bool] = None,
+        nprobe: Optional[int] = None,
+    ) -> QueryResult:
+        """Get the n_results nearest neighbors of each query embedding, see
+        Cluster.find. A replica has no embedding function, so query_texts are not
+        supported. With an index, nprobe overrides the number of lists it searches.
+
+        Raises:
+            ValueError: If you provide query_texts or no query_embeddings
+        """
+        where = validate_where(where) if where else None
+        where_document = (
+            validate_where_document(where_document) if where_document else None
+        )
+        include = validate_include(include, allow_distances=True)
+        n_results = validate_n_results(n_results)
+        if query_texts is not None or query_embeddings is None:
+            raise ValueError("A LocalCluster can only be searched by query_embeddings")
+        queries = np.asarray(
+            validate_embeddings(maybe_cast_one_to_many(query_embeddings)),
+            dtype=np.float32,
+        )
+        if queries.shape[1] != self.dimension and self.count():
+            raise ValueError(
+                f"Expected query embeddings of dimension {self.dimension}, got {queries.shape[1]}"
+            )
+
+        candidates = self._filter(
+            np.arange(self.count(), dtype=np.int64), where, where_document
+        )
+        if self._index is not None:
+            allowed = np.zeros(self.count(), dtype=bool)
+            allowed[candidates] = True
+            neighbors, distances = self._index.search(
+                queries, n_results, self._embeddings, allowed=allowed, nprobe=nprobe
+            )
+            return self._query_result(neighbors, distances, include, as_numpy)
+        neighbors, distances = nearest(
+            queries,
+            self._embeddings,
+            n_results,
+            self.space,
+            norms=self._row_norms() if self.space != "ip" else None,
+            candidates=None if len(candidates) == self.count() else candidates,
+        )
+        return self._query_result(neighbors, distances, include, as_numpy)
+
+    def sync(
+        self,
+        cluster: "Cluster",
+        compare: Compare = "embeddings",
+        changed_ids: Optional[Iterable[ID]] = None,
+        page_size: int = 1000,
+        partitions: int = 8,
+        workers: int = 4,
+    ) -> SyncSummary:
+        """Bring the replica up to date with cluster, transferring only what changed.
+
+        The ids of the cluster are listed with a parallel scan and compared with the
+        replica's: ids only in the cluster are added and ids only in the replica are
+        deleted. Which of the other records are updated depends on compare:
+
+            "ids"         none, unless listed in changed_ids
+            "records"     those whose metadata or document differ, which lists the
+                          metadatas and documents of the whole cluster
+            "embeddings"  those whose metadata, document or embedding differ, which
+                          also lists the embeddings of the whole cluster (the default)
+
+        The default catches every change but transfers the whole cluster's contents to
+        compare them; only the changed records are written to the replica. Records in
+        changed_ids are always updated, so callers that know what they wrote can pass
+        compare="ids" and list nothing but ids. With compare="ids" and no changed_ids,
+        records changed on the server are left stale, and a warning is logged.
+
+        The listing pages by offset, so records written to the cluster during a sync can
+        shift it and skip ids. Ids missing from the listing are therefore looked up with
+        get before they are deleted, and only those the cluster no longer has are
+        deleted. Ids added during the sync may be picked up only by the next one.
+
+        The replica must not be searched while it is synced. A sync interrupted by a
+        crash may leave a replica on disk inconsistent; replicate it again in that case.
+
+        Returns:
+            SyncSummary: The number of records added, updated, deleted and unchanged.
+        """
+        if compare not in ("ids", "records", "embeddings"):
+            raise ValueError(
+                f"Expected compare to be one of ids, records, embeddings, got {compare}"
+            )
+        if compare == "ids" and changed_ids is None:
+            logger.warning(
+                f"Syncing replica {self.name} by ids only: records changed on the server are not updated"
+            )
+        start = time.monotonic()
+        include: Include = []
+        if compare != "ids":
+            include = ["metadatas", "documents"]
+        if compare == "embeddings":
+            include = include + ["embeddings"]
+
+        remote: Set[ID] = set()
+        changed: Set[ID] = set(changed_ids or ())
+        for page in cluster.scan(
+            partitions=partitions,
+            workers=workers,
+            page_size=page_size,
+            include=include,
+            as_numpy=True,
+        ):
+            page_ids = page.ids.tolist()
+            remote.update(page_ids)
+            if compare != "ids":
+                changed.update(self._changed(page_ids, page))
+
+        missing = [id for id in self._ids if id not in remote]
+        remote.update(self._still_present(cluster, missing, page_size, workers))
+        deleted = [id for id in missing if id not in remote]
+        added = [id for id in remote if id not in self._rows]
+        updated = [id for id in changed if id in remote and id in self._rows]
+        fetch = added + updated
+        batches = map_ordered(
+            lambda i: cluster.get(
+                ids=fetch[i : i + page_size],
+                include=["embeddings", "metadatas", "documents"],
+                as_numpy=True,
+            ),
+            range(0, len(fetch), page_size),
+            workers=workers,
+        )
+        self._apply(deleted, batches)
+        return SyncSummary(
+            added=len(added),
+            updated=len(updated),
+            deleted=len(deleted),
+            unchanged=len(remote) - len(added) - len(updated),
+            elapsed_seconds=time.monotonic() - start,
+        )
+
+    @staticmethod
+    def _still_present(
+        cluster: "Cluster", ids: List[ID], page_size: int, workers: int
+    ) -> List[ID]:
+        """The ids the cluster still has, of those a listing did not return"""
+        pages = map_ordered(
+            lambda i: cluster.get(ids=ids[i : i + page_size], include=[], as_numpy=True),
+            range(0, len(ids), page_size),
+            workers=workers,
+        )
+        return [id for page in pages for id in page.ids.tolist()]
+
+    def _changed(self, ids: List[ID], page: Any) -> List[ID]:
+        """The ids of a listed page whose records differ from the replica's"""
+        changed = []
+        for i, id in enumerate(ids):
+            row = self._rows.get(id)
+            if row is None:
+                continue
+            if (
+                page.metadatas is not None
+                and page.metadatas[i] != self._metadatas[row]
+            ) or (
+                page.documents is not None
+                and page.documents[i] != self._documents[row]
+            ):
+                changed.append(id)
+            elif page.embeddings is not None and not np.array_equal(
+                np.asarray(page.embeddings[i], dtype=np.float32), self._embeddings[row]
+            ):
+                changed.append(id)
+        return changed
+
+    def _apply(self, deleted: List[ID], batches: Iterable[Any]) -> None:
+        """Deletes rows by moving the last row into their place, then overwrites the
+        rows of known ids and appends the others"""
+        dimension = self.dimension
+        count = self.count()
+        # Rows whose vector changed, to be moved in the index
+        touched: Set[int] = set()
+        if self.path is not None:
+            matrix = _map_embeddings(self.path, self.count(), dimension, mode="r+")
+        elif not self._embeddings.flags.writeable:
+            matrix = np.array(self._embeddings)
+        else:
+            matrix = self._embeddings
+
+        for id in deleted:
+            row = self._rows.pop(id)
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                matrix[row] = matrix[last]
+                touched.add(row)
+                self._ids[row] = moved
+                self._metadatas[row] = self._metadatas[last]
+                self._documents[row] = self._documents[last]
+                self._rows[moved] = row
+            self._ids.pop()
+            self._metadatas.pop()
+            self._documents.pop()
+        kept = len(self._ids)
+
+        appended: List[np.ndarray] = []
+        for batch in batches:
+            embeddings = _page_embeddings(batch)
+            metadatas = batch.metadatas or [None] * len(batch.ids)
+            documents = batch.documents or [None] * len(batch.ids)
+            new = []
+            for i, id in enumerate(batch.ids.tolist()):
+                row = self._rows.get(id)
+                if row is None:
+                    self._rows[id] = len(self._ids)
+                    self._ids.append(id)
+                    self._metadatas.append(metadatas[i])
+                    self._documents.append(documents[i])
+                    new.append(i)
+                    continue
+                matrix[row] = embeddings[i]
+                touched.add(row)
+                self._metadatas[row] = metadatas[i]
+                self._documents[row] = documents[i]
+            if new:
+                appended.append(embeddings[new])
+                dimension = dimension or embeddings.shape[1]
+
+        self._norms = None
+        self._columns = None
+        if self.path is None:
+            if appended:
+                self._embeddings = np.concatenate(
+                    ([matrix[:kept]] if kept else []) + appended
+                )
+            else:
+                self._embeddings = matrix[:kept]
+            self._reindex(count, kept, touched)
+            return
+        if isinstance(matrix, np.memmap):
+            matrix.flush()
+        del matrix
+        with open(os.path.join(self.path, EMBEDDINGS_FILE), "r+b") as f:
+            f.truncate(kept * dimension * 4)
+            f.seek(0, os.SEEK_END)
+            for block in appended:
+                f.write(block.tobytes())
+        self._write_patches(
+            sorted(row for row in touched if row < kept) + list(range(kept, self.count()))
+        )
+        _write_manifest(
+            self.path,
+            {
+                "name": self.name,
+                "id": str(self.id),
+                "space": self.space,
+                "dimension": dimension,
+                "count": self.count(),
+                "patches": self._patches,
+            },
+        )
+        self._embeddings = _map_embeddings(self.path, self.count(), dimension)
+        self._reindex(count, kept, touched)
+
+    def _write_patches(self, rows: List[int]) -> None:
+        """Appends the given rows to records.jsonl as patches, or rewrites the file once
+        the patches would outnumber the rows"""
+        assert self.path is not None
+        if self._patches + len(rows) > self.count():
+            _write_records(self.path, self._ids, self._metadatas, self._documents)
+            self._patches = 0
+            return
+        with open(os.path.join(self.path, RECORDS_FILE), "a") as f:
+            for row in rows:
+                patch = [row, self._ids[row], self._metadatas[row], self._documents[row]]
+                f.write(json.dumps(patch) + "\n")
+        self._patches += len(rows)
+
+    def _reindex(self, count: int, kept: int, touched: Set[int]) -> None:
+        """Brings the index up to date after _apply: rows past the kept ones were
+        deleted or appended, and the vectors of the touched rows changed"""
+        if self._index is None:
+            return
+        self._index.remove(np.arange(kept, count))
+        rows = np.array(
+            sorted(row for row in touched if row < kept)
+            + list(range(kept, self.count())),
+            dtype=np.int64,
+        )
+        self._index.add(rows, np.asarray(self._embeddings[rows]))
+        if self.path is not None:
+            self._index.save(os.path.join(self.path, INDEX_FILE))
+
+    def _as_numpy(self, as_numpy: Optional[bool]) -> bool:
+        return self.as_numpy if as_numpy is None else as_numpy
+
+    def _filter(
+        self,
+        rows: np.ndarray,
+        where: Optional[Where],
+        where_document: Optional[WhereDocument],
+    ) -> np.ndarray:
+        if where:
+            if self._columns is None:
+                self._columns = MetadataColumns(self._metadatas)
+            rows = rows[compile_where(where).mask(self._columns)[rows]]
+        if where_document:
+            rows = rows[
+                compile_where_document(where_document).mask(
+                    [self._documents[r] for r in rows]
+                )
+            ]
+        return rows
+
+    def _row_norms(self) -> np.ndarray:
+        """The squared norm of every row, computed once"""
+        if self._norms is None:
+            self._norms = row_norms(self._embeddings)
+        return self._norms
+
+    def _query_result(
+        self,
+        neighbors: np.ndarray,
+        distances: np.ndarray,
+        include: Include,
+        as_numpy: Optional[bool],
+    ) -> QueryResult:
+        ids = [[self._ids[r] for r in row] for row in neighbors]
+        metadatas = (
+            [[self._metadatas[r] for r in row] for row in neighbors]
+            if "metadatas" in include
+            else None
+        )
+        documents = (
+            [[self._documents[r] for r in row] for row in neighbors]
+            if "documents" in include
+            else None
+        )
+        embeddings = (
+            np.array(self._embeddings[neighbors.ravel()], dtype=np.float32).reshape(
+                neighbors.shape + (self.dimension,)
+            )
+            if "embeddings" in include
+            else None
+        )
+        if self._as_numpy(as_numpy):
+            return ColumnarQueryResult(  # type: ignore[return-value]
+                ids=np.array(ids, dtype=np.str_).reshape(neighbors.shape),
+                lengths=np.full(len(neighbors), neighbors.shape[1], dtype=np.int64),
+                embeddings=embeddings,
+                distances=distances if "distances" in include else None,
+                metadatas=metadatas,
+                documents=documents,
+            )
+        return QueryResult(
+            ids=ids,
+            embeddings=embeddings.tolist() if embeddings is not None else None,
+            metadatas=metadatas,
+            documents=documents,
+            distances=distances.tolist() if "distances" in include else None,
+        )
+
+
+def _map_embeddings(
+    path: str, count: int, dimension: int, mode: Literal["r", "r+"] = "r"
+) -> np.ndarray:
+    if count == 0:
+        return np.empty((0, dimension), dtype=np.float32)
+    return np.memmap(
+        os.path.join(path, EMBEDDINGS_FILE),
+        dtype="<f4",
+        mode=mode,
+        shape=(count, dimension),
+    )
+
+
+def _write_records(
+    path: str,
+    ids: List[ID],
+    metadatas: List[Optional[Metadata]],
+    documents: List[Optional[Document]],
+) -> None:
+    temporary = os.path.join(path, RECORDS_FILE + ".tmp")
+    with open(temporary, "w") as f:
+        for row in zip(ids, metadatas, documents):
+            f.write(json.dumps(row) + "\n")
+    os.replace(temporary, os.path.join(path, RECORDS_FILE))
+
+
+def _write_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    """Replaces the manifest atomically, so a crash never leaves a torn one"""
+    temporary = os.path.join(path, MANIFEST_FILE + ".tmp")
+    with open(temporary, "w") as f:
+        json.dump(manifest, f)
+    os.replace(temporary, os.path.join(path, MANIFEST_FILE))
+
+
+def _page_embeddings(page: Any) -> np.ndarray:
+    embeddings = page.embeddings
+    if embeddings is None:
+        raise ValueError("The cluster returned records without embeddings")
+    return np.ascontiguousarray(embeddings, dtype="<f4")
+
+
+def replicate(
+    cluster: "Cluster",
+    path: Optional[str] = None,
+    space: Space = "l2",
+    page_size: int = 1000,
+    prefetch: int = 1,
+    as_numpy: bool = False,
+) -> LocalCluster:
+    """Copies every record of cluster into a LocalCluster, see Cluster.replicate_local"""
+    pages = cluster.iter(
+        page_size=page_size,
+        include=["embeddings", "metadatas", "documents"],
+        prefetch=prefetch,
+        as_numpy=True,
+    )
+    ids: List[ID] = []
+    metadatas: List[Optional[Metadata]] = []
+    documents: List[Optional[Document]] = []
+    blocks: List[np.ndarray] = []
+    dimension = cluster.embedding_size or 0
+
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+        vectors = open(os.path.join(path, EMBEDDINGS_FILE), "wb")
+        records = open(os.path.join(path, RECORDS_FILE), "w")
+    try:
+        for page in pages:
+            embeddings = _page_embeddings(page)
+            dimension = embeddings.shape[1]
+            page_ids: Sequence[ID] = page.ids.tolist()
+            page_metadatas = page.metadatas or [None] * len(page_ids)
+            page_documents = page.documents or [None] * len(page_ids)
+            ids.extend(page_ids)
+            metadatas.extend(page_metadatas)
+            documents.extend(page_documents)
+            if path is None:
+                blocks.append(embeddings)
+                continue
+            vectors.write(embeddings.tobytes())
+            for row in zip(page_ids, page_metadatas, page_documents):
+                records.write(json.dumps(row) + "\n")
+    finally:
+        if path is not None:
+            vectors.close()
+            records.close()
+
+    if path is None:
+        matrix: Union[np.ndarray, np.memmap] = (
+            np.concatenate(blocks)
+            if blocks
+            else np.empty((0, dimension), dtype=np.float32)
+        )
+    else:
+        _write_manifest(
+            path,
+            {
+                "name": cluster.name,
+                "id": str(cluster.id),
+                "space": space,
+                "dimension": dimension,
+                "count": len(ids),
+            },
+        )
+        matrix = _map_embeddings(path, len(ids), dimension)
+    return LocalCluster(
+        name=cluster.name,
+        id=cluster.id,
+        ids=ids,
+        embeddings=matrix,
+        metadatas=metadatas,
+        documents=documents,
+        space=space,
+        path=path,
+        as_numpy=as_numpy,
+    )
@@ -0,0 +1,193 @@
+"""Retry and backoff policy shared by every call of the REST clients.
+
+A RetryPolicy decides, after each attempt, whether a request is sent again and how long
+to wait first. Waits use exponential backoff with full jitter, so clients that failed
+together do not retry together, and a Retry-After header from the server takes
+precedence. A RetryBudget caps retries to a fraction of successful traffic, so a server
+that is down gets one attempt per call rather than a retry storm.
+
+Only requests that are safe to repeat are retried after the server may have processed
+them: idempotent verbs and POST routes listed in idempotent_routes. Responses that
+guarantee the request was not processed (429, 503) and connection failures before the
+request was sent are retried for every verb.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Collection, Mapping, Optional
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from bagel.config import Settings
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+# POST routes that read, or write the same end state however often they are sent
+IDEMPOTENT_ROUTES = ("/query", "/get", "/upsert", "/update", "/create_index")
+# Statuses that mean the server did not process the request
+REJECTED_STATUSES = frozenset({429, 503})
+# Statuses that may be transient but leave the request's outcome unknown
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a ratio of successful requests.
+
+    Each success adds ratio tokens, up to max_tokens, and each retry spends one. Retries
+    are allowed while more than half the bucket is left, so bursts of errors are retried
+    but a sustained outage quickly falls back to single attempts.
+    """
+
+    def __init__(self, max_tokens: float = 10.0, ratio: float = 0.1):
+        self.max_tokens = max_tokens
+        self.ratio = ratio
+        self._tokens = max_tokens
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one token for a retry, returns False if the budget is exhausted"""
+        with self._lock:
+            if self._tokens - 1 < self.max_tokens / 2:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy:
+    """Decides whether and when a failed request is retried.
+
+    Args:
+        max_attempts: The maximum number of attempts per request, including the first.
+        backoff_base: The wait before the first retry, doubled on each further retry.
+        backoff_max: The upper bound on a single wait.
+        max_elapsed: The maximum number of seconds spent on one request, retries included.
+        retry_statuses: The response statuses that are retried.
+        idempotent_methods: The HTTP verbs that are always safe to repeat.
+        idempotent_routes: The path suffixes of POST routes that are safe to repeat.
+        budget: The shared RetryBudget, or None to retry without a budget.
+        respect_retry_after: Wait as long as the server's Retry-After header asks.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 4,
+        backoff_base: float = 0.2,
+        backoff_max: float = 10.0,
+        max_elapsed: Optional[float] = 30.0,
+        retry_statuses: Collection[int] = RETRY_STATUSES,
+        idempotent_methods: Collection[str] = IDEMPOTENT_METHODS,
+        idempotent_routes: Collection[str] = IDEMPOTENT_ROUTES,
+        budget: Optional[RetryBudget] = None,
+        respect_retry_after: bool = True,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_elapsed = max_elapsed
+        self.retry_statuses = frozenset(retry_statuses)
+        self.idempotent_methods = frozenset(m.upper() for m in idempotent_methods)
+        self.idempotent_routes = tuple(idempotent_routes)
+        self.budget = budget if budget is not None else RetryBudget()
+        self.respect_retry_after = respect_retry_after
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "RetryPolicy":
+        """The policy configured on Settings: bagel_retry_policy if set, otherwise one
+        built from the bagel_retry_* values"""
+        if settings.bagel_retry_policy is not None:
+            return cast_policy(settings.bagel_retry_policy)
+        return cls(
+            max_attempts=settings.bagel_retry_max_attempts,
+            backoff_base=settings.bagel_retry_backoff_base,
+            backoff_max=settings.bagel_retry_backoff_max,
+            max_elapsed=settings.bagel_retry_max_elapsed,
+            budget=RetryBudget(ratio=settings.bagel_retry_budget_ratio),
+        )
+
+    def is_idempotent(self, method: str, url: str) -> bool:
+        if method.upper() in self.idempotent_methods:
+            return True
+        return urlsplit(url).path.rstrip("/").endswith(self.idempotent_routes)
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: a uniform wait between 0 and the exponential bound"""
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+        )
+
+    def next_delay(
+        self,
+        attempt: int,
+        method: str,
+        url: str,
+        elapsed: float,
+        status: Optional[int] = None,
+        headers: Optional[Mapping[str, str]] = None,
+        error: Optional[BaseException] = None,
+        sent: bool = True,
+        idempotent: Optional[bool] = None,
+        deadline: Optional[float] = None,
+    ) -> Optional[float]:
+        """Called after every attempt with either the response status and headers or the
+        error raised. Returns the number of seconds to wait before the next attempt, or
+        None if the outcome is final.
+
+        sent is False when an error was raised before the request reached the server.
+        idempotent overrides the per-verb and per-route rules for this request.
+        deadline is the number of seconds left before the caller's deadline, if any.
+        """
+        if error is None and status not in self.retry_statuses:
+            self.budget.record_success()
+            return None
+        if idempotent is None:
+            idempotent = self.is_idempotent(method, url)
+        not_processed = (error is not None and not sent) or status in REJECTED_STATUSES
+        if not (idempotent or not_processed):
+            return None
+        if attempt >= self.max_attempts:
+            return None
+
+        delay = self.backoff(attempt)
+        retry_after = parse_retry_after(headers) if self.respect_retry_after else None
+        if retry_after is not None:
+            delay = retry_after
+        if self.max_elapsed is not None and elapsed + delay > self.max_elapsed:
+            return None
+        if deadline is not None and delay >= deadline:
+            return None
+        if not self.budget.try_spend():
+            return None
+        return delay
+
+
+def cast_policy(policy: Any) -> RetryPolicy:
+    if not isinstance(policy, RetryPolicy):
+        raise ValueError(
+            f"bagel_retry_policy must be a RetryPolicy, got {type(policy).__name__}"
+        )
+    return policy
+
+
+def parse_retry_after(headers: Optional[Mapping[str, str]]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header given as seconds or as an HTTP date"""
+    if not headers:
+        return None
+    value = headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,78 @@
+"""Exact nearest-neighbour search over float32 matrices.
+
+Used by LocalCluster replicas and the local engine. Distances follow the server's
+conventions: l2 is the squared euclidean distance, cosine and ip are 1 - similarity.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+from typing_extensions import Literal
+
+Space = Literal["l2", "cosine", "ip"]
+SPACES = ("l2", "cosine", "ip")
+
+# The largest number of distances computed at once, bounding the memory of a search
+_MAX_BLOCK = 1 << 24
+
+
+def validate_space(space: str) -> Space:
+    if space not in SPACES:
+        raise ValueError(f"Expected space to be one of l2, cosine, ip, got {space}")
+    return space  # type: ignore[return-value]
+
+
+def row_norms(vectors: np.ndarray) -> np.ndarray:
+    """The squared norm of every row"""
+    return np.einsum("ij,ij->i", vectors, vectors)
+
+
+def distances(
+    queries: np.ndarray,
+    vectors: np.ndarray,
+    space: Space,
+    norms: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """The (queries, vectors) distance matrix. norms are the squared row norms of
+    vectors, computed if not given."""
+    dots = queries @ np.asarray(vectors).T
+    if space == "ip":
+        return 1.0 - dots
+    if norms is None:
+        norms = row_norms(vectors)
+    if space == "cosine":
+        query_norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        return 1.0 - dots / np.maximum(query_norms * np.sqrt(norms), 1e-30)
+    query_norms = row_norms(queries)[:, None]
+    return np.maximum(query_norms - 2.0 * dots + norms, 0.0)
+
+
+def nearest(
+    queries: np.ndarray,
+    vectors: np.ndarray,
+    k: int,
+    space: Space,
+    norms: Optional[np.ndarray] = None,
+    candidates: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """The k nearest rows of vectors to each query, nearest first, as a (queries, k)
+    array of row numbers and one of distances. Only the rows in candidates are
+    searched if given. Fewer than k rows are returned if there are fewer candidates."""
+    if candidates is not None:
+        vectors = vectors[candidates]
+        norms = norms[candidates] if norms is not None else None
+    if norms is None and space != "ip":
+        norms = row_norms(vectors)
+    k = min(k, len(vectors))
+    rows = np.empty((len(queries), k), dtype=np.int64)
+    found = np.empty((len(queries), k), dtype=np.float32)
+    block = max(1, _MAX_BLOCK // max(1, len(vectors)))
+    for start in range(0, len(queries) if k else 0, block):
+        part = distances(queries[start : start + block], vectors, space, norms)
+        top = np.argpartition(part, k - 1, axis=1)[:, :k]
+        top_distances = np.take_along_axis(part, top, axis=1)
+        order = np.argsort(top_distances, axis=1, kind="stable")
+        rows[start : start + block] = np.take_along_axis(top, order, axis=1)
+        found[start : start + block] = np.take_along_axis(top_distances, order, axis=1)
+    if candidates is not None:
+        rows = candidates[rows]
+    return rows, found
@@ -0,0 +1,151 @@
+"""Per-operation timeouts and deadlines for the REST clients.
+
+Every request gets a (connect, read) timeout chosen by its operation class, configured
+with the bagel_*_timeout values on Settings. A deadline scope bounds all requests made
+inside it, on this thread or a context copied from it, to one overall deadline:
+
+    with deadline(30):
+        cluster.add_bulk(ids, embeddings)  # every batch and retry shares the 30s
+
+Cluster methods that take a timeout argument open such a scope.
+"""
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterator, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from typing_extensions import Literal
+
+if TYPE_CHECKING:
+    from bagel.config import Settings
+
+OperationClass = Literal["query", "get", "write", "upload", "download", "jobs", "default"]
+# A single number is used for both the connect and the read timeout
+Timeout = Union[float, Tuple[float, float]]
+
+_GET_ROUTES = ("/get", "/count")
+# The cluster routes that write, shared with the circuit breakers
+WRITE_ROUTES = (
+    "/add",
+    "/add_image",
+    "/add_image_url",
+    "/upsert",
+    "/update",
+    "/delete",
+    "/create_index",
+)
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "bagel_deadline", default=None
+)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Bound every request made inside the block to finish within seconds from now.
+    A nested scope can shorten the deadline but never extend it. None leaves the
+    current deadline unchanged."""
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(at if current is None else min(at, current))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current deadline, or None outside a deadline scope"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def operation_class(method: str, url: str) -> OperationClass:
+    """The operation class of a cluster request, inferred from its route. Dataset and
+    job calls pass their class explicitly."""
+    path = urlsplit(url).path.rstrip("/")
+    if path.endswith("/query"):
+        return "query"
+    if "/jobs" in path:
+        return "jobs"
+    if path.endswith(WRITE_ROUTES):
+        return "write"
+    if path.endswith(_GET_ROUTES) or method.upper() == "GET":
+        return "get"
+    return "default"
+
+
+class Timeouts:
+    """The configured read timeout of each operation class and the shared connect
+    timeout. None means no timeout."""
+
+    def __init__(
+        self,
+        connect: Optional[float] = 10.0,
+        query: Optional[float] = 30.0,
+        get: Optional[float] = 60.0,
+        write: Optional[float] = 120.0,
+        upload: Optional[float] = 600.0,
+        download: Optional[float] = 600.0,
+        jobs: Optional[float] = 60.0,
+        default: Optional[float] = 60.0,
+    ):
+        self.connect = connect
+        self.read = {
+            "query": query,
+            "get": get,
+            "write": write,
+            "upload": upload,
+            "download": download,
+            "jobs": jobs,
+            "default": default,
+        }
+
+    @classmethod
+    def from_settings(cls, settings: "Settings") -> "Timeouts":
+        return cls(
+            connect=settings.bagel_connect_timeout,
+            query=settings.bagel_query_timeout,
+            get=settings.bagel_get_timeout,
+            write=settings.bagel_write_timeout,
+            upload=settings.bagel_upload_timeout,
+            download=settings.bagel_download_timeout,
+            jobs=settings.bagel_jobs_timeout,
+            default=settings.bagel_default_timeout,
+        )
+
+    def for_request(
+        self,
+        method: str,
+        url: str,
+        operation: Optional[OperationClass] = None,
+        timeout: Optional[Timeout] = None,
+    ) -> Tuple[Optional[float], Optional[float]]:
+        """The (connect, read) timeout of one request attempt: the explicit timeout if
+        given, otherwise the one of its operation class, cut down to the time left
+        before the current deadline.
+
+        Raises:
+            TimeoutError: If the current deadline has already passed
+        """
+        if timeout is None:
+            connect: Optional[float] = self.connect
+            read = self.read[operation or operation_class(method, url)]
+        elif isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+
+        left = remaining()
+        if left is None:
+            return connect, read
+        if left <= 0:
+            raise TimeoutError(f"Deadline exceeded before {method} {url}")
+        return (
+            left if connect is None else min(connect, left),
+            left if read is None else min(read, left),
+        )
@@ -1,5 +1,6 @@
-from typing import Any, Optional, Union, Dict, Sequence, TypeVar, List, Mapping
+from typing import Any, Hashable, Optional, Union, Dict, Sequence, TypeVar, List, Mapping, Tuple
 from typing_extensions import Literal, TypedDict, Protocol
+import numpy as np
 import bagel.errors as errors
 
 # Re-export types from bagel.types
@@ -55,6 +56,8 @@ Include = List[
     ]
 ]
 
+WriteConsistency = Union[Literal["none"], Literal["read_your_writes"]]
+
 # Re-export types from bagel.types
 LiteralValue = LiteralValue
 LogicalOperator = LogicalOperator
@@ -79,6 +82,32 @@ class QueryResult(TypedDict):
     distances: Optional[List[List[float]]]
 
 
+class BatchFailure(TypedDict):
+    # Position of the batch and the [start, end) range of records it covered
+    batch: int
+    start: int
+    end: int
+    ids: IDs
+    error: str
+
+
+class IngestSummary(TypedDict):
+    records: int
+    records_failed: int
+    batches: int
+    failed_batches: List[BatchFailure]
+    elapsed_seconds: float
+    records_per_second: float
+
+
+class SyncSummary(TypedDict):
+    added: int
+    updated: int
+    deleted: int
+    unchanged: int
+    elapsed_seconds: float
+
+
 class IndexMetadata(TypedDict):
     dimensionality: int
     # The current number of elements in the index (total = additions - deletes)
@@ -100,6 +129,11 @@ def maybe_cast_one_to_many(
 ) -> List[Parameter]:
     """Infers if target is Embedding, Metadata, or Document and casts it to a many object if its one"""
 
+    # One Embedding as a 1-D numeric array, viewed as a single row without copying
+    if isinstance(target, np.ndarray):
+        if target.ndim == 1 and target.dtype.kind in "iuf":
+            return target.reshape(1, -1)  # type: ignore
+        return target  # type: ignore
     if isinstance(target, Sequence):
         # One Document or ID
         if isinstance(target, str) and target is not None:
@@ -154,6 +188,40 @@ def validate_metadatas(metadatas: Metadatas) -> Metadatas:
     return metadatas
 
 
+def filter_key(value: Any) -> Optional[Hashable]:
+    """A hashable key identifying a where or where_document filter by value, types
+    included, or None if the filter holds unhashable values. filter_from_key rebuilds
+    the filter from it."""
+    try:
+        key = _freeze(value)
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, dict):
+        items = tuple([(_freeze(k), _freeze(v)) for k, v in value.items()])
+        if len(items) > 1:
+            # Sorted, so dicts equal but for their order share a key
+            items = tuple(sorted(items, key=repr))
+        return dict, items
+    if isinstance(value, list):
+        return list, tuple([_freeze(v) for v in value])
+    # The type keeps 1, 1.0, True and "1" apart
+    return type(value), value
+
+
+def filter_from_key(key: Hashable) -> Any:
+    kind, value = key  # type: ignore[misc]
+    if kind is dict:
+        return {filter_from_key(k): filter_from_key(v) for k, v in value}
+    if kind is list:
+        return [filter_from_key(v) for v in value]
+    return value
+
+
 def validate_where(where: Where) -> Where:
     """
     Validates where to ensure it is a dictionary of strings to strings, ints, floats or operator expressions,
@@ -284,7 +352,10 @@ def validate_n_results(n_results: int) -> int:
 
 
 def validate_embeddings(embeddings: Embeddings) -> Embeddings:
-    """Validates embeddings to ensure it is a list of list of ints, or floats"""
+    """Validates embeddings to ensure it is a list of list of ints, or floats, or a 2-D numeric
+    ndarray. Arrays are checked by dtype, shape and finiteness and returned unchanged."""
+    if isinstance(embeddings, np.ndarray):
+        return validate_embeddings_array(embeddings)
     if not isinstance(embeddings, list):
         raise ValueError(f"Expected embeddings to be a list, got {embeddings}")
     if len(embeddings) == 0:
@@ -301,3 +372,66 @@ def validate_embeddings(embeddings: Embeddings) -> Embeddings:
                 f"Expected each value in the embedding to be a int or float, got {embeddings}"
             )
     return embeddings
+
+
+def validate_embeddings_array(embeddings: np.ndarray) -> np.ndarray:
+    """Validates a 2-D ndarray of embeddings with vectorized checks instead of per value ones"""
+    if embeddings.ndim != 2:
+        raise ValueError(
+            f"Expected embeddings array to be 2-D (n, dim), got shape {embeddings.shape}"
+        )
+    if embeddings.shape[0] == 0 or embeddings.shape[1] == 0:
+        raise ValueError(
+            f"Expected embeddings array to have at least one non-empty row, got shape {embeddings.shape}"
+        )
+    if embeddings.dtype.kind not in "iuf":
+        raise ValueError(
+            f"Expected embeddings array to have an int or float dtype, got {embeddings.dtype}"
+        )
+    if embeddings.dtype.kind == "f" and not np.isfinite(embeddings).all():
+        raise ValueError("Expected embeddings array to contain only finite values")
+    return embeddings
+
+
+def validate_embedding_set(
+    ids: OneOrMany[ID],
+    embeddings: Optional[OneOrMany[Embedding]],
+    metadatas: Optional[OneOrMany[Metadata]],
+    documents: Optional[OneOrMany[Document]],
+    require_embeddings_or_documents: bool = True,
+) -> Tuple[IDs, Optional[Embeddings], Optional[Metadatas], Optional[Documents]]:
+    """Validates the columns of a write and checks that their lengths match the ids"""
+    ids = validate_ids(maybe_cast_one_to_many(ids))
+    embeddings = (
+        validate_embeddings(maybe_cast_one_to_many(embeddings))
+        if embeddings is not None
+        else None
+    )
+    metadatas = (
+        validate_metadatas(maybe_cast_one_to_many(metadatas))
+        if metadatas is not None
+        else None
+    )
+    documents = maybe_cast_one_to_many(documents) if documents is not None else None
+
+    # Check that one of embeddings or documents is provided
+    if require_embeddings_or_documents:
+        if embeddings is None and documents is None:
+            raise ValueError(
+                "You must provide either embeddings or documents, or both"
+            )
+
+    # Check that, if they're provided, the lengths of the arrays match the length of ids
+    if embeddings is not None and len(embeddings) != len(ids):
+        raise ValueError(
+            f"Number of embeddings {len(embeddings)} must match number of ids {len(ids)}"
+        )
+    if metadatas is not None and len(metadatas) != len(ids):
+        raise ValueError(
+            f"Number of metadatas {len(metadatas)} must match number of ids {len(ids)}"
+        )
+    if documents is not None and len(documents) != len(ids):
+        raise ValueError(
+            f"Number of documents {len(documents)} must match number of ids {len(ids)}"
+        )
+    return ids, embeddings, metadatas, documents  # type: ignore
@@ -20,10 +20,13 @@ logger = logging.getLogger(__name__)
 
 _legacy_config_values = {
     "rest": "bagel.api.fastapi.FastAPI",
+    "rest-async": "bagel.api.async_fastapi.AsyncFastAPI",
+    "local": "bagel.api.local.LocalAPI",
 }
 
 _abstract_type_keys: Dict[str, str] = {
     "bagel.api.API": "bagel_api_impl",
+    "bagel.api.AsyncAPI": "bagel_api_impl",
 }
 
 
@@ -42,11 +45,96 @@ class Settings(BaseSettings):
     bagel_server_ssl_enabled: Optional[bool] = False
     bagel_server_grpc_port: Optional[str] = None
     bagel_server_cors_allow_origins: List[str] = []
+
+    # HTTP connection pooling for the REST client
+    bagel_http_pool_connections: int = 10
+    bagel_http_pool_maxsize: int = 10
+    bagel_http_keepalive_timeout: Optional[float] = 60.0
+
+    # "float32-base64" sends embeddings as packed float32 blocks to servers that
+    # advertise support for it, and JSON lists to all others
+    bagel_embedding_encoding: Literal["json", "float32-base64"] = "json"
+    # "numpy" returns ColumnarQueryResult/ColumnarGetResult from find and get
+    bagel_result_format: Literal["dict", "numpy"] = "dict"
+
+    # "none" returns as soon as the server accepts a write; "read_your_writes" waits
+    # until reads return the written values (or, after a delete by ids, no longer return
+    # the ids), for at most bagel_consistency_timeout
+    bagel_write_consistency: Literal["none", "read_your_writes"] = "none"
+    bagel_consistency_timeout: float = 10.0
+
+    # Timeouts in seconds, None for no timeout. bagel_connect_timeout applies to every
+    # request, the others are read timeouts per operation class, see bagel.api.timeouts
+    bagel_connect_timeout: Optional[float] = 10.0
+    bagel_query_timeout: Optional[float] = 30.0
+    bagel_get_timeout: Optional[float] = 60.0
+    bagel_write_timeout: Optional[float] = 120.0
+    bagel_upload_timeout: Optional[float] = 600.0
+    bagel_download_timeout: Optional[float] = 600.0
+    bagel_jobs_timeout: Optional[float] = 60.0
+    bagel_default_timeout: Optional[float] = 60.0
+
+    # Retries of transient HTTP failures, see bagel.api.retry. bagel_retry_policy takes a
+    # RetryPolicy instance and replaces the policy built from the other values
+    bagel_retry_max_attempts: int = 4
+    bagel_retry_backoff_base: float = 0.2
+    bagel_retry_backoff_max: float = 10.0
+    bagel_retry_max_elapsed: Optional[float] = 30.0
+    bagel_retry_budget_ratio: float = 0.1
+    bagel_retry_policy: Optional[Any] = None
+
+    # Hedged queries: a find with no response after the bagel_hedge_percentile latency
+    # of recent queries is sent again, for at most bagel_hedge_max_ratio extra requests
+    bagel_hedge_queries: bool = False
+    bagel_hedge_percentile: float = 0.95
+    bagel_hedge_max_ratio: float = 0.05
+    bagel_hedge_min_delay: float = 0.01
+
+    # In-process LRU cache of query results, see bagel.api.cache. A client drops a
+    # cluster's cached results whenever it writes to that cluster
+    bagel_query_cache: bool = False
+    bagel_query_cache_max_entries: int = 1024
+    bagel_query_cache_max_bytes: int = 64 * 1024 * 1024
+    bagel_query_cache_ttl: Optional[float] = 60.0
+
+    # Semantic cache for find(query_embeddings=...): a query within
+    # bagel_semantic_cache_distance cosine distance of a recent one reuses its result
+    # rows, without distances
+    bagel_semantic_cache: bool = False
+    bagel_semantic_cache_distance: float = 0.05
+    bagel_semantic_cache_max_entries: int = 1024
+    bagel_semantic_cache_ttl: Optional[float] = 60.0
+
+    # Concurrent finds on the same cluster with the same parameters are merged into one
+    # /query request, waiting at most bagel_coalesce_window seconds for each other
+    bagel_coalesce_queries: bool = False
+    bagel_coalesce_window: float = 0.002
+    bagel_coalesce_max_batch: int = 64
+
+    # Circuit breakers per host and route class (query, write, dataset), see
+    # bagel.api.circuit. Open circuits fail fast with CircuitOpenError
+    bagel_circuit_breaker: bool = False
+    bagel_circuit_failure_rate: float = 0.5
+    bagel_circuit_slow_call_seconds: Optional[float] = None
+    bagel_circuit_slow_call_rate: float = 0.5
+    bagel_circuit_min_calls: int = 20
+    bagel_circuit_window: float = 30.0
+    bagel_circuit_open_seconds: float = 10.0
+    bagel_circuit_half_open_calls: int = 3
     anonymized_telemetry: bool = True
 
     allow_reset: bool = False
 
+    # The local engine (bagel_api_impl="local") keeps its data in this SQLite file,
+    # relative to persist_directory, and its vectors next to it; ":memory:" keeps
+    # everything in memory
     sqlite_database: Optional[str] = ":memory:"
+    # The approximate index built by create_index on the local engine: the number of
+    # inverted lists (4 * sqrt(records) if None), the number searched per query, and
+    # the bytes per vector with product quantisation (None stores no codes)
+    bagel_local_ivf_lists: Optional[int] = None
+    bagel_local_ivf_nprobe: int = 8
+    bagel_local_pq_subvectors: Optional[int] = None
     migrations: Literal["none", "validate", "apply"] = "apply"
 
     def require(self, key: str) -> Any:
@@ -121,9 +209,12 @@ class System(Component):
 
         if is_thin_client:
             # The thin client is a system with only the API component
-            if self.settings["bagel_api_impl"] != "bagel.api.fastapi.FastAPI":
+            if self.settings["bagel_api_impl"] not in (
+                "bagel.api.fastapi.FastAPI",
+                "bagel.api.async_fastapi.AsyncFastAPI",
+            ):
                 raise RuntimeError(
-                    "Bagel is running in http-only client mode, and can only be run with 'bagel.api.fastapi.FastAPI' or 'rest' as the bagel_api_impl."
+                    "Bagel is running in http-only client mode, and can only be run with 'bagel.api.fastapi.FastAPI' ('rest') or 'bagel.api.async_fastapi.AsyncFastAPI' ('rest-async') as the bagel_api_impl."
                 )
 
     def instance(self, type: Type[T]) -> T:
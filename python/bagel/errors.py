@@ -1,5 +1,5 @@
 from abc import abstractmethod
-from typing import Dict, Type
+from typing import Any, Dict, List, Type
 from overrides import overrides, EnforceOverrides
 
 
@@ -28,3 +28,35 @@ class DuplicateIDError(BagelError):
 error_types: Dict[str, Type[BagelError]] = {
     "DuplicateID": DuplicateIDError,
 }
+
+
+class BufferedWriteError(BagelError):
+    """Raised when a buffered writer is flushed or closed and some of its batches
+    failed. failed_batches holds the BatchFailure of each of them."""
+
+    def __init__(self, message: str, failed_batches: List[Any]):
+        super().__init__(message)
+        self.failed_batches = failed_batches
+
+    @classmethod
+    @overrides
+    def name(cls) -> str:
+        return "BufferedWrite"
+
+
+class CircuitOpenError(BagelError):
+    """Raised without contacting the server while the circuit breaker of a host and
+    route class is open. retry_after is the number of seconds until it half opens."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @overrides
+    def code(self) -> int:
+        return 503  # Service Unavailable
+
+    @classmethod
+    @overrides
+    def name(cls) -> str:
+        return "CircuitOpen"
@@ -0,0 +1,55 @@
+"""
+Recall and latency of the local engine's approximate index against exact search.
+
+    python examples/local_ann_benchmark.py --rows 200000 --dimension 64
+"""
+import argparse
+import time
+
+import numpy as np
+
+from bagel.api.ivf import IVFIndex, measure_recall
+
+
+def clustered(rows, dimension, centers, seed=0):
+    """Random vectors around random centers, a rough stand-in for real embeddings"""
+    rng = np.random.default_rng(seed)
+    means = rng.normal(scale=3.0, size=(centers, dimension))
+    data = means[rng.integers(centers, size=rows)] + rng.normal(size=(rows, dimension))
+    return data.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--space", default="l2", choices=["l2", "cosine", "ip"])
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--pq", type=int, default=None, help="PQ subvectors, none by default")
+    args = parser.parse_args()
+
+    data = clustered(args.rows, args.dimension, centers=max(10, args.rows // 500))
+    queries = data[np.random.default_rng(1).choice(len(data), args.queries)] + 0.05
+
+    start = time.perf_counter()
+    index = IVFIndex(args.dimension, space=args.space, n_lists=args.lists, pq_subvectors=args.pq)
+    index.train(data)
+    index.add(np.arange(len(data)), data)
+    print(f"built {index.n_lists} lists over {len(data)} rows in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'nprobe':>6} {'recall@' + str(args.k):>10} {'exact ms':>9} {'index ms':>9}")
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > index.n_lists:
+            break
+        result = measure_recall(index, data, queries, k=args.k, nprobe=nprobe)
+        print(
+            f"{nprobe:>6} {result['recall']:>10.3f} "
+            f"{1000 * result['exact_seconds_per_query']:>9.2f} "
+            f"{1000 * result['index_seconds_per_query']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,11 @@ dependencies = [
     "tzdata>=2022.1",
 ]
 
+# Optional dependencies
+extras = {
+    "async": ["httpx>=0.24"],
+}
+
 # Define package classifiers
 classifiers = [
     "Development Status :: 3 - Alpha",
@@ -52,6 +57,7 @@ setup(
     url="https://github.com/BagelNetwork/Client",
     packages=find_packages(),
     install_requires=dependencies,
+    extras_require=extras,
     classifiers=classifiers,
 )
 
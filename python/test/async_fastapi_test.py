@@ -0,0 +1,183 @@
+import asyncio
+import json
+import warnings
+
+import httpx
+import pytest
+
+import bagel
+from bagel.api.AsyncCluster import AsyncCluster
+from bagel.config import Settings
+from bagel.errors import DuplicateIDError
+
+CLUSTER = {
+    "id": "0" * 32,
+    "name": "c",
+    "metadata": None,
+    "cluster_size": 0,
+    "embedding_size": 2,
+}
+
+
+class _Server:
+    """An in-memory stand-in for the REST server behind httpx.MockTransport. Queued
+    failures, (path suffix, status or exception), are returned before routing."""
+
+    def __init__(self):
+        self.records = {}
+        self.failures = []
+        self.requests = []
+
+    def handle(self, request):
+        path = request.url.path
+        self.requests.append((request.method, path))
+        for i, (suffix, failure) in enumerate(self.failures):
+            if path.endswith(suffix):
+                del self.failures[i]
+                if isinstance(failure, Exception):
+                    raise failure
+                return httpx.Response(failure, text="unavailable")
+        body = json.loads(request.content) if request.content else {}
+        if path.endswith(("/clusters", "/clusters/c")):
+            return httpx.Response(200, json=CLUSTER)
+        if path.endswith("/add"):
+            duplicates = [id for id in body["ids"] if id in self.records]
+            if duplicates:
+                return httpx.Response(
+                    400, json={"error": "DuplicateID", "message": f"IDs {duplicates} exist"}
+                )
+            metadatas = body["metadatas"] or [None] * len(body["ids"])
+            for i, id in enumerate(body["ids"]):
+                self.records[id] = (body["embeddings"][i], metadatas[i])
+            return httpx.Response(200, json=True)
+        if path.endswith("/count"):
+            return httpx.Response(200, json=len(self.records))
+        if path.endswith("/get"):
+            ids = body["ids"] or list(self.records)
+            return httpx.Response(
+                200,
+                json={
+                    "ids": ids,
+                    "embeddings": None,
+                    "metadatas": [self.records[id][1] for id in ids],
+                    "documents": None,
+                },
+            )
+        if path.endswith("/query"):
+            rows = []
+            for query in body["query_embeddings"]:
+                distances = {
+                    id: sum((a - b) ** 2 for a, b in zip(query, embedding))
+                    for id, (embedding, _) in self.records.items()
+                }
+                rows.append(sorted(distances, key=distances.get)[: body["n_results"]])
+            return httpx.Response(
+                200,
+                json={
+                    "ids": rows,
+                    "distances": None,
+                    "embeddings": None,
+                    "metadatas": None,
+                    "documents": None,
+                },
+            )
+        return httpx.Response(404, text="not found")
+
+
+def _client(server, **settings):
+    api = bagel.AsyncClient(
+        Settings(
+            bagel_api_impl="rest-async",
+            bagel_server_host="localhost",
+            bagel_retry_backoff_base=0,
+            **settings,
+        )
+    )
+    api._client = httpx.AsyncClient(transport=httpx.MockTransport(server.handle))
+    return api
+
+
+def test_add_get_and_find():
+    server = _Server()
+
+    async def run():
+        async with _client(server) as api:
+            cluster = await api.get_or_create_cluster("c")
+            assert isinstance(cluster, AsyncCluster)
+            await cluster.add(
+                ids=["a", "b", "c"],
+                embeddings=[[0.0, 0.0], [1.0, 0.0], [5.0, 5.0]],
+                metadatas=[{"n": 1}, {"n": 2}, {"n": 3}],
+            )
+            assert await cluster.count() == 3
+            got = await cluster.get(ids=["b"])
+            assert got["ids"] == ["b"] and got["metadatas"] == [{"n": 2}]
+            found = await asyncio.gather(
+                cluster.find(query_embeddings=[[0.9, 0.0]], n_results=2),
+                cluster.find(query_embeddings=[[4.0, 4.0]], n_results=1),
+            )
+            assert [f["ids"] for f in found] == [[["b", "a"]], [["c"]]]
+
+    asyncio.run(run())
+
+
+def test_error_mapping():
+    server = _Server()
+    server.records["a"] = ([0.0, 0.0], None)
+
+    async def run():
+        async with _client(server, bagel_retry_max_attempts=1) as api:
+            cluster = await api.get_cluster("c")
+            with pytest.raises(DuplicateIDError):
+                await cluster.add(ids=["a"], embeddings=[[1.0, 1.0]])
+            server.failures.append(("/count", 500))
+            with pytest.raises(Exception, match="unavailable"):
+                await cluster.count()
+
+    asyncio.run(run())
+
+
+def test_retries():
+    server = _Server()
+
+    async def run():
+        async with _client(server) as api:
+            cluster = await api.get_cluster("c")
+            # Reads are retried on 5xx
+            server.failures.append(("/count", 503))
+            assert await cluster.count() == 0
+            # An add that never reached the server is retried
+            server.failures.append(("/add", httpx.ConnectError("refused")))
+            await cluster.add(ids=["a"], embeddings=[[1.0, 1.0]])
+            assert list(server.records) == ["a"]
+            # One that may have been applied is not
+            server.failures.append(("/add", 502))
+            with pytest.raises(Exception):
+                await cluster.add(ids=["b"], embeddings=[[1.0, 1.0]])
+        adds = [r for r in server.requests if r[1].endswith("/add")]
+        assert len(adds) == 3
+
+    asyncio.run(run())
+
+
+def test_aclose_and_stop():
+    server = _Server()
+
+    async def close_in_loop():
+        api = _client(server)
+        await api.aclose()
+        assert api._client.is_closed
+
+        api = _client(server)
+        api.stop()
+        await api._closing
+        assert api._client.is_closed
+
+    asyncio.run(close_in_loop())
+
+    api = _client(server)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        api.stop()
+    assert any(issubclass(w.category, ResourceWarning) for w in caught)
+    assert not api._client.is_closed
@@ -0,0 +1,113 @@
+import time
+
+import numpy as np
+
+from bagel.api.cache import QueryCache, SemanticQueryCache, embeddings_digest
+
+
+def _key(cluster="c", embedding=(1.0, 2.0), where=None):
+    return QueryCache.key(cluster, [list(embedding)], None, 10, where, None, ["distances"])
+
+
+def test_keys_ignore_container_types_and_dict_order():
+    assert _key() == QueryCache.key(
+        "c", np.array([[1.0, 2.0]]), None, 10, {}, {}, ["distances"]
+    )
+    assert _key(where={"a": 1, "b": 2}) == _key(where={"b": 2, "a": 1})
+    assert _key(embedding=(1.0, 2.5)) != _key()
+
+
+def test_digest_hashes_the_input_dtype():
+    batch = np.array([[0.1, 0.2]])
+    assert embeddings_digest(batch) == embeddings_digest([[0.1, 0.2]])
+    # float32 and float64 batches are sent differently, so they must not share a key
+    assert embeddings_digest(batch) != embeddings_digest(batch.astype(np.float32))
+    assert embeddings_digest(batch.astype(np.float32)) == embeddings_digest(
+        np.asfortranarray(batch.astype(np.float32))
+    )
+    assert embeddings_digest([[1.0], [1.0, 2.0]]) == embeddings_digest([[1.0], [1.0, 2.0]])
+
+
+def test_hits_misses_lru_and_ttl():
+    cache = QueryCache(max_entries=2, ttl=0.05)
+    for i in range(3):
+        key = _key(embedding=(i, 0))
+        cache.put(key, "c", b"x", cache.generation("c"))
+    assert cache.get(_key(embedding=(0, 0))) is None
+    assert cache.get(_key(embedding=(2, 0))) == b"x"
+    time.sleep(0.06)
+    assert cache.get(_key(embedding=(2, 0))) is None
+    assert (cache.hits, cache.misses, cache.evictions) == (1, 2, 1)
+
+
+def test_byte_bound():
+    cache = QueryCache(max_bytes=10)
+    cache.put(_key(embedding=(0, 0)), "c", b"123456", cache.generation("c"))
+    cache.put(_key(embedding=(1, 0)), "c", b"123456", cache.generation("c"))
+    cache.put(_key(embedding=(2, 0)), "c", b"x" * 11, cache.generation("c"))
+    assert cache.stats()["entries"] == 1 and cache.stats()["bytes"] == 6
+
+
+def test_writes_invalidate_their_cluster_and_racing_queries():
+    cache = QueryCache()
+    cache.put(_key("a"), "a", b"x", cache.generation("a"))
+    cache.put(_key("b"), "b", b"x", cache.generation("b"))
+    generation = cache.generation("a")
+    cache.invalidate("a")
+    assert cache.get(_key("a")) is None
+    assert cache.get(_key("b")) == b"x"
+    # A query sent before the write completed must not be cached
+    cache.put(_key("a"), "a", b"stale", generation)
+    assert cache.get(_key("a")) is None
+    cache.invalidate()
+    assert cache.get(_key("b")) is None
+
+
+def test_generations_of_uncached_clusters_are_pruned():
+    cache = QueryCache()
+    cache.put(_key("kept"), "kept", b"x", cache.generation("kept"))
+    generation = cache.generation("gone")
+    for i in range(1000):
+        cache.invalidate(str(i))
+    cache.invalidate("gone")
+    assert len(cache._generations) < 200
+    assert cache.get(_key("kept")) == b"x"
+    # A query that raced a write to a pruned cluster is still not cached
+    for i in range(1000, 2000):
+        cache.invalidate(str(i))
+    assert "gone" not in cache._generations
+    cache.put(_key("gone"), "gone", b"stale", generation)
+    assert cache.get(_key("gone")) is None
+
+
+def test_semantic_cache_serves_near_queries():
+    cache = SemanticQueryCache(max_distance=0.01, max_entries=2)
+    context = cache.context(None, "c", 2, None, None, ["distances"])
+    body = {"ids": [["a", "b"], ["c", "d"]], "distances": [[0.1, 0.2], [0.3, 0.4]], "embeddings": None}
+    cache.put(context, "c", [[1.0, 0.0], [0.0, 1.0]], body, cache.generation("c"))
+
+    hit = cache.get(context, [[0.0, 1.001], [1.0, 0.0001]])
+    # The distances were measured from the cached queries, so a hit leaves them out
+    assert hit == {"ids": [["c", "d"], ["a", "b"]], "distances": None, "embeddings": None}
+    assert cache.get(context, [[1.0, 1.0]]) is None
+    assert cache.get(cache.context(None, "c", 3, None, None, ["distances"]), [[1.0, 0.0]]) is None
+
+    cache.put(context, "c", [[1.0, 1.0]], {"ids": [["e"]]}, cache.generation("c"))
+    assert cache.evictions == 1
+    cache.invalidate("c")
+    assert cache.get(context, [[1.0, 1.0]]) is None
+    assert (cache.hits, cache.stats()["entries"]) == (1, 0)
+
+
+def test_semantic_lookup_purges_expired_rows():
+    cache = SemanticQueryCache(ttl=0.05)
+    context = cache.context(None, "c", 1, None, None, ["distances"])
+    cache.put(context, "c", [[1.0, 0.0], [0.0, 1.0]], {"ids": [["a"], ["b"]]}, cache.generation("c"))
+    time.sleep(0.06)
+    cache.put(context, "c", [[1.0, 1.0]], {"ids": [["e"]]}, cache.generation("c"))
+    assert cache.get(context, [[1.0, 0.0]]) is None
+    assert cache.stats()["entries"] == 1
+    assert cache.get(context, [[1.0, 1.0]]) == {"ids": [["e"]]}
+    time.sleep(0.06)
+    assert cache.get(context, [[1.0, 1.0]]) is None
+    assert cache.stats()["entries"] == 0 and not cache._index
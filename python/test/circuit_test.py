@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from bagel.api.circuit import CircuitBreaker, CircuitBreakers, route_class
+from bagel.errors import CircuitOpenError
+
+
+def test_route_classes():
+    base = "http://host/api/v1"
+    assert route_class(base + "/clusters/c/query") == "query"
+    assert route_class(base + "/clusters/c/upsert") == "write"
+    assert route_class(base + "/clusters/c/add_image_url") == "write"
+    assert route_class(base + "/datasets/d/upload-dataset-git") == "dataset"
+    assert route_class(base + "/clusters") == "other"
+
+
+def test_opens_on_failures_then_half_open_probes_close_it():
+    breaker = CircuitBreaker(min_calls=4, open_seconds=0.05, half_open_calls=2)
+    for failed in [False, True, False, True]:
+        breaker.before_call()
+        breaker.record(0.01, failed)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    breaker.before_call()
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(0.01, False)
+    breaker.record(0.01, False)
+    assert breaker.state == "closed"
+
+
+def test_slow_calls_and_failed_probe_reopen():
+    breaker = CircuitBreaker(
+        min_calls=2, slow_call_seconds=0.1, open_seconds=0.01, half_open_calls=1
+    )
+    breaker.record(0.5, False)
+    breaker.record(0.5, False)
+    assert breaker.state == "open"
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record(0.01, True)
+    assert breaker.state == "open"
+
+
+def test_breakers_are_per_host_and_route_class():
+    breakers = CircuitBreakers(min_calls=1)
+    name, query = breakers.get("http://a/api/v1/clusters/c/query")
+    query.record(0.01, True)
+    assert breakers.get("http://a/api/v1/clusters/c/add")[1].state == "closed"
+    assert breakers.states() == {"a query": "open", "a write": "closed"}
+    assert CircuitBreakers(enabled=False).get("http://a/") is None
@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from bagel.api.coalescing import QueryCoalescer
+
+CONTEXT = QueryCoalescer.context(None, "c", [[0.0]], None, 1, None, None, ["distances"])
+
+
+def _echo(calls):
+    def fetch(embeddings, texts):
+        calls.append(len(embeddings))
+        return {
+            "ids": [[str(e[0])] for e in embeddings],
+            "distances": [[e[0]] for e in embeddings],
+            "embeddings": None,
+        }
+
+    return fetch
+
+
+def test_concurrent_queries_share_one_request():
+    coalescer = QueryCoalescer(window=0.2, max_batch=8)
+    calls = []
+    with ThreadPoolExecutor(8) as executor:
+        futures = [
+            executor.submit(coalescer.run, CONTEXT, [[float(i)]], None, _echo(calls))
+            for i in range(8)
+        ]
+        results = [f.result() for f in futures]
+    assert calls == [8]
+    for i, body in enumerate(results):
+        assert body == {"ids": [[str(float(i))]], "distances": [[float(i)]], "embeddings": None}
+    assert coalescer.stats() == {"queries": 8, "requests": 1}
+
+
+def test_errors_reach_every_caller():
+    coalescer = QueryCoalescer(window=0.1)
+    barrier = threading.Barrier(2)
+
+    def fetch(embeddings, texts):
+        raise RuntimeError("down")
+
+    def call():
+        barrier.wait()
+        return coalescer.run(CONTEXT, [[1.0]], None, fetch)
+
+    with ThreadPoolExecutor(2) as executor:
+        futures = [executor.submit(call) for _ in range(2)]
+        for future in futures:
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert coalescer.requests == 1
+
+
+def test_context_keys_filters_by_value():
+    def context(where):
+        return QueryCoalescer.context(None, "c", [[0.0]], None, 1, where, None, ["distances"])
+
+    assert context({"a": 1, "b": "x"}) == context({"b": "x", "a": 1})
+    # Values that print alike but differ in type are kept apart
+    assert context({"a": 1}) != context({"a": "1"})
+    assert context({"a": np.int64(5)}) != context({"a": "5"})
+    # A filter that cannot be keyed is not coalesced
+    assert context({"a": {"$in": np.array([1, 2])}}) is None
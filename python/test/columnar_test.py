@@ -0,0 +1,27 @@
+import numpy as np
+from bagel.api.columnar import ColumnarGetResult, ColumnarQueryResult
+from bagel.api.encoding import encode_embeddings
+
+
+def test_query_result_is_padded_and_lazily_converted():
+    result = ColumnarQueryResult.from_body(
+        {
+            "ids": [["a", "bb"], ["ccc"]],
+            "distances": [[0.5, 1.5], [2.5]],
+            "embeddings": [[[1, 2], [3, 4]], [[5, 6]]],
+        }
+    )
+    assert result.ids.shape == (2, 2)
+    assert result.embeddings.dtype == np.float32
+    assert result.embeddings.shape == (2, 2, 2)
+    assert np.isnan(result.distances[1, 1])
+    assert result["ids"] == [["a", "bb"], ["ccc"]]
+    assert result["embeddings"][1] == [[5.0, 6.0]]
+    assert result.get("documents") is None
+
+
+def test_get_result_from_encoded_block():
+    block = encode_embeddings([[1.0, 2.0], [3.0, 4.0]])
+    result = ColumnarGetResult.from_body({"ids": ["x", "y"], "embeddings": block})
+    assert result.embeddings.shape == (2, 2)
+    assert result.to_dict()["embeddings"] == [[1.0, 2.0], [3.0, 4.0]]
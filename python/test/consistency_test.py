@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from bagel.api.AsyncCluster import AsyncCluster
+from bagel.api.Cluster import Cluster
+from bagel.config import Settings, System
+
+
+class _LaggingAPI:
+    """Applies each write only after reads have seen the old state `lag` times"""
+
+    def __init__(self, lag=2, **settings):
+        self._system = System(Settings(**settings))
+        self.lag = lag
+        self.rows = {}
+        self.pending = []
+        self.gets = 0
+
+    def _write(self, ids, embeddings, metadatas, documents):
+        for i, id in enumerate(ids):
+            row = dict(self.rows.get(id, {}))
+            if embeddings is not None:
+                row["embeddings"] = list(embeddings[i])
+            if metadatas is not None:
+                row["metadatas"] = {**row.get("metadatas", {}), **metadatas[i]}
+            if documents is not None:
+                row["documents"] = documents[i]
+            self.pending.append((self.lag, id, row))
+
+    def _add(self, ids, cluster_id, embeddings, metadatas=None, documents=None, increment_index=True):
+        self._write(ids, embeddings, metadatas, documents)
+
+    def _upsert(self, cluster_id, ids, embeddings, metadatas=None, documents=None, increment_index=True):
+        self._write(ids, embeddings, metadatas, documents)
+
+    def _update(self, cluster_id, ids, embeddings=None, metadatas=None, documents=None):
+        self._write(ids, embeddings, metadatas, documents)
+
+    def _delete(self, cluster_id, ids=None, where=None, where_document=None):
+        self.pending.extend((self.lag, id, None) for id in ids)
+
+    def _get(self, cluster_id, ids=None, include=[], as_numpy=None):
+        self.gets += 1
+        still_pending = []
+        for lag, id, row in self.pending:
+            if lag > 0:
+                still_pending.append((lag - 1, id, row))
+            elif row is None:
+                self.rows.pop(id, None)
+            else:
+                self.rows[id] = row
+        self.pending = still_pending
+        found = [id for id in ids if id in self.rows]
+        result = {"ids": found}
+        for field in ("embeddings", "metadatas", "documents"):
+            result[field] = [self.rows[id].get(field) for id in found] if field in include else None
+        return result
+
+
+def _cluster(api):
+    return Cluster(api, name="c", id="0" * 32, cluster_size=0)
+
+
+def test_read_your_writes_waits_for_the_written_values():
+    api = _LaggingAPI(bagel_write_consistency="read_your_writes")
+    api.rows = {"a": {"embeddings": [0.0], "metadatas": {"n": 0}}}
+    cluster = _cluster(api)
+
+    # The ids already exist, so only the values show the upsert has landed
+    cluster.upsert(ids=["a", "b"], embeddings=[[1.0], [2.0]], metadatas=[{"n": 1}, {"n": 2}])
+    assert api.rows["a"] == {"embeddings": [1.0], "metadatas": {"n": 1}}
+    assert api.gets == 3
+
+    cluster.update(ids=["a"], metadatas=[{"m": 1}])
+    assert api.rows["a"]["metadatas"] == {"n": 1, "m": 1}
+
+    cluster.delete(ids=["a", "b"])
+    assert api.rows == {}
+
+    api.gets = 0
+    cluster.add(ids=["c"], embeddings=[[3.0]], consistency="none")
+    assert api.gets == 0
+
+
+def test_read_your_writes_times_out():
+    api = _LaggingAPI(
+        lag=1000, bagel_write_consistency="read_your_writes", bagel_consistency_timeout=0.2
+    )
+    cluster = _cluster(api)
+    with pytest.raises(TimeoutError):
+        cluster.add(ids=["a"], embeddings=[[1.0]])
+    api.rows = {"b": {"embeddings": [2.0]}}
+    with pytest.raises(TimeoutError):
+        cluster.delete(ids=["b"])
+    # A delete by filter cannot be checked, so it does not wait
+    api.gets = 0
+    cluster.delete(ids=["a"], where={"n": 1})
+    assert api.gets == 0
+
+
+def test_async_read_your_writes():
+    class _AsyncLaggingAPI(_LaggingAPI):
+        async def _upsert(self, *args, **kwargs):
+            super()._upsert(*args, **kwargs)
+
+        async def _get(self, *args, **kwargs):
+            return super()._get(*args, **kwargs)
+
+    async def run():
+        api = _AsyncLaggingAPI(bagel_write_consistency="read_your_writes")
+        api.rows = {"a": {"documents": "old"}}
+        cluster = AsyncCluster(api, name="c", id="0" * 32, cluster_size=0)
+        await cluster.upsert(ids=["a"], embeddings=[[1.0]], documents=["new"])
+        assert api.rows["a"]["documents"] == "new"
+
+        api.lag = 1000
+        api._system.settings.bagel_consistency_timeout = 0.2
+        with pytest.raises(TimeoutError):
+            await cluster.upsert(ids=["a"], embeddings=[[1.0]], documents=["newer"])
+
+    asyncio.run(run())
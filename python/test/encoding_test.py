@@ -0,0 +1,31 @@
+import numpy as np
+from bagel.api.encoding import (
+    EMBEDDING_ENCODINGS_HEADER,
+    decode_embeddings,
+    encode_embeddings,
+    server_supports,
+)
+
+
+def test_roundtrip():
+    embeddings = [[0.5, 1.25, -2.0], [3.0, 4.0, 5.5]]
+    encoded = encode_embeddings(embeddings)
+    assert encoded["shape"] == [2, 3]
+    assert decode_embeddings(encoded) == embeddings
+
+
+def test_query_blocks():
+    block = encode_embeddings(np.ones((2, 4), dtype=np.float64))
+    assert decode_embeddings([block, block]) == [[[1.0] * 4] * 2] * 2
+
+
+def test_ragged_falls_back_to_json():
+    embeddings = [[1.0, 2.0], [3.0]]
+    assert encode_embeddings(embeddings) is embeddings
+    assert decode_embeddings(embeddings) is embeddings
+
+
+def test_server_supports():
+    headers = {EMBEDDING_ENCODINGS_HEADER: "json, float32-base64"}
+    assert server_supports(headers, "float32-base64")
+    assert not server_supports({}, "float32-base64")
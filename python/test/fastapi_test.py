@@ -0,0 +1,172 @@
+import json
+import time
+import uuid
+
+import pytest
+import requests
+from requests import Response
+from requests.adapters import BaseAdapter
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+import bagel
+from bagel.api.encoding import EMBEDDING_ENCODINGS_HEADER, encode_embeddings
+from bagel.config import Settings
+
+
+class _Adapter(BaseAdapter):
+    """Answers requests without a network: respond(request) returns a (status, body)
+    pair, a (status, body, headers) triple or an exception to raise"""
+
+    def __init__(self, respond=lambda request: (200, {})):
+        super().__init__()
+        self.respond = respond
+        self.requests = []
+        self.closed = 0
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        result = self.respond(request)
+        if isinstance(result, Exception):
+            raise result
+        status, body, *headers = result
+        resp = Response()
+        resp.status_code = status
+        resp.headers.update(*headers)
+        resp._content = json.dumps(body).encode()
+        resp.request = request
+        resp.url = request.url
+        return resp
+
+    def close(self):
+        self.closed += 1
+
+
+def _client(adapter=None, **settings):
+    api = bagel.Client(
+        Settings(bagel_api_impl="rest", bagel_server_host="localhost", **settings)
+    )
+    if adapter is not None:
+        api._session.mount("http://", adapter)
+    return api
+
+
+def test_pool_is_sized_from_settings():
+    api = _client(bagel_http_pool_connections=3, bagel_http_pool_maxsize=7)
+    for prefix in ("http://", "https://"):
+        adapter = api._session.adapters[prefix]
+        assert (adapter._pool_connections, adapter._pool_maxsize) == (3, 7)
+
+
+def test_idle_session_is_dropped_before_a_request():
+    adapter = _Adapter(lambda request: (200, {"nanosecond heartbeat": 1}))
+    api = _client(adapter, bagel_http_keepalive_timeout=5.0)
+    api.ping()
+    assert adapter.closed == 0
+    api._last_request_time = time.monotonic() - 10
+    api.ping()
+    assert adapter.closed == 1
+    assert len(adapter.requests) == 2
+
+    adapter = _Adapter(lambda request: (200, {"nanosecond heartbeat": 1}))
+    api = _client(adapter, bagel_http_keepalive_timeout=None)
+    api._last_request_time = time.monotonic() - 3600
+    api.ping()
+    assert adapter.closed == 0
+
+
+def test_stop_closes_the_session():
+    adapter = _Adapter()
+    api = _client(adapter)
+    api.stop()
+    assert adapter.closed == 1
+
+
+def test_refused_connection_is_retried_for_writes():
+    refused = requests.ConnectionError(
+        MaxRetryError(None, "/add", NewConnectionError(None, "Connection refused"))
+    )
+    dropped = requests.ConnectionError(
+        ProtocolError("Connection aborted.", ConnectionResetError())
+    )
+    failures = [refused]
+
+    def respond(request):
+        if request.url.endswith("/add") and failures:
+            return failures.pop(0)
+        return 200, True
+
+    adapter = _Adapter(respond)
+    api = _client(adapter, bagel_retry_backoff_base=0)
+    # The refused attempt never reached the server, so the add is sent again
+    api._add(["a"], uuid.UUID(int=0), [[1.0]])
+    assert len(adapter.requests) == 2
+    # A dropped connection may have delivered the add, so it is not retried
+    failures.append(dropped)
+    with pytest.raises(requests.ConnectionError):
+        api._add(["b"], uuid.UUID(int=0), [[1.0]])
+    assert len(adapter.requests) == 3
+
+
+def test_only_transient_errors_are_retried():
+    errors = [requests.exceptions.ChunkedEncodingError("cut short")]
+
+    def respond(request):
+        return errors.pop(0) if errors else (200, {"nanosecond heartbeat": 1})
+
+    adapter = _Adapter(respond)
+    api = _client(adapter, bagel_retry_backoff_base=0)
+    api.ping()
+    assert len(adapter.requests) == 2
+    # A bad header fails the same way every time, so it is raised at once
+    errors.append(requests.exceptions.InvalidHeader("bad header"))
+    with pytest.raises(requests.exceptions.InvalidHeader):
+        api.ping()
+    assert len(adapter.requests) == 3
+
+
+def test_encoding_probe_is_remembered_only_once_it_succeeds():
+    server_up = False
+
+    def respond(request):
+        if request.url.endswith("/api/v1"):
+            if not server_up:
+                return 503, {}
+            return 200, {}, {EMBEDDING_ENCODINGS_HEADER: "json, float32-base64"}
+        return 200, True
+
+    adapter = _Adapter(respond)
+    api = _client(adapter, bagel_embedding_encoding="float32-base64", bagel_retry_backoff_base=0)
+    cluster_id = uuid.UUID(int=0)
+    api._add(["a"], cluster_id, [[1.0]])
+    # The failed probe falls back to JSON without deciding for later calls
+    assert json.loads(adapter.requests[-1].body)["embeddings"] == [[1.0]]
+    assert api._server_accepts_encoding is None
+
+    server_up = True
+    api._add(["b"], cluster_id, [[1.0]])
+    assert api._server_accepts_encoding is True
+    assert json.loads(adapter.requests[-1].body)["embeddings"] == encode_embeddings([[1.0]])
+
+
+def test_semantic_cache_with_coalescing():
+    def respond(request):
+        queries = json.loads(request.body)["query_embeddings"]
+        return 200, {
+            "ids": [[str(q[0])] for q in queries],
+            "distances": [[0.0] for _ in queries],
+            "embeddings": None,
+            "metadatas": None,
+            "documents": None,
+        }
+
+    adapter = _Adapter(respond)
+    api = _client(adapter, bagel_semantic_cache=True, bagel_coalesce_queries=True)
+    cluster_id = uuid.UUID(int=0)
+    assert api._query(cluster_id, [[1.0, 0.0]], n_results=1)["ids"] == [["1.0"]]
+    # A near query is answered from the row the first one stored
+    hit = api._query(cluster_id, [[1.0, 0.001]], n_results=1)
+    assert hit["ids"] == [["1.0"]]
+    assert hit["distances"] is None
+    assert api._query(cluster_id, [[1.0, 0.001]], n_results=1, as_numpy=True).distances is None
+    assert len(adapter.requests) == 1
+    assert api.semantic_cache.hits == 2
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from bagel.api.columnar import ColumnarQueryResult
+from bagel.api.filters import (
+    MetadataColumns,
+    compile_where,
+    compile_where_document,
+    filter_result,
+)
+
+METADATAS = [
+    {"i": 0, "kind": "a"},
+    {"i": 1, "kind": "b", "flag": True},
+    {"i": 2.5, "kind": "a"},
+    {"i": "3", "kind": "b"},
+    None,
+    {"kind": "c"},
+]
+
+
+@pytest.mark.parametrize(
+    "where, expected",
+    [
+        ({"kind": "a"}, [0, 2]),
+        ({"kind": {"$ne": "a"}}, [1, 3, 5]),
+        ({"i": {"$gte": 1}}, [1, 2]),
+        ({"i": {"$lt": 1}}, [0]),
+        ({"i": 1}, [1]),
+        ({"flag": {"$eq": 1}}, [1]),
+        ({"$or": [{"kind": "c"}, {"$and": [{"kind": "b"}, {"i": {"$gt": 0}}]}]}, [1, 5]),
+    ],
+)
+def test_predicate_and_mask_agree(where, expected):
+    compiled = compile_where(where)
+    assert [i for i, m in enumerate(METADATAS) if compiled(m)] == expected
+    columns = MetadataColumns(METADATAS)
+    assert np.flatnonzero(compiled.mask(columns)).tolist() == expected
+    # Columns are reused across filters
+    assert np.flatnonzero(compiled.mask(columns)).tolist() == expected
+
+
+def test_documents_and_caching():
+    documents = ["red apple", "green pear", None, "red pear"]
+    compiled = compile_where_document({"$and": [{"$contains": "red"}, {"$contains": "pear"}]})
+    assert compiled.mask(documents).tolist() == [False, False, False, True]
+    assert not compiled(None)
+    assert compile_where_document(None).mask(documents).all()
+
+    assert compile_where({"kind": "a"}) is compile_where({"kind": "a"})
+    assert compile_where({"i": 1}) is not compile_where({"i": 1.0})
+    compile_where({"$and": [{"a": 1}, {"b": 2}]})
+    # Filters are cached by value, types included, so a lookalike is validated anew
+    with pytest.raises(ValueError):
+        compile_where({"$and": ({"a": 1}, {"b": 2})})
+    compile_where({"1": "a"})
+    with pytest.raises(ValueError):
+        compile_where({1: "a"})
+    with pytest.raises(ValueError):
+        compile_where({"i": {"$gt": "1"}})
+
+
+def test_filter_result_keeps_shape():
+    result = {
+        "ids": [["0", "1", "2"], ["3"]],
+        "embeddings": None,
+        "metadatas": [METADATAS[:3], METADATAS[3:4]],
+        "documents": [["x", "y", "z"], ["w"]],
+        "distances": [[0.1, 0.2, 0.3], [0.4]],
+    }
+    filtered = filter_result(result, where={"kind": "a"})
+    assert filtered["ids"] == [["0", "2"], []]
+    assert filtered["distances"] == [[0.1, 0.3], []]
+
+    columnar = filter_result(ColumnarQueryResult.from_body(result), where={"i": {"$gt": 0}})
+    assert columnar.lengths.tolist() == [2, 0]
+    assert columnar["ids"] == [["1", "2"], []]
+    assert columnar["documents"] == [["y", "z"], []]
+    assert np.allclose(columnar.distances[0], [0.2, 0.3])
+
+    got = {"ids": ["0", "1"], "embeddings": None, "metadatas": None, "documents": ["x", "y"]}
+    assert filter_result(got, where_document={"$contains": "y"})["ids"] == ["1"]
+    with pytest.raises(ValueError):
+        filter_result(got, where={"kind": "a"})
@@ -0,0 +1,127 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+from bagel.api.hedging import Hedger
+
+
+def _warm(hedger, latency=0.01, n=20):
+    for _ in range(n):
+        hedger._observe(latency)
+
+
+def test_slow_request_is_hedged():
+    hedger = Hedger(min_samples=20)
+    _warm(hedger)
+    calls = itertools.count()
+    discarded = []
+
+    def send():
+        if next(calls) == 0:
+            time.sleep(0.3)
+            return "slow"
+        return "fast"
+
+    start = time.monotonic()
+    assert hedger.run(send, discard=discarded.append) == "fast"
+    assert time.monotonic() - start < 0.25
+    assert (hedger.hedges, hedger.hedge_wins) == (1, 1)
+    time.sleep(0.4)
+    assert discarded == ["slow"]
+
+
+def test_hedge_answers_when_the_primary_fails():
+    hedger = Hedger(min_samples=20)
+    _warm(hedger)
+    calls = itertools.count()
+
+    def send():
+        if next(calls) == 0:
+            time.sleep(0.1)
+            raise ConnectionError("reset")
+        return "fast"
+
+    assert hedger.run(send) == "fast"
+    assert hedger.hedge_wins == 1
+
+    def refused():
+        raise ConnectionError("refused")
+
+    # A primary that fails before its hedge is due raises
+    hedger = Hedger(min_samples=20)
+    _warm(hedger, latency=1.0)
+    with pytest.raises(ConnectionError):
+        hedger.run(refused)
+    assert hedger.hedges == 0
+
+
+def test_delay_tracks_the_window_percentile():
+    hedger = Hedger(percentile=0.5, min_delay=0.0, window=10, min_samples=1)
+    for latency in [5, 1, 4, 2, 3]:
+        hedger._observe(latency)
+    assert hedger.delay() == 3
+    # The five 5s evict nothing yet; five more 0s evict 5, 1, 4, 2, 3
+    for latency in [5] * 5 + [0] * 5:
+        hedger._observe(latency)
+    assert hedger.delay() == 5
+    assert hedger._sorted == sorted(hedger._latencies)
+
+
+def test_busy_pool_sends_on_the_callers_thread():
+    hedger = Hedger(min_samples=20, max_workers=1)
+    _warm(hedger, latency=1.0)
+    release = threading.Event()
+    threads = []
+
+    def send():
+        threads.append(threading.current_thread())
+        release.wait(5)
+
+    # The first call holds the only worker, so the second is sent inline, unhedged
+    first = threading.Thread(target=hedger.run, args=(send,))
+    first.start()
+    time.sleep(0.05)
+    threading.Timer(0.05, release.set).start()
+    hedger.run(send)
+    first.join()
+    assert threads[0] is not first and threads[0].name.startswith("bagel-hedge")
+    assert threads[1] is threading.current_thread()
+
+    hedger.shutdown()
+    hedger.run(send)
+    assert threads[2] is threading.current_thread()
+
+
+def test_no_hedging_before_enough_samples_or_over_the_rate_cap():
+    hedger = Hedger(min_samples=5, max_ratio=0.0)
+    assert hedger.delay() is None
+    assert hedger.run(lambda: 1) == 1
+    _warm(hedger, n=1000)
+    for _ in range(10):
+        hedger.run(lambda: time.sleep(0.03))
+    # A full bucket allows a burst of 5 hedges, then max_ratio=0 allows none
+    assert hedger.hedges == 5
+    assert hedger.requests == 11
+
+
+def test_async_loser_is_cancelled():
+    hedger = Hedger()
+    _warm(hedger)
+    cancelled = []
+    calls = itertools.count()
+
+    async def send():
+        if next(calls) == 0:
+            try:
+                await asyncio.sleep(1)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return "slow"
+        return "fast"
+
+    assert asyncio.run(hedger.arun(send)) == "fast"
+    assert cancelled == [True]
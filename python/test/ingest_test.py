@@ -0,0 +1,243 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import bagel.api.ingest as ingest
+from bagel.api.Cluster import Cluster
+from bagel.api.ingest import (
+    BufferedWriter,
+    plan_batches,
+    stream_batches,
+    write_batches,
+    write_stream,
+)
+from bagel.config import Settings, System
+from bagel.errors import BufferedWriteError
+
+
+def test_plan_batches_by_count_and_bytes():
+    ids = [str(i) for i in range(10)]
+    embeddings = np.zeros((10, 10), dtype=np.float32)
+    assert plan_batches((ids, embeddings, None, None), batch_size=4, max_bytes=None) == [
+        (0, 4),
+        (4, 8),
+        (8, 10),
+    ]
+    batches = plan_batches((ids, embeddings, None, None), batch_size=100, max_bytes=500)
+    assert len(batches) == 5
+    assert batches[0] == (0, 2)
+
+
+def test_oversized_record_gets_its_own_batch():
+    ids = ["a", "b"]
+    documents = ["x" * 1000, "y"]
+    assert plan_batches((ids, None, None, documents), max_bytes=100) == [(0, 1), (1, 2)]
+
+
+def test_write_batches_reports_failures():
+    ids = [str(i) for i in range(6)]
+
+    def write(ids, embeddings, metadatas, documents):
+        if "3" in ids:
+            raise RuntimeError("boom")
+
+    summary = write_batches(write, (ids, None, None, None), [(0, 2), (2, 4), (4, 6)], workers=2)
+    assert summary["batches"] == 3
+    assert summary["records_failed"] == 2
+    assert summary["failed_batches"][0]["ids"] == ["2", "3"]
+    assert summary["failed_batches"][0]["error"] == "boom"
+
+
+def test_write_batches_bounds_submitted_batches(monkeypatch):
+    sliced = []
+    slice_columns = ingest.slice_columns
+    monkeypatch.setattr(
+        ingest,
+        "slice_columns",
+        lambda columns, start, end: sliced.append(start) or slice_columns(columns, start, end),
+    )
+    release = threading.Event()
+    sliced_before_release = []
+
+    def write(ids, embeddings, metadatas, documents):
+        release.wait(5)
+
+    def unblock():
+        sliced_before_release.append(len(sliced))
+        release.set()
+
+    ids = [str(i) for i in range(20)]
+    batches = [(i, i + 1) for i in range(20)]
+    threading.Timer(0.1, unblock).start()
+    summary = write_batches(write, (ids, None, None, None), batches, workers=2)
+    assert summary["records"] == 20 and summary["records_failed"] == 0
+    assert sorted(sliced) == list(range(20))
+    # While the writes block, only 2 * workers batches have been sliced
+    assert sliced_before_release == [4]
+
+
+def test_write_stream_bounds_in_flight_batches():
+    in_flight = []
+    lock = threading.Lock()
+    peak = [0]
+    written = []
+
+    def write(ids, embeddings, metadatas, documents):
+        with lock:
+            in_flight.append(1)
+            peak[0] = max(peak[0], len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.pop()
+            written.extend(ids)
+
+    records = ((str(i), [float(i)], None, None) for i in range(100))
+    summary = write_stream(write, stream_batches(records, batch_size=10), max_in_flight=2)
+    assert summary["records"] == 100
+    assert summary["batches"] == 10
+    assert sorted(written, key=int) == [str(i) for i in range(100)]
+    assert peak[0] <= 2
+
+
+def test_invalid_streamed_id_fails_its_batch():
+    records = [("a", [1.0], None, None), (7, [2.0], None, None), ("b", [3.0], None, None)]
+    summary = write_stream(
+        lambda *columns: None, stream_batches(iter(records), batch_size=2, max_bytes=10_000)
+    )
+    assert summary["records_failed"] == 2
+    assert summary["failed_batches"][0]["ids"] == ["a", 7]
+    assert "Expected ID to be a str" in summary["failed_batches"][0]["error"]
+
+
+class _FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    def _delete(self, cluster_id, ids, where, where_document):
+        self.calls.append(("delete", ids, where))
+
+
+class _FakeCluster:
+    id = "cluster"
+
+    def __init__(self):
+        self._client = _FakeClient()
+
+    def _write_batch(self, ids, embeddings, metadatas, documents, increment_index=True, upsert=False):
+        if "bad" in ids:
+            raise RuntimeError("rejected")
+        self._client.calls.append(("upsert" if upsert else "add", ids, None))
+
+
+def test_buffered_writer_coalesces_in_order():
+    cluster = _FakeCluster()
+    with BufferedWriter(cluster, max_records=3, flush_interval=None) as writer:
+        for i in range(5):
+            writer.add(ids=[str(i)], documents=["doc"])
+        writer.upsert(ids=["1"], documents=["new"])
+        writer.upsert(ids=["1"], documents=["newer"])
+        writer.delete(ids=["2"])
+    assert cluster._client.calls == [
+        ("add", ["0", "1", "2"], None),
+        ("add", ["3", "4"], None),
+        ("upsert", ["1"], None),
+        ("upsert", ["1"], None),
+        ("delete", ["2"], None),
+    ]
+
+
+def test_buffered_writer_raises_failures_on_close():
+    writer = BufferedWriter(_FakeCluster(), flush_interval=None)
+    writer.add(ids=["ok", "bad"], documents=["a", "b"])
+    with pytest.raises(BufferedWriteError) as e:
+        writer.close()
+    assert e.value.failed_batches[0]["ids"] == ["ok", "bad"]
+
+
+def test_buffered_writer_keeps_every_record_under_concurrent_writers():
+    cluster = _FakeCluster()
+    written = cluster._client.calls
+    write_batch = cluster._write_batch
+
+    def slow_write(*args, **kwargs):
+        time.sleep(0.001)
+        write_batch(*args, **kwargs)
+
+    cluster._write_batch = slow_write
+    writer = BufferedWriter(cluster, max_records=7, flush_interval=None, max_pending_batches=1)
+
+    def add(thread):
+        for i in range(200):
+            writer.add(ids=[f"{thread}-{i}"], documents=["doc"])
+
+    threads = [threading.Thread(target=add, args=(t,)) for t in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    ids = [id for _, batch, _ in written for id in batch]
+    assert sorted(ids) == sorted(f"{t}-{i}" for t in range(4) for i in range(200))
+    for t in range(4):
+        # Each thread's records are sent in the order it added them
+        assert [id for id in ids if id.startswith(f"{t}-")] == [f"{t}-{i}" for i in range(200)]
+
+
+class _RecordingAPI:
+    def __init__(self):
+        self._system = System(Settings())
+        self.calls = []
+
+    def _add(self, ids, cluster_id, embeddings, metadatas=None, documents=None, increment_index=True):
+        self.calls.append(("add", ids, increment_index))
+
+    def _upsert(self, cluster_id, ids, embeddings, metadatas=None, documents=None, increment_index=True):
+        self.calls.append(("upsert", ids, increment_index))
+
+    def create_index(self, cluster_name):
+        self.calls.append(("create_index", cluster_name, None))
+
+
+def test_bulk_load_defers_indexing_to_exit():
+    api = _RecordingAPI()
+    cluster = Cluster(api, name="c", id="0" * 32, cluster_size=0)
+    with cluster.bulk_load():
+        cluster.add(ids=["a"], embeddings=[[1.0, 2.0]])
+        with cluster.bulk_load():
+            cluster.add_bulk(ids=["b", "c"], embeddings=[[1.0, 2.0]] * 2, workers=1)
+        cluster.upsert(ids=["a"], embeddings=[[3.0, 4.0]])
+    cluster.add(ids=["d"], embeddings=[[1.0, 2.0]])
+    assert api.calls == [
+        ("add", ["a"], False),
+        ("add", ["b", "c"], False),
+        ("upsert", ["a"], False),
+        ("create_index", "c", None),
+        ("add", ["d"], True),
+    ]
+
+
+def test_bulk_load_is_local_to_its_thread_and_skips_the_index_on_failure():
+    api = _RecordingAPI()
+    cluster = Cluster(api, name="c", id="0" * 32, cluster_size=0)
+    with cluster.bulk_load():
+        other = threading.Thread(target=cluster.add, kwargs={"ids": ["x"], "embeddings": [[0.0]]})
+        other.start()
+        other.join()
+        with cluster.buffered(flush_interval=None) as writer:
+            writer.add(ids=["y"], embeddings=[[0.0]])
+    assert api.calls == [
+        ("add", ["x"], True),
+        ("add", ["y"], False),
+        ("create_index", "c", None),
+    ]
+
+    api.calls = []
+    with pytest.raises(RuntimeError):
+        with cluster.bulk_load():
+            cluster.add(ids=["z"], embeddings=[[0.0]])
+            raise RuntimeError("load failed")
+    cluster.add(ids=["w"], embeddings=[[0.0]])
+    assert api.calls == [("add", ["z"], False), ("add", ["w"], True)]
@@ -0,0 +1,69 @@
+import numpy as np
+
+from bagel.api.ivf import IVFIndex, kmeans, measure_recall
+from bagel.api.search import nearest
+
+
+def _clustered(n=4000, dim=16, centers=40, seed=0):
+    rng = np.random.default_rng(seed)
+    means = rng.normal(scale=4.0, size=(centers, dim))
+    data = means[rng.integers(centers, size=n)] + rng.normal(size=(n, dim))
+    return data.astype(np.float32)
+
+
+def test_kmeans_finds_separated_clusters():
+    data = np.array([[0, 0], [0, 1], [10, 10], [10, 11], [10, 12]], dtype=np.float32)
+    centroids = kmeans(data, 2, seed=1)
+    assert np.allclose(sorted(centroids.tolist()), [[0, 0.5], [10, 11]])
+
+
+def test_recall_grows_with_nprobe():
+    data = _clustered()
+    queries = data[:50] + 0.1
+    index = IVFIndex(data.shape[1], n_lists=64)
+    index.train(data)
+    index.add(np.arange(len(data)), data)
+    low = measure_recall(index, data, queries, k=10, nprobe=1)["recall"]
+    high = measure_recall(index, data, queries, k=10, nprobe=16)["recall"]
+    assert low <= high
+    assert high >= 0.9
+    assert measure_recall(index, data, queries, k=10, nprobe=64)["recall"] == 1.0
+
+    pq = IVFIndex(data.shape[1], n_lists=64, pq_subvectors=8)
+    pq.train(data)
+    pq.add(np.arange(len(data)), data)
+    assert measure_recall(pq, data, queries, k=10, nprobe=16)["recall"] >= 0.85
+
+
+def test_incremental_updates_and_persistence(tmp_path):
+    data = _clustered(n=2000)
+    index = IVFIndex(data.shape[1], space="cosine", n_lists=16, nprobe=16)
+    index.train(data, rows=np.arange(1000))
+    index.add(np.arange(1000), data[:1000])
+
+    # Rows 1000 and up were never added and are searched exactly
+    rows, distances = index.search(data[1500:1501], 1, data)
+    assert rows.tolist() == [[1500]]
+    assert abs(distances[0][0]) < 1e-5
+
+    # Moving a row to another vector and dropping rows
+    data[3] = data[1700]
+    index.add(np.array([3]), data[3:4])
+    allowed = np.ones(len(data), dtype=bool)
+    allowed[1700] = False
+    assert index.search(data[1700:1701], 1, data, allowed=allowed)[0].tolist() == [[3]]
+    index.remove(np.array([3]))
+    allowed[3] = False
+    assert 3 not in index.search(data[1700:1701], 5, data, allowed=allowed)[0]
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path)
+    assert loaded.space == "cosine" and loaded.nprobe == 16
+    queries = data[:20]
+    assert np.array_equal(
+        loaded.search(queries, 5, data, allowed=allowed)[0],
+        index.search(queries, 5, data, allowed=allowed)[0],
+    )
+    exact = nearest(queries, data, 5, "cosine", candidates=np.flatnonzero(allowed))[0]
+    assert np.array_equal(index.search(queries, 5, data, allowed=allowed)[0], exact)
@@ -0,0 +1,106 @@
+import numpy as np
+import pytest
+
+import bagel
+from bagel.config import Settings
+from bagel.errors import DuplicateIDError
+
+
+def _client(**settings):
+    return bagel.Client(Settings(bagel_api_impl="local", **settings))
+
+
+def _add(cluster, n=50, dim=8):
+    embeddings = np.random.default_rng(0).normal(size=(n, dim)).astype(np.float32)
+    cluster.add(
+        ids=[str(i) for i in range(n)],
+        embeddings=embeddings,
+        metadatas=[{"i": i, "parity": "odd" if i % 2 else "even"} for i in range(n)],
+        documents=[f"doc {i}" for i in range(n)],
+    )
+    return embeddings
+
+
+def test_add_get_find_and_filters():
+    cluster = _client().get_or_create_cluster("c")
+    embeddings = _add(cluster)
+    assert cluster.count() == 50
+    with pytest.raises(DuplicateIDError):
+        cluster.add(ids=["3"], embeddings=embeddings[:1])
+
+    result = cluster.find(query_embeddings=embeddings[:2], n_results=4, where={"parity": "even"})
+    squared = ((embeddings[:2, None, :] - embeddings[None, ::2, :]) ** 2).sum(-1)
+    expected = squared.argsort(axis=1)[:, :4] * 2
+    assert result["ids"] == [[str(i) for i in row] for row in expected]
+    assert np.allclose(result["distances"], np.sort(squared, axis=1)[:, :4], atol=1e-4)
+
+    got = cluster.get(
+        where={"$or": [{"i": {"$lt": 2}}, {"parity": {"$eq": "odd"}}]},
+        where_document={"$contains": "doc 4"},
+        include=["metadatas"],
+    )
+    assert got["ids"] == ["41", "43", "45", "47", "49"]
+    assert cluster.get(where={"parity": {"$gt": 1}}, include=[])["ids"] == []
+    assert cluster.get(limit=2, offset=3, include=[])["ids"] == ["3", "4"]
+
+
+def test_deletes_and_upserts_reuse_rows():
+    client = _client()
+    cluster = client.get_or_create_cluster("c")
+    embeddings = _add(cluster, n=10)
+    cluster.delete(ids=["0", "1"])
+    assert cluster.count() == 8
+    assert cluster.find(query_embeddings=embeddings[0], n_results=1, include=[])["ids"] != [["0"]]
+    cluster.upsert(ids=["5", "new"], embeddings=embeddings[:2], documents=["five", "new"])
+    assert cluster.count() == 9
+    # The new record took a freed row
+    assert client._vectors[str(cluster.id)].size == 10
+    got = cluster.get(ids=["5", "new"], include=["documents", "embeddings"])
+    assert got["documents"] == ["five", "new"]
+    assert np.allclose(got["embeddings"], embeddings[:2])
+    assert cluster.find(query_embeddings=embeddings[1], n_results=1, include=[])["ids"] == [["new"]]
+
+
+def test_data_persists_across_clients(tmp_path):
+    settings = dict(persist_directory=str(tmp_path), sqlite_database="bagel.sqlite3")
+    client = _client(**settings)
+    cluster = client.create_cluster("c", metadata={"hnsw:space": "cosine"})
+    embeddings = _add(cluster, n=300)
+    client.persist()
+
+    reopened = _client(**settings).get_cluster("c")
+    assert reopened.count() == 300
+    assert reopened.embedding_size == 8
+    result = reopened.find(query_embeddings=embeddings[7] * 3, n_results=1, include=["distances"])
+    assert result["ids"] == [["7"]]
+    assert abs(result["distances"][0][0]) < 1e-5
+
+
+def test_create_index_keeps_find_current(tmp_path):
+    settings = dict(
+        persist_directory=str(tmp_path),
+        sqlite_database="bagel.sqlite3",
+        bagel_local_ivf_lists=8,
+        bagel_local_ivf_nprobe=8,
+    )
+    client = _client(**settings)
+    cluster = client.get_or_create_cluster("c")
+    embeddings = _add(cluster, n=200)
+    cluster.create_index()
+    assert client.index("c").trained
+
+    cluster.delete(ids=["0"])
+    cluster.upsert(ids=["1", "new"], embeddings=np.stack([embeddings[0], embeddings[2] + 0.001]))
+    result = cluster.find(query_embeddings=embeddings[[0, 2]], n_results=2, include=[])
+    assert result["ids"][0][0] == "1"
+    assert result["ids"][1] == ["2", "new"]
+    assert cluster.find(
+        query_embeddings=embeddings[2], n_results=1, where={"parity": "even"}, include=[]
+    )["ids"] == [["2"]]
+    client.persist()
+
+    reopened = _client(**settings)
+    assert reopened.index("c").nprobe == 8
+    result = reopened.get_cluster("c").find(query_embeddings=embeddings[[0, 2]], n_results=2, include=[])
+    assert result["ids"][0][0] == "1"
+    assert result["ids"][1] == ["2", "new"]
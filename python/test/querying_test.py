@@ -0,0 +1,121 @@
+import threading
+import time
+
+import numpy as np
+
+from bagel.api.columnar import ColumnarQueryResult
+from bagel.api.querying import map_ordered
+from bagel.api.timeouts import deadline, remaining
+
+
+def test_map_ordered_keeps_input_order_and_bounds_in_flight():
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+
+    def slow(i):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.01 * (i % 3))
+        with lock:
+            running[0] -= 1
+        return i
+
+    assert list(map_ordered(slow, range(20), workers=3)) == list(range(20))
+    assert peak[0] <= 3
+
+
+def test_map_ordered_carries_the_deadline():
+    with deadline(5):
+        results = map_ordered(lambda _: remaining(), range(2), workers=2)
+    assert all(0 < left <= 5 for left in results)
+
+
+class _QueryAPI:
+    def __init__(self):
+        from bagel.config import Settings, System
+
+        self._system = System(Settings())
+        self.batches = []
+
+    def _query(self, cluster_id, query_embeddings, query_texts, n_results, where, where_document, include, as_numpy=None):
+        self.batches.append(len(query_embeddings))
+        k = min(n_results, len(query_embeddings))
+        body = {
+            "ids": [[str(e[0])] * k for e in query_embeddings],
+            "distances": [[float(e[0])] * k for e in query_embeddings],
+            "embeddings": None,
+        }
+        return ColumnarQueryResult.from_body(body) if as_numpy else body
+
+
+def test_find_many_batches_and_stacks_in_order():
+    from bagel.api.Cluster import Cluster
+
+    api = _QueryAPI()
+    cluster = Cluster(api, name="c", id="0" * 32, cluster_size=0)
+    queries = np.arange(10, dtype=np.float32).reshape(10, 1)
+    result = cluster.find_many(query_embeddings=queries, n_results=3, batch_size=4, include=["distances"])
+    assert sorted(api.batches) == [2, 4, 4]
+    assert isinstance(result, ColumnarQueryResult)
+    assert result.distances.shape == (10, 3)
+    # The last batch has only 2 results per query and is padded
+    assert list(result.lengths) == [3] * 8 + [2, 2]
+    assert result["ids"][9] == ["9.0", "9.0"]
+    streamed = list(cluster.find_many(query_embeddings=queries, batch_size=4, stream=True, include=["distances"]))
+    assert [row[0] for part in streamed for row in part["ids"]] == [str(float(i)) for i in range(10)]
+
+
+class _PagedAPI:
+    def __init__(self, n):
+        from bagel.config import Settings, System
+
+        self._system = System(Settings())
+        self.n = n
+        self.offsets = []
+
+    def _get(self, cluster_id, ids, where, sort, limit, offset, where_document=None, include=None, as_numpy=None):
+        self.offsets.append(offset)
+        page = [str(i) for i in range(offset, min(offset + limit, self.n))]
+        return {"ids": page, "embeddings": None, "metadatas": [{"i": int(i)} for i in page], "documents": None}
+
+
+def test_iter_walks_all_pages_and_stops_at_the_end():
+    from bagel.api.Cluster import Cluster
+
+    api = _PagedAPI(25)
+    cluster = Cluster(api, name="c", id="0" * 32, cluster_size=0)
+    pages = list(cluster.iter(page_size=10))
+    assert [len(page["ids"]) for page in pages] == [10, 10, 5]
+    assert set(api.offsets) <= {0, 10, 20, 30}
+    records = list(cluster.iter(page_size=10, records=True))
+    assert [r["id"] for r in records] == [str(i) for i in range(25)]
+    assert records[3] == {"id": "3", "embedding": None, "metadata": {"i": 3}, "document": None}
+
+
+def test_scan_reads_every_partition_and_resumes():
+    from bagel.api.querying import ScanProgress, scan_partitions
+
+    api = _PagedAPI(95)
+    fetch = lambda offset, limit: api._get(None, None, None, None, limit, offset)
+    assert ScanProgress.plan(95, 4).partitions == [[0, 0, 23], [23, 23, 47], [47, 47, 71], [71, 71, 95]]
+
+    progress = ScanProgress.plan(95, 4)
+    scan = scan_partitions(fetch, progress, page_size=10, workers=2)
+    seen = []
+    for page in scan:
+        seen.extend(page["ids"])
+        if len(seen) >= 30:
+            break
+    scan.close()
+    saved = progress.to_dict()
+    assert not progress.done
+
+    resumed = ScanProgress.from_dict(saved)
+    for page in scan_partitions(fetch, resumed, page_size=10, workers=3):
+        seen.extend(page["ids"])
+    assert resumed.done
+    # Only the page being handled when the scan stopped may be read twice
+    assert sorted(set(seen), key=int) == [str(i) for i in range(95)]
+    assert len(seen) - 95 <= 10
@@ -0,0 +1,203 @@
+import numpy as np
+import pytest
+
+from bagel.api.columnar import ColumnarGetResult
+from bagel.api.ivf import assign
+from bagel.api.replica import LocalCluster
+
+
+class _ClusterAPI:
+    def __init__(self, embeddings):
+        from bagel.config import Settings, System
+
+        self._system = System(Settings())
+        self.embeddings = embeddings
+
+    def _get(self, cluster_id, ids, where, sort, limit, offset, where_document=None, include=None, as_numpy=None):
+        rows = range(offset, min(offset + limit, len(self.embeddings)))
+        return ColumnarGetResult(
+            ids=np.array([str(i) for i in rows], dtype=np.str_),
+            embeddings=self.embeddings[offset : offset + limit],
+            metadatas=[{"parity": i % 2, "i": i} for i in rows],
+            documents=[f"doc {i}" for i in rows],
+        )
+
+
+def _cluster(n=50, dim=8):
+    from bagel.api.Cluster import Cluster
+
+    embeddings = np.random.default_rng(0).normal(size=(n, dim)).astype(np.float32)
+    return Cluster(_ClusterAPI(embeddings), name="c", id="0" * 32, cluster_size=0), embeddings
+
+
+def test_find_matches_exact_search(tmp_path):
+    cluster, embeddings = _cluster()
+    replica = cluster.replicate_local(path=str(tmp_path), page_size=7)
+    assert isinstance(replica._embeddings, np.memmap)
+    queries = embeddings[:3] + 0.01
+    result = replica.find(query_embeddings=queries, n_results=5, where={"parity": 0})
+    even = embeddings[::2]
+    expected = ((queries[:, None, :] - even[None, :, :]) ** 2).sum(-1).argsort(axis=1)[:, :5] * 2
+    assert result["ids"] == [[str(i) for i in row] for row in expected]
+    assert all(m["parity"] == 0 for m in result["metadatas"][0])
+    assert np.allclose(result["distances"][0][0], ((queries[0] - embeddings[int(expected[0][0])]) ** 2).sum(), atol=1e-4)
+
+
+def test_reopened_replica_gets_and_counts(tmp_path):
+    cluster, embeddings = _cluster(n=20)
+    cluster.replicate_local(path=str(tmp_path), page_size=6)
+    replica = LocalCluster.open(str(tmp_path))
+    assert replica.count() == 20
+    got = replica.get(ids=["3", "1", "missing"], include=["embeddings", "documents"])
+    assert got["ids"] == ["3", "1"]
+    assert got["documents"] == ["doc 3", "doc 1"]
+    assert np.allclose(got["embeddings"], embeddings[[3, 1]])
+    page = replica.get(where={"i": {"$gte": 10}}, where_document={"$contains": "1"}, limit=3, offset=1, as_numpy=True)
+    assert page.ids.tolist() == ["11", "12", "13"]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_sync_applies_only_the_changes(tmp_path, indexed):
+    cluster, embeddings = _cluster(n=30, dim=4)
+    replica = cluster.replicate_local(path=str(tmp_path), page_size=8)
+    if indexed:
+        # Probing every list makes the index exact
+        replica.create_index(n_lists=4, nprobe=4)
+    api = cluster._client
+    # Rows 0-4 are deleted, row 10 changes its embedding and 5 new rows are added
+    fresh = np.random.default_rng(1).normal(size=(5, 4)).astype(np.float32)
+    changed = embeddings.copy()
+    changed[10] += 1
+    api.embeddings = np.concatenate([changed, fresh])
+    listing = api._get
+
+    def _get(cluster_id, ids, where, sort, limit, offset, where_document=None, include=None, as_numpy=None):
+        if ids is not None:
+            rows = [int(i) for i in ids if 5 <= int(i) < len(api.embeddings)]
+            return ColumnarGetResult(
+                ids=np.array([str(i) for i in rows], dtype=np.str_),
+                embeddings=api.embeddings[rows],
+                metadatas=[{"parity": i % 2, "i": i} for i in rows],
+                documents=[f"doc {i}" for i in rows],
+            )
+        page = listing(cluster_id, ids, where, sort, limit, offset + 5)
+        if "embeddings" not in include:
+            page.embeddings = None
+        return page
+
+    api._get = _get
+    api._count = lambda cluster_id: 30
+    summary = replica.sync(cluster, compare="embeddings", page_size=4, partitions=3, workers=2)
+    assert (summary["added"], summary["updated"], summary["deleted"], summary["unchanged"]) == (5, 1, 5, 24)
+
+    reopened = LocalCluster.open(str(tmp_path))
+    for local in (replica, reopened):
+        assert local.count() == 30
+        got = local.get(ids=[str(i) for i in range(5, 35)], include=["embeddings"])
+        assert got["ids"] == [str(i) for i in range(5, 35)]
+        assert np.allclose(got["embeddings"], api.embeddings[5:])
+        assert (local._index is not None) == indexed
+        if indexed:
+            # Every row is in the list of its current vector
+            lists = assign(np.asarray(local._embeddings), local._index.centroids)
+            assert np.array_equal(local._index.assignment[:30], lists)
+            assert (local._index.assignment[30:] == -1).all()
+        result = local.find(query_embeddings=api.embeddings[5:], n_results=1, include=[])
+        assert result["ids"] == [[str(i)] for i in range(5, 35)]
+
+
+class _RecordsAPI:
+    """A cluster of records by id. Listings skip the ids in hidden, as an offset scan
+    may while other clients write."""
+
+    def __init__(self, records):
+        from bagel.config import Settings, System
+
+        self._system = System(Settings())
+        self.records = records
+        self.hidden = set()
+        self.listed_includes = []
+
+    def _count(self, cluster_id):
+        return len(self.records)
+
+    def _get(self, cluster_id, ids, where, sort, limit, offset, where_document=None, include=None, as_numpy=None):
+        if ids is None:
+            self.listed_includes.append(list(include))
+            listed = [id for id in sorted(self.records, key=int) if id not in self.hidden]
+            ids = listed[offset : offset + limit]
+        else:
+            ids = [id for id in ids if id in self.records]
+        return ColumnarGetResult(
+            ids=np.array(ids, dtype=np.str_),
+            embeddings=np.array([self.records[id][0] for id in ids], dtype=np.float32).reshape(len(ids), 2),
+            metadatas=[self.records[id][1] for id in ids],
+            documents=[self.records[id][2] for id in ids],
+        )
+
+
+def test_sync_appends_patches_and_keeps_unlisted_ids(tmp_path):
+    from bagel.api.Cluster import Cluster
+
+    records = {str(i): ([float(i), 0.0], {"i": i}, f"doc {i}") for i in range(10)}
+    api = _RecordsAPI(records)
+    cluster = Cluster(api, name="c", id="0" * 32, cluster_size=0)
+    replica = cluster.replicate_local(path=str(tmp_path), page_size=4)
+    records_file = tmp_path / "records.jsonl"
+    base = records_file.read_text()
+
+    # "3" is skipped by the listing but still exists, "9" was deleted, "10" is new and
+    # "4" changed its document
+    api.hidden = {"3"}
+    api.listed_includes = []
+    del records["9"]
+    records["10"] = ([10.0, 0.0], {"i": 10}, "doc 10")
+    records["4"] = ([4.0, 0.0], {"i": 4}, "changed")
+    summary = replica.sync(cluster, compare="ids", changed_ids=["4"], page_size=4, partitions=2, workers=2)
+    assert (summary["added"], summary["updated"], summary["deleted"], summary["unchanged"]) == (1, 1, 1, 8)
+    # compare="ids" lists nothing but ids
+    assert all(include == [] for include in api.listed_includes)
+    # The records file was appended to, not rewritten
+    assert records_file.read_text().startswith(base)
+    assert len(records_file.read_text().splitlines()) == 10 + 2
+
+    for local in (replica, LocalCluster.open(str(tmp_path))):
+        got = local.get(ids=sorted(records, key=int), include=["documents", "embeddings"])
+        assert got["ids"] == sorted(records, key=int)
+        assert got["documents"] == [records[id][2] for id in got["ids"]]
+        assert np.allclose(got["embeddings"], [records[id][0] for id in got["ids"]])
+
+    # Once the patches would outnumber the rows, the file is rewritten without them
+    api.hidden = set()
+    for round in range(5):
+        for id in list(records):
+            records[id] = (records[id][0], records[id][1], f"round {round}")
+        replica.sync(cluster, compare="ids", changed_ids=list(records), page_size=4)
+    lines = records_file.read_text().splitlines()
+    assert len(lines) <= 2 * len(records)
+    reopened = LocalCluster.open(str(tmp_path))
+    assert reopened.get(ids=["10"], include=["documents"])["documents"] == ["round 4"]
+
+
+def test_default_sync_picks_up_changed_records(tmp_path, caplog):
+    from bagel.api.Cluster import Cluster
+
+    records = {str(i): ([float(i), 0.0], {"i": i}, f"doc {i}") for i in range(6)}
+    api = _RecordsAPI(records)
+    cluster = Cluster(api, name="c", id="0" * 32, cluster_size=0)
+    replica = cluster.replicate_local(path=str(tmp_path), page_size=4)
+
+    records["2"] = ([2.0, 1.0], {"i": 2}, "doc 2")
+    records["5"] = ([5.0, 0.0], {"i": 5}, "changed")
+    summary = replica.sync(cluster, page_size=4)
+    assert (summary["added"], summary["updated"], summary["deleted"], summary["unchanged"]) == (0, 2, 0, 4)
+    got = replica.get(ids=["2", "5"], include=["documents", "embeddings"])
+    assert got["documents"] == ["doc 2", "changed"]
+    assert np.allclose(got["embeddings"], [[2.0, 1.0], [5.0, 0.0]])
+
+    # Comparing ids alone cannot see such changes, which is logged
+    records["5"] = ([5.0, 0.0], {"i": 5}, "changed again")
+    with caplog.at_level("WARNING", logger="bagel.api.replica"):
+        summary = replica.sync(cluster, compare="ids", page_size=4)
+    assert summary["updated"] == 0
+    assert "by ids only" in caplog.text
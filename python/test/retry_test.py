@@ -0,0 +1,34 @@
+from bagel.api.retry import RetryBudget, RetryPolicy, parse_retry_after
+
+URL = "http://localhost/api/v1/clusters/c"
+
+
+def test_idempotency_rules():
+    policy = RetryPolicy(backoff_base=0, max_elapsed=None)
+    assert policy.next_delay(1, "GET", URL + "/count", 0, status=502) == 0
+    assert policy.next_delay(1, "POST", URL + "/query", 0, status=502) == 0
+    # An add may have been applied, it is only retried when the server rejected it
+    assert policy.next_delay(1, "POST", URL + "/add", 0, status=502) is None
+    assert policy.next_delay(1, "POST", URL + "/add", 0, status=503) == 0
+    assert policy.next_delay(1, "POST", URL + "/add", 0, error=OSError(), sent=False) == 0
+    assert policy.next_delay(1, "POST", URL + "/add", 0, status=502, idempotent=True) == 0
+    assert policy.next_delay(1, "GET", URL, 0, status=404) is None
+    assert policy.next_delay(4, "GET", URL, 0, status=502) is None
+
+
+def test_retry_after_and_max_elapsed():
+    policy = RetryPolicy(max_elapsed=10)
+    assert policy.next_delay(1, "GET", URL, 0, status=429, headers={"Retry-After": "3"}) == 3
+    assert policy.next_delay(1, "GET", URL, 8, status=429, headers={"Retry-After": "3"}) is None
+    assert parse_retry_after({"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"}) == 0
+    assert parse_retry_after({}) is None
+
+
+def test_budget_stops_retry_storms():
+    budget = RetryBudget(max_tokens=4, ratio=0.5)
+    policy = RetryPolicy(backoff_base=0, max_elapsed=None, budget=budget)
+    delays = [policy.next_delay(1, "GET", URL, 0, status=503) for _ in range(4)]
+    assert delays == [0, 0, None, None]
+    policy.next_delay(1, "GET", URL, 0, status=200)
+    policy.next_delay(1, "GET", URL, 0, status=200)
+    assert policy.next_delay(1, "GET", URL, 0, status=503) == 0
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+import pytest
+
+from bagel.api.timeouts import Timeouts, deadline, operation_class, remaining
+
+BASE = "http://host/api/v1/clusters/c"
+
+
+def test_operation_classes():
+    assert operation_class("POST", BASE + "/query") == "query"
+    assert operation_class("POST", BASE + "/get") == "get"
+    assert operation_class("GET", BASE + "/count") == "get"
+    assert operation_class("POST", BASE + "/upsert") == "write"
+    assert operation_class("POST", BASE + "/add_image_url") == "write"
+    assert operation_class("GET", "http://host/api/v1/jobs/j") == "jobs"
+    assert operation_class("POST", "http://host/api/v1/clusters") == "default"
+
+
+def test_timeouts_per_class_and_explicit():
+    timeouts = Timeouts(connect=2, query=5, upload=100)
+    assert timeouts.for_request("POST", BASE + "/query") == (2, 5)
+    assert timeouts.for_request("POST", BASE, operation="upload") == (2, 100)
+    assert timeouts.for_request("POST", BASE + "/query", timeout=1) == (1, 1)
+    assert timeouts.for_request("POST", BASE + "/query", timeout=(1, 3)) == (1, 3)
+
+
+def test_deadline_caps_timeouts_and_nests():
+    timeouts = Timeouts(connect=2, query=None)
+    assert remaining() is None
+    with deadline(1):
+        connect, read = timeouts.for_request("POST", BASE + "/query")
+        assert connect <= 1 and 0.9 < read <= 1
+        with deadline(10):
+            assert remaining() <= 1
+    assert remaining() is None
+    with deadline(0.01):
+        time.sleep(0.02)
+        with pytest.raises(TimeoutError):
+            timeouts.for_request("POST", BASE + "/query")
+
+
+def test_deadline_carries_over_to_copied_contexts():
+    with deadline(5):
+        with ThreadPoolExecutor(1) as executor:
+            assert executor.submit(copy_context().run, remaining).result() <= 5
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from bagel.api.types import (
+    maybe_cast_one_to_many,
+    validate_embeddings,
+    validate_embedding_set,
+)
+
+
+def test_one_dimensional_array_is_one_embedding():
+    embeddings = maybe_cast_one_to_many(np.arange(4, dtype=np.float32))
+    assert embeddings.shape == (1, 4)
+
+
+def test_array_is_carried_unchanged():
+    array = np.random.rand(3, 8).astype(np.float32)
+    ids, embeddings, _, _ = validate_embedding_set(["a", "b", "c"], array, None, None)
+    assert embeddings is array
+
+
+@pytest.mark.parametrize(
+    "array",
+    [
+        np.zeros((2, 2, 2)),
+        np.zeros((0, 4)),
+        np.array([["a", "b"]]),
+        np.array([[1.0, np.nan]]),
+        np.array([[np.inf, 1.0]]),
+    ],
+)
+def test_invalid_arrays(array):
+    with pytest.raises(ValueError):
+        validate_embeddings(array)
+
+
+def test_length_mismatch():
+    with pytest.raises(ValueError):
+        validate_embedding_set(["a"], np.zeros((2, 3)), None, None)